@@ -0,0 +1,108 @@
+"""Benchmark of concurrent database writers: a probe thread updating every movie in a loop while
+frontend threads read the movie list and edit movies, each request with its own database handler.
+
+Compares plain rollback-journal connections (previous implementation) with the WAL connection manager.
+
+Usage: python benchmarks/bench_db_concurrency.py [duration_sec] [web_threads]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from data import TBDatabase  # noqa: E402
+from data.database import dict_factory  # noqa: E402
+
+NUMBER_OF_MOVIES = 200
+
+
+class LegacyDatabase(TBDatabase):
+    """TBDatabase with the previous connection handling (one plain connection per handler)"""
+
+    def __init__(self, db_file_path: str) -> None:
+        super().__init__(db_file_path)
+        self._connection = sqlite3.connect(db_file_path, timeout=1, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.row_factory = dict_factory
+
+    @property
+    def connection(self):
+        return self._connection
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def run(database_class, db_file_path: str, duration_sec: float, web_threads: int) -> dict:
+    """Runs the probe and frontend writers for the specified duration"""
+    db = database_class(db_file_path)
+    db.create_schema()
+    for i in range(NUMBER_OF_MOVIES):
+        db.add_movie(f"Movie {i}", 1000, "1080p", i, "")
+    movie_ids = [movie["id"] for movie in db.get_all_movies()]
+    db.close()
+
+    stop = threading.Event()
+    counters = {"probe_updates": 0, "web_requests": 0, "locked_errors": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def probe():
+        probe_db = database_class(db_file_path)
+        while not stop.is_set():
+            for movie_id in movie_ids:
+                try:
+                    probe_db.update_movie(movie_id, state="DOWNLOADING", hash="abc")
+                    with lock:
+                        counters["probe_updates"] += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        counters["locked_errors"] += 1
+        probe_db.close()
+
+    def web(offset: int):
+        i = offset
+        while not stop.is_set():
+            start = time.perf_counter()
+            request_db = database_class(db_file_path)
+            try:
+                request_db.get_all_movies()
+                request_db.update_movie(movie_ids[i % len(movie_ids)], state="PAUSED")
+                with lock:
+                    counters["web_requests"] += 1
+                    latencies.append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                with lock:
+                    counters["locked_errors"] += 1
+            finally:
+                request_db.close()
+            i += web_threads
+
+    threads = [threading.Thread(target=probe)] + [threading.Thread(target=web, args=(i,)) for i in range(web_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration_sec)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    counters["web_p99_ms"] = round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None
+    return counters
+
+
+def main() -> None:
+    duration_sec = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    web_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    for name, database_class in (("rollback journal", LegacyDatabase), ("wal + connection manager", TBDatabase)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = run(database_class, os.path.join(tmp_dir, "tbot.db"), duration_sec, web_threads)
+        print(f"{name:>26}: {result}")
+
+
+if __name__ == "__main__":
+    main()
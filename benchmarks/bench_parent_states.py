@@ -0,0 +1,91 @@
+"""Benchmark of the season and tv show state reconciliation done by the tv show probe on every cycle:
+per row queries and updates (previous implementation) versus set-based updates.
+
+Usage: python benchmarks/bench_parent_states.py [number_of_shows] [seasons_per_show] [episodes_per_season]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from data import TBDatabase  # noqa: E402
+from data.states import TorrentState  # noqa: E402
+
+
+def populate(db: TBDatabase, number_of_shows: int, seasons_per_show: int, episodes_per_season: int) -> None:
+    """Adds shows whose seasons were downloaded episode by episode, some of them still ongoing"""
+    rng = random.Random(42)
+    with db.transaction():
+        for show in range(number_of_shows):
+            show_id = db.add_tv_show(f"Show {show}", 1000, "1080p", show, "")
+            season_ids = db.add_tv_show_seasons(show_id, {season: episodes_per_season
+                                                          for season in range(1, seasons_per_show + 1)})
+            for season_id in season_ids.values():
+                db.add_season_episodes(season_id, [{"name": "", "episode_number": episode, "air_date": ""}
+                                                   for episode in range(1, episodes_per_season + 1)])
+        db.connection.execute("UPDATE tv_show_season_episodes SET state=?, hash='hash'", (TorrentState.COMPLETED,))
+        episode_ids = [row["id"] for row in db.connection.execute("SELECT id FROM tv_show_season_episodes")]
+        for episode_id in rng.sample(episode_ids, len(episode_ids) // 20):
+            db.update_tv_show_season_episode(episode_id, state=TorrentState.SEARCHING, hash=None)
+        for episode_id in rng.sample(episode_ids, len(episode_ids) // 50):
+            db.update_tv_show_season_episode(episode_id, state=TorrentState.SEEDING)
+
+
+def per_row_update(db: TBDatabase) -> None:
+    """The previous TVShowProbe.update, without the torrent polling"""
+    for episode in db.get_all_episodes():
+        if not episode["hash"]:
+            season_state = db.get_tv_show_season(episode["season_id"])["state"]
+            db.update_tv_show_season_episode(episode["id"], state=season_state)
+    for season in db.get_all_seasons():
+        if not season["hash"]:
+            new_state = TorrentState.parent_state(season["state"], db.get_season_episodes_states(season["id"]))
+            db.update_show_season(season["id"], state=new_state)
+    for show in db.get_all_tv_shows():
+        new_state = TorrentState.parent_state(show["state"], db.get_season_states(show_id=show["id"]))
+        if new_state == TorrentState.DELETING or show["state"] == TorrentState.DELETING:
+            db.delete_tv_show(show["id"])
+        else:
+            db.update_tv_show(show["id"], state=new_state)
+
+
+def set_based_update(db: TBDatabase) -> None:
+    """The current TVShowProbe.update, without the torrent polling"""
+    db.update_unhashed_episode_states()
+    db.update_season_states()
+    db.update_tv_show_states()
+
+
+def snapshot(db: TBDatabase) -> tuple:
+    return (db.connection.execute("SELECT id, state FROM tv_show_seasons ORDER BY id").fetchall(),
+            db.connection.execute("SELECT id, state FROM tv_shows ORDER BY id").fetchall())
+
+
+def main() -> None:
+    number_of_shows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    seasons_per_show = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    episodes_per_season = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+    results = []
+    for name, update in (("per row", per_row_update), ("set based", set_based_update)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, "tbot.db"))
+            db.create_schema()
+            populate(db, number_of_shows, seasons_per_show, episodes_per_season)
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                with db.transaction():
+                    update(db)
+                timings.append(time.perf_counter() - start)
+            results.append(snapshot(db))
+            db.close()
+            db.connections.close_idle()
+        print(f"{name:>9}: first cycle {timings[0] * 1000:8.1f} ms, steady state {min(timings[1:]) * 1000:8.1f} ms")
+    print(f"same states: {results[0] == results[1]}")
+
+
+if __name__ == "__main__":
+    main()
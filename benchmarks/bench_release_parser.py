@@ -0,0 +1,99 @@
+"""Benchmark of the jackett title filters: per-result regular expressions (previous implementation)
+versus the precompiled release parser.
+
+The cached results of a show query are filtered again for every season search of the show, so
+each scenario filters the same titles for every season. Releases are parsed once per title and
+reused, while the regular expressions run for every season.
+
+Usage: python benchmarks/bench_release_parser.py [number_of_titles] [number_of_seasons]
+"""
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from tools.release_parser import parse_release  # noqa: E402
+
+NAMES = ["The Office US", "Breaking Bad", "Better Call Saul", "The Wire", "Dark", "Severance", "The Expanse"]
+RESOLUTIONS = ["2160p", "1080p", "720p", "480p", ""]
+SOURCES = ["BluRay", "WEB-DL", "WEBRip", "HDTV", "HDRip", "BRRip", ""]
+CODECS = ["x264", "x265", "HEVC", "H.264", ""]
+
+
+def generate_titles(number_of_titles: int) -> list:
+    """Generates a corpus of random release titles"""
+    rng = random.Random(42)
+    titles = []
+    for _ in range(number_of_titles):
+        season = rng.randint(1, 12)
+        kind = rng.random()
+        if kind < 0.6:
+            episode = rng.randint(1, 24)
+            tag = f"S{season:02d}E{episode:02d}"
+        elif kind < 0.7:
+            episode = rng.randint(1, 22)
+            tag = f"S{season:02d}E{episode:02d}-E{episode + 2:02d}"
+        elif kind < 0.9:
+            tag = f"S{season:02d}"
+        else:
+            tag = f"Season {season} Complete"
+        parts = [rng.choice(NAMES), tag, str(rng.randint(1990, 2024)),
+                 rng.choice(RESOLUTIONS), rng.choice(SOURCES), rng.choice(CODECS)]
+        titles.append(rng.choice([".", " "]).join(part for part in parts if part))
+    return titles
+
+
+def regex_filter(titles: list, season: int, episodes: list) -> int:
+    """The previous search_tvseries title filters, applied for every wanted episode"""
+    matches = 0
+    for title in titles:
+        title = title.lower()
+        if not re.search(f"(season|s).?[0-9]?{season}", title):
+            continue
+        for episode in episodes:
+            if not episode and re.search(f"(episode|ep|e).?[0-9]+", title):
+                continue
+            if episode and not re.search(f"(episode|ep|e).?0*{episode}", title):
+                continue
+            matches += 1
+    return matches
+
+
+def parser_filter(titles: list, season: int, episodes: list) -> int:
+    """The release parser title filters, each title is parsed once"""
+    matches = 0
+    for title in titles:
+        release = parse_release(title)
+        if release.season != season:
+            continue
+        for episode in episodes:
+            if not episode and not release.pack:
+                continue
+            if episode and not (release.episode_start is not None and
+                                release.episode_start <= episode <= release.episode_end):
+                continue
+            matches += 1
+    return matches
+
+
+def main():
+    number_of_titles = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    number_of_seasons = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    titles = generate_titles(number_of_titles)
+    seasons = range(1, number_of_seasons + 1)
+    print(f"{number_of_titles} titles, filtered for {number_of_seasons} seasons")
+    scenarios = [("season pack", [None]), ("single episode", [5]), ("24 episodes", list(range(1, 25)))]
+    for scenario, episodes in scenarios:
+        for name, function in [("regex", regex_filter), ("parser", parser_filter)]:
+            parse_release.cache_clear()
+            start = time.perf_counter()
+            matches = sum(function(titles, season, episodes) for season in seasons)
+            elapsed = time.perf_counter() - start
+            filtered = number_of_titles * number_of_seasons
+            print(f"{scenario:>14} {name:>6}: {elapsed:6.2f}s "
+                  f"({filtered / elapsed:,.0f} titles/s, {matches} matches)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark of the database row modes: dictionaries (dict_factory) versus sqlite3.Row,
+reading every episode the way the tv show probe does on each cycle.
+
+Usage: python benchmarks/bench_row_modes.py [number_of_episodes]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from data import TBDatabase  # noqa: E402
+
+
+def populate(db_file_path: str, number_of_episodes: int) -> None:
+    db = TBDatabase(db_file_path)
+    db.create_schema()
+    with db.transaction():
+        show_id = db.add_tv_show("Show", 1000, "1080p", 1, "")
+        episodes_per_season = 100
+        season_ids = db.add_tv_show_seasons(show_id, {season: episodes_per_season
+                                                      for season in range(number_of_episodes // episodes_per_season)})
+        for season_id in season_ids.values():
+            db.add_season_episodes(season_id, [{"name": f"Episode {episode}", "episode_number": episode,
+                                                "air_date": "1 Jan. 2020"}
+                                               for episode in range(episodes_per_season)])
+    db.close()
+
+
+def read_episodes(db: TBDatabase) -> int:
+    """Reads every episode and accesses the columns used by the probe"""
+    active = 0
+    for episode in db.get_all_episodes():
+        if episode["hash"] and episode["state"] not in ("SEARCHING", "COMPLETED"):
+            active += 1
+        active += episode["id"] < 0
+    return active
+
+
+def main() -> None:
+    number_of_episodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file_path = os.path.join(tmp_dir, "tbot.db")
+        populate(db_file_path, number_of_episodes)
+        for row_mode in ("dict", "row"):
+            db = TBDatabase(db_file_path, row_mode=row_mode)
+            read_episodes(db)  # warm up the page cache
+            timings = []
+            for _ in range(5):
+                start = time.perf_counter()
+                read_episodes(db)
+                timings.append(time.perf_counter() - start)
+            tracemalloc.start()
+            rows = db.get_all_episodes()
+            rows_size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del rows
+            print(f"{row_mode:>4}: {number_of_episodes / min(timings):12,.0f} rows/s, "
+                  f"{rows_size / number_of_episodes:6.0f} bytes/row retained")
+            db.close()
+        db.connections.close_idle()
+
+
+if __name__ == "__main__":
+    main()
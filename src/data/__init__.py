@@ -1 +1,3 @@
 from .database import TBDatabase
+from .connection import ConnectionManager
+from .query_stats import QueryStats
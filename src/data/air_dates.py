@@ -0,0 +1,50 @@
+from datetime import date, datetime
+
+# Known imdb (and legacy) air date formats, e.g. "20 Jan. 2008" (dots removed), "2008" or "Jan 2008"
+AIR_DATE_FORMATS = ("%d %b %Y", "%Y", "%d/%m/%Y", "%Y-%m-%d", "%d%m%Y", "%b %Y")
+
+# SQL pattern of the normalized air dates (unparseable air dates are stored as they are)
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+
+def to_iso_date(air_date: str) -> str:
+    """Normalizes an air date to ISO format (YYYY-MM-DD), so that air dates can be compared as text.
+    Partial dates are set to the first day of the year or month (e.g. "2008" is "2008-01-01").
+
+    Args:
+        air_date (str): the air date in one of the AIR_DATE_FORMATS
+
+    Returns:
+        str: the ISO air date, or the stripped air date if it couldn't be parsed
+    """
+    air_date = (air_date or "").strip()
+    for fmt in AIR_DATE_FORMATS:
+        try:
+            return datetime.strptime(air_date.replace(".", ""), fmt).date().isoformat()
+        except ValueError:
+            pass
+    return air_date
+
+
+def get_air_timestamp(air_date: str) -> float:
+    """Retrieves the time at which the specified ISO air date starts (local time)
+
+    Args:
+        air_date (str): the ISO air date
+
+    Returns:
+        float: the time (epoch seconds) or None if the air date isn't an ISO date
+    """
+    try:
+        return datetime.combine(date.fromisoformat(air_date), datetime.min.time()).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def today() -> str:
+    """Retrieves the current local date in ISO format
+
+    Returns:
+        str: the ISO date
+    """
+    return date.today().isoformat()
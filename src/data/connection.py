@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+import threading
+
+
+class ConnectionManager:
+    """
+    Thread-safe sqlite connection manager.
+
+    Every thread gets its own connection, so the probes and the frontend requests never share a
+    connection. Connections released by a thread go back to a pool of idle connections and are
+    reused by the next thread that needs one. The database is set to WAL mode so that readers
+    don't block the writer, and writers wait (busy timeout) instead of failing with
+    "database is locked".
+
+    Read-only managers open the database through a mode=ro URI with query_only set, so their
+    connections never take a write lock.
+
+    One manager is shared by every TBDatabase handler of the same file and access mode
+    (see ConnectionManager.get).
+
+    Attributes
+    ----------
+    db_file_path : str
+        the database file path (sqlite)
+    busy_timeout_ms : int
+        the time a connection waits for a lock before failing
+    cache_size_kib : int
+        the page cache size of each connection in KiB
+    mmap_size_bytes : int
+        the maximum number of bytes of the database file that are memory-mapped
+    max_idle_connections : int
+        the maximum number of idle connections kept in the pool
+    row_factory : callable
+        the row factory of each connection
+    read_only : bool
+        true if the connections can only read the database
+    """
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, db_file_path: str, busy_timeout_ms: int = 5000, cache_size_kib: int = 8192,
+                 mmap_size_bytes: int = 64 * 1024 * 1024, max_idle_connections: int = 4,
+                 row_factory=None, read_only: bool = False) -> None:
+        self.db_file_path = db_file_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size_bytes = mmap_size_bytes
+        self.max_idle_connections = max_idle_connections
+        self.row_factory = row_factory
+        self.read_only = read_only
+        self._local = threading.local()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, db_file_path: str, **kwargs) -> "ConnectionManager":
+        """Retrieves the manager of the specified database file and access mode, creating it if needed
+
+        Args:
+            db_file_path (str): the database file path
+
+        Returns:
+            ConnectionManager: the shared connection manager
+        """
+        key = (db_file_path, kwargs.get("read_only", False))
+        with cls._managers_lock:
+            manager = cls._managers.get(key)
+            if manager is None:
+                manager = cls(db_file_path, **kwargs)
+                cls._managers[key] = manager
+            return manager
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens a new connection with the manager settings
+
+        Returns:
+            sqlite3.Connection: the connection
+        """
+        if self.read_only:
+            # Autocommit, so that a rejected write doesn't leave a transaction (and a stale snapshot) open
+            connection = sqlite3.connect(f"{Path(self.db_file_path).absolute().as_uri()}?mode=ro", uri=True,
+                                         timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                                         isolation_level=None)
+            connection.execute("PRAGMA query_only = ON")
+        else:
+            connection = sqlite3.connect(self.db_file_path, timeout=self.busy_timeout_ms / 1000,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        connection.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+        connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size_bytes)}")
+        connection.execute("PRAGMA foreign_keys = ON")
+        if self.row_factory is not None:
+            connection.row_factory = self.row_factory
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        """Retrieves the connection of the current thread, taking one from the pool
+        (or opening a new one) if the thread doesn't have a connection yet
+
+        Returns:
+            sqlite3.Connection: the connection of the current thread
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self.connect()
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Context manager that groups every change made by the current thread inside the
+        with block in a single transaction, committed when the outermost block exits and
+        rolled back if it raises an exception. Nested blocks join the outer transaction.
+
+        Yields:
+            sqlite3.Connection: the connection of the current thread
+        """
+        connection = self.acquire()
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield connection
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                connection.rollback()
+            raise
+        self._local.depth = depth
+        if depth == 0:
+            connection.commit()
+
+    @contextmanager
+    def snapshot(self):
+        """Context manager that runs every read made by the current thread inside the with block
+        on the same snapshot of the database (a single read transaction). In WAL mode the snapshot
+        neither waits for nor blocks the writer. Inside a transaction block (or an outer snapshot)
+        the reads join the current transaction instead.
+
+        Yields:
+            sqlite3.Connection: the connection of the current thread
+        """
+        connection = self.acquire()
+        if self.in_transaction() or connection.in_transaction:
+            yield connection
+            return
+        connection.execute("BEGIN")
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    def in_transaction(self) -> bool:
+        """Checks if the current thread is inside a transaction block
+
+        Returns:
+            bool: true if the changes must not be committed yet
+        """
+        return getattr(self._local, "depth", 0) > 0
+
+    def release(self) -> None:
+        """Returns the connection of the current thread to the pool.
+        Uncommitted changes are rolled back.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            return
+        self._local.connection = None
+        self._local.depth = 0
+        if connection.in_transaction:
+            connection.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close_idle(self) -> None:
+        """Close every idle connection in the pool"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
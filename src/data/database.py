@@ -1,24 +1,26 @@
+from .air_dates import ISO_DATE_GLOB, to_iso_date, today
+from .connection import ConnectionManager
+from .migrations import migrate, SEARCHABLE_TABLES, SEARCH_BACKOFF_COLUMNS
+from .query_stats import TimedCursor
+from .states import TorrentState
 import sqlite3
+import time
 
 
-class TorrentState:
-    SEARCHING = "SEARCHING"  # Still being searched
-    DOWNLOADING = "DOWNLOADING"  # Currently being downloading
-    SEEDING = "SEEDING"  # Currently uploading
-    COMPLETED = "COMPLETED"  # Removed from seeding
-    DELETING = "DELETING"  # Torrent marked for deletion
-    PAUSED = "PAUSED"  # Download stopped
+def dict_factory(cursor, row) -> dict:
+    """Transform tuple rows into a dictionary with column names and values
 
-    @staticmethod
-    def get_states() -> list:
-        return [
-            TorrentState.SEARCHING,
-            TorrentState.DOWNLOADING,
-            TorrentState.SEEDING,
-            TorrentState.COMPLETED,
-            TorrentState.DELETING,
-            TorrentState.PAUSED
-        ]
+    Args:
+        cursor: database cursor
+        row: row
+
+    Returns:
+        dict: a dictionary containing the column names as keys and the respective values
+    """
+    output = {}
+    for idx, col in enumerate(cursor.description):
+        output[col[0]] = row[idx]
+    return output
 
 
 class TBDatabase:
@@ -29,119 +31,88 @@ class TBDatabase:
     ----------
     db_file_path : str
         the database file path (sqlite)
+    row_mode : str
+        the type of the retrieved rows: "dict" (dictionaries) or "row" (sqlite3.Row, compact
+        read-only rows accessed by column name or index)
+    read_only : bool
+        true if the handler can only read the database (mode=ro connections with query_only),
+        so that its reads never wait for a write lock
+    connections : ConnectionManager
+        the connection manager shared by every handler of the same database file and access mode
+    query_stats : QueryStats
+        optional statistics of the executed statements, shared by every handler when set on the
+        class (TBDatabase.query_stats = QueryStats())
 
     """
 
-    def __init__(self, db_file_path: str) -> None:
+    ROW_FACTORIES = {
+        "dict": dict_factory,
+        "row": sqlite3.Row
+    }
+    MAX_QUERY_PARAMETERS = 500
+    query_stats = None
+    SEARCHABLE_TABLES = SEARCHABLE_TABLES
+    SEARCH_BACKOFF_COLUMNS = SEARCH_BACKOFF_COLUMNS
+
+    def __init__(self, db_file_path: str, row_mode: str = "dict", read_only: bool = False) -> None:
+        if row_mode not in self.ROW_FACTORIES:
+            raise Exception(f"The row mode must be one of the following: {list(self.ROW_FACTORIES)}")
         self.db_file_path = db_file_path
-        self.connection = sqlite3.connect(self.db_file_path)
-        self.connection.execute("PRAGMA foreign_keys = ON")
-        self.connection.row_factory = dict_factory
+        self.row_mode = row_mode
+        self.row_factory = self.ROW_FACTORIES[row_mode]
+        self.read_only = read_only
+        self.connections = ConnectionManager.get(db_file_path, row_factory=dict_factory, read_only=read_only)
         self.states = TorrentState()
 
-    def create_schema(self) -> None:
-        """Initializes the database by creating the necessary schema.
-
-        Args:
-            db_file (str): the file to were the database state will be stored
-        """
-
-        cur = self.connection.cursor()
-        # Create Movies table
-        sql = f"""CREATE TABLE IF NOT EXISTS movies (
-            "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
-            "name" TEXT UNIQUE NOT NULL,
-            "max_size_mb" INTEGER NOT NULL,
-            "resolution_profile"	TEXT NOT NULL,
-            "state" TEXT NOT NULL DEFAULT '{self.states.SEARCHING}',
-            "imdbid"	INTEGER UNIQUE NOT NULL,
-            "cover_url" TEXT,
-            "hash" TEXT)
-        """
-        cur.execute(sql)
-
-        # Create TV Shows Table
-        sql = f"""CREATE TABLE IF NOT EXISTS tv_shows (
-            "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
-            "name" TEXT UNIQUE NOT NULL,
-            "max_episode_size_mb" INTEGER NOT NULL,
-            "resolution_profile"	TEXT NOT NULL,
-            "imdbid"	INTEGER UNIQUE NOT NULL,
-            "state" TEXT NOT NULL DEFAULT '{self.states.SEARCHING}',
-            "cover_url" TEXT
-        )
+    @property
+    def connection(self):
+        """The connection of the current thread"""
+        return self.connections.acquire()
+
+    def _cursor(self) -> sqlite3.Cursor:
+        """Creates a cursor on the connection of the current thread, returning rows in the handler row mode"""
+        if self.query_stats is not None:
+            cur = self.connection.cursor(TimedCursor)
+            cur.query_stats = self.query_stats
+        else:
+            cur = self.connection.cursor()
+        cur.row_factory = self.row_factory
+        return cur
+
+    def transaction(self):
+        """Groups the changes made inside the with block in a single commit, e.g.
+
+            with db.transaction():
+                db.update_movie(id, state=db.states.SEARCHING)
+                db.reset_search_backoff("movies", id)
+
+        Returns:
+            the transaction context manager
         """
-        cur.execute(sql)
-
-        # Create TV Show seasons
-        sql = f"""CREATE TABLE IF NOT EXISTS tv_show_seasons (
-            "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
-            "show_id" INTEGER,
-            "season_number" INTEGER NOT NULL,
-            "season_number_episodes" INTEGER NOT NULL,
-            "state" TEXT NOT NULL DEFAULT '{self.states.SEARCHING}',
-            "hash" TEXT,
-            FOREIGN KEY(show_id) REFERENCES tv_shows(id) ON DELETE CASCADE,
-            UNIQUE(show_id, season_number))
-        """
-        cur.execute(sql)
-
-        # Create TV Show season episodes
-        sql = f"""CREATE TABLE IF NOT EXISTS tv_show_season_episodes (
-            "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
-            "season_id" INTEGER,
-            "name" TEXT NOT NULL,
-            "episode_number" INTEGER NOT NULL,
-            "air_date" TEXT NOT NULL,
-            "state" TEXT NOT NULL DEFAULT '{self.states.SEARCHING}',
-            "hash" TEXT,
-            FOREIGN KEY(season_id) REFERENCES tv_show_seasons(id) ON DELETE CASCADE,
-            UNIQUE(season_id, episode_number))
-        """
-        cur.execute(sql)
-
-        # Create tv shows with seasons view
-        sql = f"""CREATE VIEW IF NOT EXISTS tv_shows_with_seasons_view
-            AS
-            SELECT 
-                tv_shows.id as show_id,
-                tv_shows.name as show_name,
-                tv_shows.state as show_state,
-                tv_shows.resolution_profile as resolution_profile,
-                tv_shows.name as show_name,
-                tv_shows.max_episode_size_mb as max_episode_size_mb,
-                tv_shows.imdbid as show_imdbid,
-                tv_show_seasons.id as season_id,
-                tv_show_seasons.season_number as season_number,
-                tv_show_seasons.season_number_episodes as season_number_episodes,
-                tv_show_seasons.state as season_state,
-                tv_show_seasons.hash as season_hash
-            FROM tv_shows
-            INNER JOIN tv_show_seasons on tv_shows.id = tv_show_seasons.show_id;
-        """
-        cur.execute(sql)
-
-        # Create seaons with episodes view
-        sql = f"""CREATE VIEW IF NOT EXISTS tv_show_seasons_with_episodes_view
-            AS
-            SELECT 
-                tv_show_seasons.id as season_id,
-                tv_show_seasons.hash as season_hash,
-                tv_show_seasons.state as season_state,
-                tv_show_seasons.season_number as season_number,
-                tv_show_season_episodes.id as episode_id,
-                tv_show_season_episodes.name as episode_name,
-                tv_show_season_episodes.air_date as episode_air_date,
-                tv_show_season_episodes.episode_number as episode_number,
-                tv_show_season_episodes.state as episode_state,
-                tv_show_season_episodes.hash as episode_hash
-            FROM tv_show_seasons
-            INNER JOIN tv_show_season_episodes on tv_show_seasons.id = tv_show_season_episodes.season_id;
+        return self.connections.transaction()
+
+    def snapshot(self):
+        """Runs the reads made inside the with block on the same snapshot of the database, e.g.
+
+            with db.snapshot():
+                show = db.get_tv_show(id)
+                seasons = db.get_tv_show_with_seasons(id)
+
+        Returns:
+            the snapshot context manager
         """
-        cur.execute(sql)
+        return self.connections.snapshot()
 
-        # commit changes and close the connection
-        self.connection.commit()
+    def _commit(self) -> None:
+        """Commits the pending changes, unless they're part of a transaction block"""
+        if not self.connections.in_transaction():
+            self.connection.commit()
+
+    def create_schema(self) -> None:
+        """Initializes the database by creating the necessary schema, or migrates
+        the schema of an existing database to the latest version (see migrations.py)
+        """
+        migrate(self.connection)
 
     def get_all_movies(self) -> list:
         """Retrieves all movies
@@ -149,7 +120,7 @@ class TBDatabase:
         Returns:
             list: the the list of movies
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM movies")
         return cur.fetchall()
 
@@ -159,7 +130,7 @@ class TBDatabase:
         Returns:
             list: the list of tv shows
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_shows;")
         return cur.fetchall()
 
@@ -169,7 +140,7 @@ class TBDatabase:
         Returns:
             list: the list of seasons
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_show_seasons;")
         return cur.fetchall()
 
@@ -179,7 +150,7 @@ class TBDatabase:
         Returns:
             list: the list of episdoes
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_show_season_episodes;")
         return cur.fetchall()
 
@@ -189,7 +160,7 @@ class TBDatabase:
         Returns:
             list: the list of tv shows and seaons
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_shows_with_seasons_view;")
         return cur.fetchall()
 
@@ -199,23 +170,28 @@ class TBDatabase:
         Returns:
             list: the list of tv shows season episodes
         """
-        cur = self.connection.cursor()
-        cur.execute("SELECT * FROM tv_shows_season_with_episodes_view;")
+        cur = self._cursor()
+        cur.execute("SELECT * FROM tv_show_seasons_with_episodes_view;")
         return cur.fetchall()
 
-    def get_movies_by_state(self, state: str) -> list:
+    def get_movies_by_state(self, state: str, due: bool = False) -> list:
         """Retrieves all movies stored in the database with the specified state
 
         Args:
             state (str): the state (must match a valid state)
+            due (bool, optional): if true, only retrieve the movies whose next search is due
 
         Returns:
             list: the list of movies
         """
         if state not in self.states.get_states():
             raise Exception(f"Non allowed state={state}!")
-        cur = self.connection.cursor()
-        cur.execute("SELECT * FROM movies WHERE state=?", (state,))
+        cur = self._cursor()
+        if due:
+            cur.execute("SELECT * FROM movies WHERE state=? AND (next_search_at IS NULL OR next_search_at<=?)",
+                        (state, int(time.time())))
+        else:
+            cur.execute("SELECT * FROM movies WHERE state=?", (state,))
         return cur.fetchall()
 
     def get_tv_shows_by_state(self, state: str) -> list:
@@ -232,15 +208,16 @@ class TBDatabase:
         """
         if state not in self.states.get_states():
             raise Exception(f"Non allowed state={state}!")
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_shows WHERE state=?", (state,))
         return cur.fetchall()
 
-    def get_tv_show_with_seasons_by_state(self, state: str) -> list:
+    def get_tv_show_with_seasons_by_state(self, state: str, due: bool = False) -> list:
         """Retrieves all tv show seaons with the specified state
 
         Args:
             state (str): the state (must match a valid state)
+            due (bool, optional): if true, only retrieve the seasons whose next search is due
 
         Raises:
             Exception: If the state is not valid
@@ -250,9 +227,15 @@ class TBDatabase:
         """
         if state not in self.states.get_states():
             raise Exception(f"Non allowed state={state}!")
-        cur = self.connection.cursor()
-        cur.execute(
-            "SELECT * FROM tv_shows_with_seasons_view WHERE season_state=?", (state,))
+        cur = self._cursor()
+        if due:
+            cur.execute(
+                """SELECT * FROM tv_shows_with_seasons_view WHERE season_state=? AND season_id IN (
+                    SELECT id FROM tv_show_seasons WHERE next_search_at IS NULL OR next_search_at<=?)""",
+                (state, int(time.time())))
+        else:
+            cur.execute(
+                "SELECT * FROM tv_shows_with_seasons_view WHERE season_state=?", (state,))
         return cur.fetchall()
 
     def get_tv_show_seasons_with_episodes_by_state(self, state: str) -> list:
@@ -269,7 +252,7 @@ class TBDatabase:
         """
         if state not in self.states.get_states():
             raise Exception(f"Non allowed state={state}!")
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             "SELECT * FROM tv_show_seasons_with_episodes_view WHERE season_state=?", (state,))
         return cur.fetchall()
@@ -283,7 +266,7 @@ class TBDatabase:
         Returns:
             dict: the movie
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM movies WHERE id=?", (id,))
         return cur.fetchone()
 
@@ -296,7 +279,7 @@ class TBDatabase:
         Returns:
             dict: the tv show
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_shows WHERE id=?", (id,))
         return cur.fetchone()
 
@@ -309,7 +292,7 @@ class TBDatabase:
         Returns:
             dict: the tv show season
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_show_seasons WHERE id=?", (id,))
         return cur.fetchone()
 
@@ -322,7 +305,7 @@ class TBDatabase:
         Returns:
             list: the list of seasons
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * from tv_shows_with_seasons_view WHERE show_id=?", (id,))
         return cur.fetchall()
     
@@ -335,7 +318,7 @@ class TBDatabase:
         Returns:
             list: the list of seasons
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * from tv_show_seasons_with_episodes_view WHERE season_id=?", (id,))
         return cur.fetchall()
 
@@ -348,7 +331,7 @@ class TBDatabase:
         Returns:
             list: the list of episodes
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT * FROM tv_show_season_episodes WHERE season_id=?", (season_id,))
         result = cur.fetchall()
         return result
@@ -359,9 +342,9 @@ class TBDatabase:
         Args:
             id (int): the id of the movie to delete
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("DELETE FROM movies WHERE id=?", (id,))
-        self.connection.commit()
+        self._commit()
 
     def delete_tv_show(self, id: int) -> None:
         """Delete a tv show
@@ -369,9 +352,9 @@ class TBDatabase:
         Args:
             id (int): the id of the tv show to delete
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("DELETE FROM tv_shows WHERE id=?", (id,))
-        self.connection.commit()
+        self._commit()
 
     def delete_season(self, id: int):
         """Delete a season
@@ -379,9 +362,9 @@ class TBDatabase:
         Args:
             id (int): the season id
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("DELETE FROM tv_show_seasons WHERE id=?", (id,))
-        self.connection.commit()
+        self._commit()
 
     def delete_episode(self, id: int):
         """Delete an epidose
@@ -389,9 +372,9 @@ class TBDatabase:
         Args:
             id (int): the episode id
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("DELETE FROM tv_show_season_episodes WHERE id=?", (id,))
-        self.connection.commit()
+        self._commit()
 
     def add_movie(self, name: str, max_size_mb: int, resolution_profile: str, imdbid: str, cover_url: str) -> int:
         """Adds a movie to the database
@@ -406,7 +389,7 @@ class TBDatabase:
         Returns:
             int: the id of the inserted movie
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             """
                 INSERT INTO movies(name,max_size_mb,resolution_profile, imdbid, cover_url)
@@ -414,7 +397,7 @@ class TBDatabase:
                 """,
             (name, max_size_mb, resolution_profile, imdbid,cover_url),
         )
-        self.connection.commit()
+        self._commit()
         return cur.execute('SELECT last_insert_rowid() as id').fetchone()['id']
 
     def add_tv_show(self, name: str, max_episode_size_mb: int, resolution_profile: str, imdbid: str, cover_url: str) -> int:
@@ -430,7 +413,7 @@ class TBDatabase:
         Returns:
             int: the id of the inserted tv show
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             """
                 INSERT INTO tv_shows(name,max_episode_size_mb,resolution_profile, imdbid, cover_url)
@@ -438,9 +421,66 @@ class TBDatabase:
                 """,
             (name, max_episode_size_mb, resolution_profile, imdbid, cover_url),
         )
-        self.connection.commit()
+        self._commit()
         return cur.execute('SELECT last_insert_rowid() as id').fetchone()['id']
 
+    def add_movies(self, movies: list) -> list:
+        """Adds multiple movies at once, skipping the ones that already exist (same name or imdbid)
+
+        Args:
+            movies (list): the movies, dicts with the name, max_size_mb, resolution_profile, imdbid and cover_url
+
+        Returns:
+            list: the movies that weren't added because they already exist
+
+        Raises:
+            IntegrityError: if an entry is invalid (e.g. missing the name), only duplicates are skipped
+        """
+        cur = self._cursor()
+        duplicates = []
+        for movie in movies:
+            cur.execute(
+                """
+                    INSERT INTO movies(name,max_size_mb,resolution_profile, imdbid, cover_url)
+                    VALUES(?,?,?,?,?) ON CONFLICT DO NOTHING
+                    """,
+                (movie['name'], movie['max_size_mb'], movie['resolution_profile'], movie['imdbid'],
+                 movie['cover_url']),
+            )
+            if cur.rowcount == 0:
+                duplicates.append(movie)
+        self._commit()
+        return duplicates
+
+    def add_tv_shows(self, tv_shows: list) -> list:
+        """Adds multiple tv shows at once, skipping the ones that already exist (same name or imdbid)
+
+        Args:
+            tv_shows (list): the tv shows, dicts with the name, max_episode_size_mb, resolution_profile,
+            imdbid and cover_url
+
+        Returns:
+            list: the tv shows that weren't added because they already exist
+
+        Raises:
+            IntegrityError: if an entry is invalid (e.g. missing the name), only duplicates are skipped
+        """
+        cur = self._cursor()
+        duplicates = []
+        for tv_show in tv_shows:
+            cur.execute(
+                """
+                    INSERT INTO tv_shows(name,max_episode_size_mb,resolution_profile, imdbid, cover_url)
+                    VALUES(?,?,?,?,?) ON CONFLICT DO NOTHING
+                    """,
+                (tv_show['name'], tv_show['max_episode_size_mb'], tv_show['resolution_profile'], tv_show['imdbid'],
+                 tv_show['cover_url']),
+            )
+            if cur.rowcount == 0:
+                duplicates.append(tv_show)
+        self._commit()
+        return duplicates
+
     def add_tv_show_season(self, show_id: int, season_number: str, season_number_episodes: int) -> int:
         """Add tv show season
 
@@ -451,7 +491,7 @@ class TBDatabase:
         Returns:
             int: the id of the inserted tv show
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             """
                 INSERT INTO tv_show_seasons(show_id,season_number, season_number_episodes)
@@ -459,7 +499,7 @@ class TBDatabase:
                 """,
             (show_id, season_number, season_number_episodes),
         )
-        self.connection.commit()
+        self._commit()
         return cur.execute('SELECT last_insert_rowid() as id').fetchone()['id']
 
     def add_season_episode(self, season_id: int, episode_name: str, episode_number: int, air_date: str) -> int:
@@ -469,22 +509,68 @@ class TBDatabase:
             season_id (int): the season id
             episode_name (str): the episode name
             episode_number (int): the episode number
-            air_date (str): air_date
+            air_date (str): the air date, normalized to ISO format (see air_dates.to_iso_date)
 
         Returns:
             int: the id of the inserted tv show
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             """
                 INSERT INTO tv_show_season_episodes(season_id, name, episode_number, air_date)
                 VALUES(?,?,?,?)
                 """,
-            (season_id, episode_name, episode_number, air_date),
+            (season_id, episode_name, episode_number, to_iso_date(air_date)),
         )
-        self.connection.commit()
+        self._commit()
         return cur.execute('SELECT last_insert_rowid() as id').fetchone()['id']
 
+    def add_tv_show_seasons(self, show_id: int, seasons: dict) -> dict:
+        """Add multiple seasons of a tv show at once
+
+        Args:
+            show_id (int): the tv show id
+            seasons (dict): the number of episodes of each season, by season number
+
+        Returns:
+            dict: the ids of the inserted seasons, by season number
+        """
+        if not seasons:
+            return {}
+        cur = self._cursor()
+        cur.executemany(
+            """
+                INSERT INTO tv_show_seasons(show_id,season_number, season_number_episodes)
+                VALUES(?,?,?)
+                """,
+            [(show_id, season_number, season_number_episodes)
+             for season_number, season_number_episodes in seasons.items()],
+        )
+        self._commit()
+        cur.execute("SELECT id, season_number FROM tv_show_seasons WHERE show_id=?", (show_id,))
+        return {row['season_number']: row['id'] for row in cur.fetchall() if row['season_number'] in seasons}
+
+    def add_season_episodes(self, season_id: int, episodes: list) -> None:
+        """Add multiple episodes of a season at once
+
+        Args:
+            season_id (int): the season id
+            episodes (list): the episodes, dicts with the episode name, episode_number and air_date
+            (normalized to ISO format, see air_dates.to_iso_date)
+        """
+        if not episodes:
+            return
+        cur = self._cursor()
+        cur.executemany(
+            """
+                INSERT INTO tv_show_season_episodes(season_id, name, episode_number, air_date)
+                VALUES(?,?,?,?)
+                """,
+            [(season_id, episode['name'], episode['episode_number'], to_iso_date(episode['air_date']))
+             for episode in episodes],
+        )
+        self._commit()
+
     def get_season_id(self, show_id: int, season_number: int) -> int:
         """Retrieves the season id from the show_id and season_number
 
@@ -495,7 +581,7 @@ class TBDatabase:
         Returns:
             int: the season id
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         row = cur.execute(
             """
             SELECT id FROM tv_show_seasons WHERE show_id=? AND season_number=?
@@ -515,9 +601,9 @@ class TBDatabase:
             a database column
         """
         movie_table_columns = ["name", "max_size_mb",
-                               "resolution_profile", "state", "hash", "imdbid", "cover_url"]
-        self.connection.row_factory = dict_factory
-        cur = self.connection.cursor()
+                               "resolution_profile", "state", "hash", "imdbid", "cover_url",
+                               *self.SEARCH_BACKOFF_COLUMNS]
+        cur = self._cursor()
         columns_to_update = ""
         values = ()
         if not kwargs:
@@ -537,7 +623,7 @@ class TBDatabase:
             f"UPDATE movies SET {columns_to_update} WHERE id=?",
             values,
         )
-        self.connection.commit()
+        self._commit()
 
     def update_tv_show(self, id: int, **kwargs: dict) -> None:
         """Update a tv show
@@ -551,8 +637,7 @@ class TBDatabase:
         """
         tv_shows_table_columns = ["name", "max_episode_size_mb",
                                   "resolution_profile", "state", "imdbid", "cover_url"]
-        self.connection.row_factory = dict_factory
-        cur = self.connection.cursor()
+        cur = self._cursor()
         columns_to_update = ""
         values = ()
         if not kwargs:
@@ -572,7 +657,7 @@ class TBDatabase:
             f"UPDATE tv_shows SET {columns_to_update} WHERE id=?",
             values,
         )
-        self.connection.commit()
+        self._commit()
 
     def update_show_season(self, id: int, **kwargs: dict) -> None:
         """Update a tv show season
@@ -585,9 +670,9 @@ class TBDatabase:
             a database column
         """
         tv_show_season_table_columns = ["season_number",
-                                        "season_number_episodes", "state", "hash"]
-        self.connection.row_factory = dict_factory
-        cur = self.connection.cursor()
+                                        "season_number_episodes", "state", "hash",
+                                        *self.SEARCH_BACKOFF_COLUMNS]
+        cur = self._cursor()
         columns_to_update = ""
         values = ()
         if not kwargs:
@@ -607,7 +692,7 @@ class TBDatabase:
             f"UPDATE tv_show_seasons SET {columns_to_update} WHERE id=?",
             values,
         )
-        self.connection.commit()
+        self._commit()
 
     def update_tv_show_season_episode(self, id: int, **kwargs: dict) -> None:
         """Update a tv show season episode
@@ -620,9 +705,9 @@ class TBDatabase:
             a database column
         """
         tv_show_season_episode_table_columns = [
-            "season_id", "episode_number", "air_date", "state", "hash"]
-        self.connection.row_factory = dict_factory
-        cur = self.connection.cursor()
+            "season_id", "episode_number", "air_date", "state", "hash",
+            *self.SEARCH_BACKOFF_COLUMNS]
+        cur = self._cursor()
         columns_to_update = ""
         values = ()
         if not kwargs:
@@ -642,7 +727,107 @@ class TBDatabase:
             f"UPDATE tv_show_season_episodes SET {columns_to_update} WHERE id=?",
             values,
         )
-        self.connection.commit()
+        self._commit()
+
+    def record_search_miss(self, table: str, id: int, base_delay_sec: int, max_delay_sec: int) -> None:
+        """Records an unsuccessful search and postpones the next search of the entry.
+        The delay doubles with every attempt, starting at base_delay_sec and capped at max_delay_sec.
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+            id (int): the entry id
+            base_delay_sec (int): the delay after the first unsuccessful search
+            max_delay_sec (int): the maximum delay
+
+        Raises:
+            Exception: if the table doesn't support searches
+        """
+        if table not in self.SEARCHABLE_TABLES:
+            raise Exception(f"The table must be one of the following: {self.SEARCHABLE_TABLES}")
+        now = int(time.time())
+        cur = self._cursor()
+        cur.execute(
+            f"""UPDATE {table} SET
+                last_searched_at=?,
+                next_search_at=? + min(?, ? * (1 << min(search_attempts, 30))),
+                search_attempts=search_attempts + 1
+            WHERE id=?""",
+            (now, now, max_delay_sec, base_delay_sec, id),
+        )
+        self._commit()
+
+    def reset_search_backoff(self, table: str, id: int) -> None:
+        """Makes the entry searchable right away, forgetting previous unsuccessful searches
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+            id (int): the entry id
+
+        Raises:
+            Exception: if the table doesn't support searches
+        """
+        if table not in self.SEARCHABLE_TABLES:
+            raise Exception(f"The table must be one of the following: {self.SEARCHABLE_TABLES}")
+        cur = self._cursor()
+        cur.execute(f"UPDATE {table} SET search_attempts=0, next_search_at=NULL WHERE id=?", (id,))
+        self._commit()
+
+    def postpone_search(self, table: str, id: int, delay_sec: int) -> None:
+        """Postpones the next search of the entry by a fixed delay, forgetting previous
+        unsuccessful searches (e.g. frequent searches right after an episode airs)
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+            id (int): the entry id
+            delay_sec (int): the delay
+
+        Raises:
+            Exception: if the table doesn't support searches
+        """
+        if table not in self.SEARCHABLE_TABLES:
+            raise Exception(f"The table must be one of the following: {self.SEARCHABLE_TABLES}")
+        now = int(time.time())
+        cur = self._cursor()
+        cur.execute(f"UPDATE {table} SET last_searched_at=?, next_search_at=?, search_attempts=0 WHERE id=?",
+                    (now, now + delay_sec, id))
+        self._commit()
+
+    def update_next_air_dates(self, show_id: int = None) -> None:
+        """Sets the next air date of the tv shows to the earliest air date after today of their episodes
+        (NULL if no episode is known to air after today)
+
+        Args:
+            show_id (int, optional): the show id, all shows if not specified
+        """
+        next_air_date = f"""(SELECT min(air_date) FROM tv_show_season_episodes
+            INNER JOIN tv_show_seasons ON tv_show_seasons.id = tv_show_season_episodes.season_id
+            WHERE tv_show_seasons.show_id = tv_shows.id AND air_date > :today AND air_date GLOB '{ISO_DATE_GLOB}')"""
+        cur = self._cursor()
+        cur.execute(f"""UPDATE tv_shows SET next_air_date = {next_air_date}
+            WHERE next_air_date IS NOT {next_air_date} AND (:id IS NULL OR id = :id)""",
+                    {"today": today(), "id": show_id})
+        self._commit()
+
+    def get_next_search_at(self, table: str) -> int:
+        """Retrieves the time of the next postponed search in the specified table.
+        Searches that are already due aren't included, they're processed in the current probe cycle
+        (or skipped, e.g. the episodes of a season searched as a whole) and are rescheduled then.
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+
+        Raises:
+            Exception: if the table doesn't support searches
+
+        Returns:
+            int: the time (epoch seconds) of the next search or None if no search is postponed
+        """
+        if table not in self.SEARCHABLE_TABLES:
+            raise Exception(f"The table must be one of the following: {self.SEARCHABLE_TABLES}")
+        cur = self._cursor()
+        cur.execute(f"SELECT min(next_search_at) as next_search_at FROM {table} WHERE state=? AND next_search_at>?",
+                    (self.states.SEARCHING, int(time.time())))
+        return cur.fetchone()['next_search_at']
 
     def get_season_states(self, show_id: int) -> set:
         """Retrieves a set of all current season states for the specified show 
@@ -653,7 +838,7 @@ class TBDatabase:
         Returns:
             set: the set of season states
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             "SELECT season_state FROM tv_shows_with_seasons_view WHERE show_id=?", (show_id,))
         result = cur.fetchall()
@@ -671,7 +856,7 @@ class TBDatabase:
         Returns:
             set: the set of season states
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             "SELECT state FROM tv_show_season_episodes WHERE season_id=?", (season_id,))
         result = cur.fetchall()
@@ -680,6 +865,160 @@ class TBDatabase:
             state_set.add(row['state'])
         return state_set
 
+    def get_active_torrents(self, table: str) -> list:
+        """Retrieves the entries of the specified table with a torrent that is still tracked
+        (with a hash and neither searching nor completed)
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+
+        Raises:
+            Exception: if the table doesn't have torrents
+
+        Returns:
+            list: the list of entries
+        """
+        if table not in self.SEARCHABLE_TABLES:
+            raise Exception(f"The table must be one of the following: {self.SEARCHABLE_TABLES}")
+        cur = self._cursor()
+        cur.execute(f"SELECT * FROM {table} WHERE hash IS NOT NULL AND hash != '' AND state NOT IN (?, ?)",
+                    (self.states.SEARCHING, self.states.COMPLETED))
+        return cur.fetchall()
+
+    def get_entries(self, table: str, ids: set = (), hashes: set = ()) -> list:
+        """Retrieves the entries of the specified table with any of the specified ids or torrent hashes
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+            ids (set, optional): the entry ids
+            hashes (set, optional): the torrent hashes (case insensitive)
+
+        Raises:
+            Exception: if the table doesn't have torrents
+
+        Returns:
+            list: the list of entries
+        """
+        if table not in self.SEARCHABLE_TABLES:
+            raise Exception(f"The table must be one of the following: {self.SEARCHABLE_TABLES}")
+        hashes = {variant for hash in hashes for variant in (hash, hash.lower(), hash.upper())}
+        cur = self._cursor()
+        entries = {}
+        # Bounded number of parameters per query
+        for column, values in (("id", list(ids)), ("hash", list(hashes))):
+            for start in range(0, len(values), self.MAX_QUERY_PARAMETERS):
+                chunk = values[start:start + self.MAX_QUERY_PARAMETERS]
+                cur.execute(f"SELECT * FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk)
+                for entry in cur.fetchall():
+                    entries[entry['id']] = entry
+        return list(entries.values())
+
+    def get_changes_since(self, seq: int, limit: int = None) -> list:
+        """Retrieves the changes (inserted, updated or deleted rows) logged after the specified sequence number.
+        Updates are only logged when the state (or the hash) of the row changes.
+
+        Args:
+            seq (int): the sequence number of the last change already processed
+            limit (int, optional): the maximum number of changes to retrieve
+
+        Returns:
+            list: the changes (seq, table_name, row_id, operation and changed_at) ordered by sequence number
+        """
+        cur = self._cursor()
+        cur.execute("SELECT * FROM change_log WHERE seq>? ORDER BY seq LIMIT ?",
+                    (seq, limit if limit is not None else -1))
+        return cur.fetchall()
+
+    def get_last_change_seq(self) -> int:
+        """Retrieves the sequence number of the last logged change
+
+        Returns:
+            int: the sequence number, 0 if no change was ever logged
+        """
+        cur = self._cursor()
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name='change_log'")
+        row = cur.fetchone()
+        return row['seq'] if row else 0
+
+    def is_change_log_complete(self, seq: int) -> bool:
+        """Checks if every change after the specified sequence number is still logged (not pruned)
+
+        Args:
+            seq (int): the sequence number of the last change already processed
+
+        Returns:
+            bool: true if get_changes_since(seq) retrieves every change after seq
+        """
+        cur = self._cursor()
+        cur.execute("SELECT min(seq) as seq FROM change_log")
+        oldest_seq = cur.fetchone()['seq']
+        if oldest_seq is None:
+            return seq >= self.get_last_change_seq()
+        return oldest_seq <= seq + 1
+
+    def prune_changes(self, max_age_sec: int) -> None:
+        """Removes the changes older than the specified age
+
+        Args:
+            max_age_sec (int): the maximum age of the kept changes
+        """
+        cur = self._cursor()
+        cur.execute("DELETE FROM change_log WHERE changed_at<?", (int(time.time()) - max_age_sec,))
+        self._commit()
+
+    def update_unhashed_episode_states(self) -> None:
+        """Sets the state of every episode without a hash to the state of its season.
+        These episodes were either downloaded as part of the season or weren't released yet.
+        """
+        season_state = "(SELECT state FROM tv_show_seasons WHERE tv_show_seasons.id = tv_show_season_episodes.season_id)"
+        cur = self._cursor()
+        cur.execute(f"""UPDATE tv_show_season_episodes SET state = {season_state}
+            WHERE (hash IS NULL OR hash = '') AND state != {season_state}""")
+        self._commit()
+
+    def update_season_states(self) -> None:
+        """Sets the state of every season without a hash (episodes downloaded individually)
+        to reflect the states of its episodes (see TorrentState.parent_state)
+        """
+        episodes_state = self.states.parent_state_sql("tv_show_season_episodes", "season_id", "tv_show_seasons")
+        cur = self._cursor()
+        cur.execute(f"""UPDATE tv_show_seasons SET state = {episodes_state}
+            WHERE (hash IS NULL OR hash = '') AND state != {episodes_state}""")
+        self._commit()
+
+    def update_tv_show_states(self) -> list:
+        """Sets the state of every tv show to reflect the states of its seasons
+        (see TorrentState.parent_state). Shows marked for deletion, or whose seasons
+        are all marked for deletion, are deleted.
+
+        Returns:
+            list: the ids of the deleted tv shows
+        """
+        seasons_state = self.states.parent_state_sql("tv_show_seasons", "show_id", "tv_shows")
+        cur = self._cursor()
+        cur.execute(f"SELECT id FROM tv_shows WHERE state = ? OR {seasons_state} = ?",
+                    (self.states.DELETING, self.states.DELETING))
+        deleted_ids = [row['id'] for row in cur.fetchall()]
+        cur.executemany("DELETE FROM tv_shows WHERE id=?", [(id,) for id in deleted_ids])
+        cur.execute(f"UPDATE tv_shows SET state = {seasons_state} WHERE state != {seasons_state}")
+        self._commit()
+        return deleted_ids
+
+    def get_state_summary(self) -> dict:
+        """Retrieves the number of entries in each state, without scanning the tables
+        (the state summary is kept up to date by triggers)
+
+        Returns:
+            dict: the counts by media type (movie, tv_show, season and episode) and state,
+            e.g. {"movie": {"SEARCHING": 2}}
+        """
+        cur = self._cursor()
+        cur.execute("SELECT media_type, state, count FROM state_summary WHERE count>0")
+        summary = {}
+        for row in cur.fetchall():
+            summary.setdefault(row['media_type'], {})[row['state']] = row['count']
+        return summary
+
     def get_tv_show_season_numbers(self, show_id: int) -> set:
         """Get all seasons numbers of the specified tv show
 
@@ -689,7 +1028,7 @@ class TBDatabase:
         Returns:
             set: the tv show season numbers
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute("SELECT season_number FROM tv_show_seasons WHERE show_id=?", (show_id,))
         result = cur.fetchall()
         seasons = set()
@@ -706,7 +1045,7 @@ class TBDatabase:
         Returns:
             set: the episode numbers
         """
-        cur = self.connection.cursor()
+        cur = self._cursor()
         cur.execute(
             "SELECT episode_number FROM tv_show_season_episodes WHERE season_id=?", (season_id,))
         result = cur.fetchall()
@@ -715,25 +1054,35 @@ class TBDatabase:
             episodes.add(row['episode_number'])
         return episodes
 
-    def close(self) -> None:
-        """Close database connection"""
-        self.connection.close()
+    def get_tv_show_episode_numbers(self, show_id: int) -> dict:
+        """Get the seasons of the specified show with their episode numbers (single query)
 
+        Args:
+            show_id (int): the show id
 
-def dict_factory(cursor, row) -> dict:
-    """Transform tuple rows into a dictionary with column names and values
-
-    Args:
-        cursor: database cursor
-        row: row
+        Returns:
+            dict: the seasons by season number, dicts with the season id, season_number_episodes and
+            the set of episode numbers, e.g. {1: {"id": 7, "season_number_episodes": 10, "episodes": {1, 2}}}
+        """
+        cur = self._cursor()
+        cur.execute(
+            """SELECT tv_show_seasons.id as id, season_number, season_number_episodes, episode_number
+            FROM tv_show_seasons
+            LEFT JOIN tv_show_season_episodes ON tv_show_seasons.id = tv_show_season_episodes.season_id
+            WHERE show_id=?""", (show_id,))
+        seasons = {}
+        for row in cur.fetchall():
+            season = seasons.setdefault(row['season_number'], {
+                'id': row['id'], 'season_number_episodes': row['season_number_episodes'], 'episodes': set()})
+            if row['episode_number'] is not None:
+                season['episodes'].add(row['episode_number'])
+        return seasons
 
-    Returns:
-        dict: a dictionary containing the column names as keys and the respective values
-    """
-    output = {}
-    for idx, col in enumerate(cursor.description):
-        output[col[0]] = row[idx]
-    return output
+    def close(self) -> None:
+        """Release the connection of the current thread back to the pool.
+        The handler can still be used afterwards, a connection is acquired again when needed.
+        """
+        self.connections.release()
 
 
 if __name__ == "__main__":
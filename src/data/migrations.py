@@ -0,0 +1,276 @@
+import sqlite3
+from .air_dates import ISO_DATE_GLOB, to_iso_date
+from .states import TorrentState
+
+# The tables whose entries are searched (jackett), with their search backoff columns
+SEARCHABLE_TABLES = ("movies", "tv_show_seasons", "tv_show_season_episodes")
+SEARCH_BACKOFF_COLUMNS = {
+    "last_searched_at": "INTEGER",
+    "search_attempts": "INTEGER NOT NULL DEFAULT 0",
+    "next_search_at": "INTEGER"
+}
+
+
+def _create_tables(cur: sqlite3.Cursor) -> None:
+    """Creates the initial schema (tables and views)"""
+    # Create Movies table
+    sql = f"""CREATE TABLE IF NOT EXISTS movies (
+        "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
+        "name" TEXT UNIQUE NOT NULL,
+        "max_size_mb" INTEGER NOT NULL,
+        "resolution_profile"	TEXT NOT NULL,
+        "state" TEXT NOT NULL DEFAULT '{TorrentState.SEARCHING}',
+        "imdbid"	INTEGER UNIQUE NOT NULL,
+        "cover_url" TEXT,
+        "hash" TEXT)
+    """
+    cur.execute(sql)
+
+    # Create TV Shows Table
+    sql = f"""CREATE TABLE IF NOT EXISTS tv_shows (
+        "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
+        "name" TEXT UNIQUE NOT NULL,
+        "max_episode_size_mb" INTEGER NOT NULL,
+        "resolution_profile"	TEXT NOT NULL,
+        "imdbid"	INTEGER UNIQUE NOT NULL,
+        "state" TEXT NOT NULL DEFAULT '{TorrentState.SEARCHING}',
+        "cover_url" TEXT
+    )
+    """
+    cur.execute(sql)
+
+    # Create TV Show seasons
+    sql = f"""CREATE TABLE IF NOT EXISTS tv_show_seasons (
+        "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
+        "show_id" INTEGER,
+        "season_number" INTEGER NOT NULL,
+        "season_number_episodes" INTEGER NOT NULL,
+        "state" TEXT NOT NULL DEFAULT '{TorrentState.SEARCHING}',
+        "hash" TEXT,
+        FOREIGN KEY(show_id) REFERENCES tv_shows(id) ON DELETE CASCADE,
+        UNIQUE(show_id, season_number))
+    """
+    cur.execute(sql)
+
+    # Create TV Show season episodes
+    sql = f"""CREATE TABLE IF NOT EXISTS tv_show_season_episodes (
+        "id"	INTEGER PRIMARY KEY AUTOINCREMENT,
+        "season_id" INTEGER,
+        "name" TEXT NOT NULL,
+        "episode_number" INTEGER NOT NULL,
+        "air_date" TEXT NOT NULL,
+        "state" TEXT NOT NULL DEFAULT '{TorrentState.SEARCHING}',
+        "hash" TEXT,
+        FOREIGN KEY(season_id) REFERENCES tv_show_seasons(id) ON DELETE CASCADE,
+        UNIQUE(season_id, episode_number))
+    """
+    cur.execute(sql)
+
+    # Create tv shows with seasons view
+    sql = """CREATE VIEW IF NOT EXISTS tv_shows_with_seasons_view
+        AS
+        SELECT
+            tv_shows.id as show_id,
+            tv_shows.name as show_name,
+            tv_shows.state as show_state,
+            tv_shows.resolution_profile as resolution_profile,
+            tv_shows.name as show_name,
+            tv_shows.max_episode_size_mb as max_episode_size_mb,
+            tv_shows.imdbid as show_imdbid,
+            tv_show_seasons.id as season_id,
+            tv_show_seasons.season_number as season_number,
+            tv_show_seasons.season_number_episodes as season_number_episodes,
+            tv_show_seasons.state as season_state,
+            tv_show_seasons.hash as season_hash
+        FROM tv_shows
+        INNER JOIN tv_show_seasons on tv_shows.id = tv_show_seasons.show_id;
+    """
+    cur.execute(sql)
+
+    # Create seaons with episodes view
+    sql = """CREATE VIEW IF NOT EXISTS tv_show_seasons_with_episodes_view
+        AS
+        SELECT
+            tv_show_seasons.id as season_id,
+            tv_show_seasons.hash as season_hash,
+            tv_show_seasons.state as season_state,
+            tv_show_seasons.season_number as season_number,
+            tv_show_season_episodes.id as episode_id,
+            tv_show_season_episodes.name as episode_name,
+            tv_show_season_episodes.air_date as episode_air_date,
+            tv_show_season_episodes.episode_number as episode_number,
+            tv_show_season_episodes.state as episode_state,
+            tv_show_season_episodes.hash as episode_hash
+        FROM tv_show_seasons
+        INNER JOIN tv_show_season_episodes on tv_show_seasons.id = tv_show_season_episodes.season_id;
+    """
+    cur.execute(sql)
+
+
+def _add_search_backoff(cur: sqlite3.Cursor) -> None:
+    """Adds the search backoff columns to the searchable tables"""
+    for table in SEARCHABLE_TABLES:
+        # Databases created before migrations existed may already have the columns
+        existing_columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+        for column, definition in SEARCH_BACKOFF_COLUMNS.items():
+            if column not in existing_columns:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _add_indexes(cur: sqlite3.Cursor) -> None:
+    """Adds the state and hash indexes.
+    The show_id and season_id foreign keys are already covered by the UNIQUE(show_id, season_number)
+    and UNIQUE(season_id, episode_number) indexes.
+    """
+    cur.execute("CREATE INDEX IF NOT EXISTS movies_state_idx ON movies(state, next_search_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS movies_hash_idx ON movies(hash)")
+    cur.execute("CREATE INDEX IF NOT EXISTS tv_shows_state_idx ON tv_shows(state)")
+    cur.execute("CREATE INDEX IF NOT EXISTS tv_show_seasons_state_idx ON tv_show_seasons(state, next_search_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS tv_show_seasons_hash_idx ON tv_show_seasons(hash)")
+    cur.execute("""CREATE INDEX IF NOT EXISTS tv_show_season_episodes_state_idx
+        ON tv_show_season_episodes(state, next_search_at)""")
+    cur.execute("CREATE INDEX IF NOT EXISTS tv_show_season_episodes_hash_idx ON tv_show_season_episodes(hash)")
+
+
+def _add_change_log(cur: sqlite3.Cursor) -> None:
+    """Adds the change log table, filled by triggers with the rows that were inserted,
+    deleted or had their state (or hash) changed"""
+    cur.execute("""CREATE TABLE IF NOT EXISTS change_log (
+        "seq" INTEGER PRIMARY KEY AUTOINCREMENT,
+        "table_name" TEXT NOT NULL,
+        "row_id" INTEGER NOT NULL,
+        "operation" TEXT NOT NULL,
+        "changed_at" INTEGER NOT NULL DEFAULT (strftime('%s', 'now')))
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS change_log_changed_at_idx ON change_log(changed_at)")
+    tracked_columns = {
+        "movies": ["state", "hash"],
+        "tv_shows": ["state"],
+        "tv_show_seasons": ["state", "hash"],
+        "tv_show_season_episodes": ["state", "hash"],
+    }
+    for table, columns in tracked_columns.items():
+        changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in columns)
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_insert_log AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO change_log(table_name, row_id, operation) VALUES('{table}', NEW.id, 'INSERT');
+            END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_update_log AFTER UPDATE OF {", ".join(columns)} ON {table}
+            WHEN {changed}
+            BEGIN
+                INSERT INTO change_log(table_name, row_id, operation) VALUES('{table}', NEW.id, 'UPDATE');
+            END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_delete_log AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log(table_name, row_id, operation) VALUES('{table}', OLD.id, 'DELETE');
+            END""")
+
+
+def _add_state_summary(cur: sqlite3.Cursor) -> None:
+    """Adds the state summary table (number of entries per media type and state), filled with the
+    current counts and kept up to date by triggers"""
+    cur.execute("""CREATE TABLE IF NOT EXISTS state_summary (
+        "media_type" TEXT NOT NULL,
+        "state" TEXT NOT NULL,
+        "count" INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY(media_type, state)) WITHOUT ROWID
+    """)
+    increment = """INSERT INTO state_summary(media_type, state, count) VALUES('{media_type}', NEW.state, 1)
+        ON CONFLICT(media_type, state) DO UPDATE SET count = count + 1;"""
+    decrement = """UPDATE state_summary SET count = count - 1
+        WHERE media_type = '{media_type}' AND state = OLD.state;"""
+    for table, media_type in TABLE_MEDIA_TYPES.items():
+        cur.execute("DELETE FROM state_summary WHERE media_type=?", (media_type,))
+        cur.execute(f"""INSERT INTO state_summary(media_type, state, count)
+            SELECT '{media_type}', state, count(*) FROM {table} GROUP BY state""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_insert_summary AFTER INSERT ON {table}
+            BEGIN
+                {increment.format(media_type=media_type)}
+            END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_update_summary AFTER UPDATE OF state ON {table}
+            WHEN OLD.state IS NOT NEW.state
+            BEGIN
+                {decrement.format(media_type=media_type)}
+                {increment.format(media_type=media_type)}
+            END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_delete_summary AFTER DELETE ON {table}
+            BEGIN
+                {decrement.format(media_type=media_type)}
+            END""")
+
+
+def _add_next_air_dates(cur: sqlite3.Cursor) -> None:
+    """Normalizes the episode air dates to ISO format (YYYY-MM-DD), adds an air date index and
+    the next air date of each tv show (earliest air date after today of its episodes)"""
+    episodes = cur.execute("SELECT id, air_date FROM tv_show_season_episodes").fetchall()
+    cur.executemany("UPDATE tv_show_season_episodes SET air_date=? WHERE id=?",
+                    [(to_iso_date(air_date), id) for id, air_date in episodes if to_iso_date(air_date) != air_date])
+    cur.execute("CREATE INDEX IF NOT EXISTS tv_show_season_episodes_air_date_idx ON tv_show_season_episodes(air_date)")
+    existing_columns = {row[1] for row in cur.execute("PRAGMA table_info(tv_shows)").fetchall()}
+    if "next_air_date" not in existing_columns:
+        cur.execute("ALTER TABLE tv_shows ADD COLUMN next_air_date TEXT")
+    cur.execute(f"""UPDATE tv_shows SET next_air_date = (
+        SELECT min(air_date) FROM tv_show_season_episodes
+        INNER JOIN tv_show_seasons ON tv_show_seasons.id = tv_show_season_episodes.season_id
+        WHERE tv_show_seasons.show_id = tv_shows.id AND air_date > date('now', 'localtime')
+            AND air_date GLOB '{ISO_DATE_GLOB}')""")
+
+
+# The media type of each table in the state summary
+TABLE_MEDIA_TYPES = {
+    "movies": "movie",
+    "tv_shows": "tv_show",
+    "tv_show_seasons": "season",
+    "tv_show_season_episodes": "episode",
+}
+
+# The schema version (PRAGMA user_version) is the number of applied migrations.
+# Migrations are only ever appended, never changed or removed.
+MIGRATIONS = [
+    _create_tables,
+    _add_search_backoff,
+    _add_indexes,
+    _add_change_log,
+    _add_state_summary,
+    _add_next_air_dates,
+]
+
+
+def get_schema_version(connection: sqlite3.Connection) -> int:
+    """Retrieves the schema version of the database
+
+    Args:
+        connection (sqlite3.Connection): the database connection
+
+    Returns:
+        int: the number of applied migrations
+    """
+    cur = connection.cursor()
+    cur.row_factory = None
+    return cur.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """Applies every pending migration, each one in its own transaction
+
+    Args:
+        connection (sqlite3.Connection): the database connection
+
+    Returns:
+        int: the schema version after the migration
+    """
+    while get_schema_version(connection) < len(MIGRATIONS):
+        cur = connection.cursor()
+        cur.row_factory = None
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated the database in the meantime
+            version = get_schema_version(connection)
+            if version < len(MIGRATIONS):
+                MIGRATIONS[version](cur)
+                cur.execute(f"PRAGMA user_version = {version + 1}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return get_schema_version(connection)
@@ -0,0 +1,176 @@
+from collections import deque
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+
+
+class QueryStats:
+    """
+    In-process statistics of the SQL statements executed by the database handlers: number of
+    executions, total time and p50/p99 of the most recent executions of each statement.
+    Statements slower than the threshold are logged together with their query plan.
+
+    Statements are grouped by their normalized text (whitespace collapsed, placeholder lists
+    such as IN (?,?,?) merged), so the parameters don't create new entries.
+
+    Attributes
+    ----------
+    slow_query_ms : float
+        the execution time above which a statement is logged as slow
+    max_samples : int
+        the number of most recent execution times kept per statement for the percentiles
+    """
+
+    def __init__(self, slow_query_ms: float = 100, max_samples: int = 1000) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.max_samples = max_samples
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """Normalizes the statement text used to group the executions
+
+        Args:
+            sql (str): the SQL statement
+
+        Returns:
+            str: the normalized statement
+        """
+        return _PLACEHOLDER_LIST.sub("?, ...", _WHITESPACE.sub(" ", sql).strip())
+
+    def record(self, sql: str, elapsed_sec: float, explain=None) -> None:
+        """Records an execution of the specified statement, logging it if it's slow
+
+        Args:
+            sql (str): the SQL statement
+            elapsed_sec (float): the execution time (including fetching the rows)
+            explain (callable, optional): returns the query plan of the statement, called for slow statements
+        """
+        sql = self.normalize(sql)
+        with self._lock:
+            statement = self._statements.get(sql)
+            if statement is None:
+                statement = self._statements[sql] = {"count": 0, "total_sec": 0.0,
+                                                     "samples": deque(maxlen=self.max_samples)}
+            statement["count"] += 1
+            statement["total_sec"] += elapsed_sec
+            statement["samples"].append(elapsed_sec)
+        if elapsed_sec * 1000 >= self.slow_query_ms:
+            plan = explain() if explain else None
+            logging.warning(f"Slow query ({elapsed_sec * 1000:.1f} ms): {sql}" + (f"\n{plan}" if plan else ""))
+
+    def get_stats(self) -> list:
+        """Retrieves the statistics of every executed statement
+
+        Returns:
+            list: dicts with the sql, count, total_ms, p50_ms and p99_ms of each statement,
+            the statements that took the most time first
+        """
+        with self._lock:
+            statements = [(sql, statement["count"], statement["total_sec"], sorted(statement["samples"]))
+                          for sql, statement in self._statements.items()]
+        stats = [{
+            "sql": sql,
+            "count": count,
+            "total_ms": total_sec * 1000,
+            "p50_ms": self.percentile(samples, 50) * 1000,
+            "p99_ms": self.percentile(samples, 99) * 1000,
+        } for sql, count, total_sec, samples in statements]
+        return sorted(stats, key=lambda stat: stat["total_ms"], reverse=True)
+
+    @staticmethod
+    def percentile(samples: list, percent: float) -> float:
+        """Calculates a percentile (nearest rank)
+
+        Args:
+            samples (list): the sorted samples
+            percent (float): the percentile, between 0 and 100
+
+        Returns:
+            float: the percentile, 0 without samples
+        """
+        if not samples:
+            return 0.0
+        return samples[max(math.ceil(percent / 100 * len(samples)) - 1, 0)]
+
+    def reset(self) -> None:
+        """Discards the statistics"""
+        with self._lock:
+            self._statements = {}
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that records the time of every statement in a QueryStats object.
+    The rows are fetched while timing the statement (sqlite runs a query as its rows are
+    fetched) and then served from memory.
+
+    Attributes
+    ----------
+    query_stats : QueryStats
+        the statistics where the statements are recorded
+    """
+
+    query_stats = None
+
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        self._rows = deque()
+
+    def execute(self, sql: str, parameters=()) -> "TimedCursor":
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._rows = deque(super().fetchall() if self.description else ())
+        self.query_stats.record(sql, time.perf_counter() - start, lambda: self.explain(sql, parameters))
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters) -> "TimedCursor":
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._rows = deque()
+        self.query_stats.record(sql, time.perf_counter() - start)
+        return self
+
+    def explain(self, sql: str, parameters=()) -> str:
+        """Retrieves the query plan of the specified statement
+
+        Args:
+            sql (str): the SQL statement
+            parameters: the statement parameters
+
+        Returns:
+            str: the query plan, None if the statement can't be explained (e.g. pragmas)
+        """
+        cur = self.connection.cursor()
+        cur.row_factory = None
+        try:
+            return "\n".join(row[3] for row in cur.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall())
+        except sqlite3.Error:
+            return None
+
+    def fetchone(self):
+        return self._rows.popleft() if self._rows else None
+
+    def fetchmany(self, size: int = None) -> list:
+        size = self.arraysize if size is None else size
+        return [self._rows.popleft() for _ in range(min(size, len(self._rows)))]
+
+    def fetchall(self) -> list:
+        rows = list(self._rows)
+        self._rows.clear()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._rows:
+            raise StopIteration
+        return self._rows.popleft()
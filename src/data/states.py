@@ -0,0 +1,71 @@
+class TorrentState:
+    SEARCHING = "SEARCHING"  # Still being searched
+    DOWNLOADING = "DOWNLOADING"  # Currently being downloading
+    SEEDING = "SEEDING"  # Currently uploading
+    COMPLETED = "COMPLETED"  # Removed from seeding
+    DELETING = "DELETING"  # Torrent marked for deletion
+    PAUSED = "PAUSED"  # Download stopped
+
+    @staticmethod
+    def get_states() -> list:
+        return [
+            TorrentState.SEARCHING,
+            TorrentState.DOWNLOADING,
+            TorrentState.SEEDING,
+            TorrentState.COMPLETED,
+            TorrentState.DELETING,
+            TorrentState.PAUSED
+        ]
+
+    @staticmethod
+    def parent_state(current_parent_state: str, child_states: set) -> str:
+        """Calculates the parent (show or season) state that reflects the child
+        states (season or episode)
+
+        Args:
+            current_parent_state (str): the current parent state
+            child_states (set): the children state set
+
+        Returns:
+            str: the new parent state
+        """
+        parent_state = current_parent_state
+        if TorrentState.SEARCHING in child_states:
+            parent_state = TorrentState.SEARCHING
+        elif TorrentState.DOWNLOADING in child_states:
+            parent_state = TorrentState.DOWNLOADING
+        elif TorrentState.PAUSED in child_states:
+            parent_state = TorrentState.PAUSED
+        if len(child_states) == 1 and not current_parent_state in child_states:
+            if TorrentState.COMPLETED in child_states:
+                parent_state = TorrentState.COMPLETED
+            elif TorrentState.SEEDING in child_states:
+                parent_state = TorrentState.SEEDING
+            elif TorrentState.DELETING in child_states:
+                parent_state = TorrentState.DELETING
+
+        return parent_state
+
+    @staticmethod
+    def parent_state_sql(child_table: str, parent_key: str, parent_table: str) -> str:
+        """Builds the SQL expression equivalent to parent_state, evaluated for each
+        row of the parent table (correlated subquery over its children).
+
+        A single child state is always taken by the parent. Otherwise the parent is searching,
+        downloading or paused if any child is (in this order), or keeps its state.
+
+        Args:
+            child_table (str): the child table (e.g. tv_show_season_episodes)
+            parent_key (str): the column of the child table referencing the parent (e.g. season_id)
+            parent_table (str): the parent table (e.g. tv_show_seasons)
+
+        Returns:
+            str: the SQL expression
+        """
+        return f"""(SELECT CASE
+                WHEN count(DISTINCT state) = 1 THEN min(state)
+                WHEN max(state = '{TorrentState.SEARCHING}') THEN '{TorrentState.SEARCHING}'
+                WHEN max(state = '{TorrentState.DOWNLOADING}') THEN '{TorrentState.DOWNLOADING}'
+                WHEN max(state = '{TorrentState.PAUSED}') THEN '{TorrentState.PAUSED}'
+                ELSE {parent_table}.state
+            END FROM {child_table} WHERE {parent_key} = {parent_table}.id)"""
@@ -35,9 +35,10 @@ class MovieProbe(Probe):
             data_path: str,
             movies_storage_dir: str,
             retention_period_sec: int,
+            **kwargs
     ) -> None:
         super().__init__(jackett_api_key, jackett_api_url, qbit_hostname,
-                         qbit_port, data_path, movies_storage_dir, retention_period_sec)
+                         qbit_port, data_path, movies_storage_dir, retention_period_sec, **kwargs)
 
     @staticmethod
     def new(config: config):
@@ -57,20 +58,27 @@ class MovieProbe(Probe):
             config.DB_PATH,
             config.movies.directory,
             config.movies.rentention_period_sec,
+            search_interval_sec=config.scheduler.search_interval_sec,
+            poll_interval_sec=config.scheduler.poll_interval_sec,
+            idle_poll_interval_sec=config.scheduler.idle_poll_interval_sec,
+            max_search_interval_sec=config.scheduler.max_search_interval_sec,
+            full_sweep_interval_sec=config.scheduler.full_sweep_interval_sec,
+            jackett_cache_path=config.JACKETT_CACHE_PATH,
+            jackett_cache_ttl_sec=config.jackett.cache_ttl_sec,
         )
 
     def probe(self) -> None:
         """Search and download movies added to the database.
-        Only probe if the database 'state' column matches the self.db.states.SEARCHING state.
+        Only probe if the database 'state' column matches the self.db.states.SEARCHING state
+        and the movie search is due.
         """
-        for movie_row in self.db.get_movies_by_state(state=self.db.states.SEARCHING):
+        for movie_row in self.db.get_movies_by_state(state=self.db.states.SEARCHING, due=True):
             jackett_result = self.jackett.search_movies(
-                name=movie_row.get("name"),
-                resolution_profile=set(movie_row.get(
-                    "resolution_profile").split(',')),
-                max_size_bytes=self.mb_to_bytes(movie_row.get("max_size_mb")),
+                name=movie_row["name"],
+                resolution_profile=set(movie_row["resolution_profile"].split(',')),
+                max_size_bytes=self.mb_to_bytes(movie_row["max_size_mb"]),
                 min_number_seeds=2,
-                imdbid=movie_row.get('imdbid')
+                imdbid=movie_row['imdbid']
             )
             if jackett_result:
                 movie = jackett_result[0]  # Highest number of seeds
@@ -80,18 +88,34 @@ class MovieProbe(Probe):
                     id=movie_row["id"],
                     state=self.db.states.DOWNLOADING,
                     hash=movie["InfoHash"],
+                    search_attempts=0,
+                    next_search_at=None,
                 )
             else:
-                logging.info(f"Movie {movie_row.get('name')} not found!")
+                logging.info(f"Movie {movie_row['name']} not found!")
+                self.record_search_miss(movie_row["id"], "MOVIE")
+
+    def get_next_search_at(self) -> int:
+        """Retrieves the time of the next postponed movie search
+
+        Returns:
+            int: the time (epoch seconds) or None if no search is postponed
+        """
+        return self.db.get_next_search_at("movies")
 
     def update(self) -> None:
         """Updates the database state to reflect the current downloads
         """
-        movies = self.db.get_all_movies()
+        # Only the movies or torrents that changed since the previous cycle, unless it's a full sweep
+        changed_ids = self.collect_changes()
+        if changed_ids is None:
+            movies = self.db.get_all_movies()
+        else:
+            movies = self.db.get_entries('movies', changed_ids.get('movies', ()), self.qbit.changed_hashes)
         for movie in movies:
-            id = movie.get("id")
-            state = movie.get("state")
-            hash = movie.get("hash")
+            id = movie["id"]
+            state = movie["state"]
+            hash = movie["hash"]
 
             # Do nothing with movies not found or already completed
             if state in [self.db.states.SEARCHING, self.db.states.COMPLETED]:
@@ -99,7 +123,11 @@ class MovieProbe(Probe):
 
             # Catch movies without hashes
             if not hash:
-                self.db.delete_movie(id)
+                self.queue_write(self.db.delete_movie, id)
                 continue
 
-            self.update_torrent_states(id, hash, state, type="MOVIE")
+            self.update_torrent_states(id, hash, state, type="MOVIE", force=changed_ids is not None)
+
+        # The state updates are committed at once, after the qbittorrent requests
+        with self.db.transaction():
+            self.apply_writes()
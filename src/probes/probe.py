@@ -2,12 +2,21 @@ import logging
 import time
 from abc import ABC, abstractmethod
 from tools import JackettClient
+from tools import JackettCache
 from tools import QbittorrentClient
 from data import TBDatabase
-from requests.exceptions import ConnectionError
+from utils.scheduler import Scheduler
+from requests.exceptions import ConnectionError, Timeout
 from imdb._exceptions import IMDbDataAccessError
 from qbittorrentapi.exceptions import APIConnectionError
 
+SEARCH_TABLES = {
+    'MOVIE': 'movies',
+    'SEASON': 'tv_show_seasons',
+    'EPISODE': 'tv_show_season_episodes'
+}
+
+
 class Probe(ABC):
     """
     Torrent Bot Probe (Abs)
@@ -28,6 +37,22 @@ class Probe(ABC):
         the path were the data will be stored
     retention_period_sec:int
         the maximum seeding period after which the torrents get removed
+    search_interval_sec: int
+        the period between searches for items that weren't found
+    poll_interval_sec: int
+        the period between torrent state checks for active torrents (downloading or deleting)
+    idle_poll_interval_sec: int
+        the period between torrent state checks for idle torrents (seeding or paused)
+    max_search_interval_sec: int
+        the maximum period between searches for items that weren't found (the period doubles
+        after every unsuccessful search, starting at search_interval_sec)
+    full_sweep_interval_sec: int
+        the period between full reconciliations of every entry, in between only the entries and
+        torrents that changed since the previous cycle are reconciled
+    jackett_cache_path: str
+        the jackett results cache file path, None to disable the cache
+    jackett_cache_ttl_sec: dict
+        the time to live of the cached jackett results of each category
     """
 
     def __init__(
@@ -39,58 +64,227 @@ class Probe(ABC):
             data_path: str,
             storage_dir: str,
             retention_period_sec: int,
+            search_interval_sec: int = 900,
+            poll_interval_sec: int = 5,
+            idle_poll_interval_sec: int = 60,
+            max_search_interval_sec: int = 86400,
+            full_sweep_interval_sec: int = 300,
+            jackett_cache_path: str = None,
+            jackett_cache_ttl_sec: dict = None,
     ) -> None:
-        self.jackett = JackettClient(jackett_api_key, jackett_api_url)
+        jackett_cache = None
+        if jackett_cache_path:
+            jackett_cache = JackettCache(jackett_cache_path, jackett_cache_ttl_sec)
+        self.jackett = JackettClient(jackett_api_key, jackett_api_url, cache=jackett_cache)
         self.qbit = QbittorrentClient(qbit_hostname, qbit_port)
-        self.db = TBDatabase(data_path)
+        # Probes may run on any worker thread, but never on two at the same time
+        self.db = TBDatabase(data_path, row_mode="row")
         self.storage_dir = storage_dir
         self.retention_period_sec = retention_period_sec
+        self.search_interval_sec = search_interval_sec
+        self.poll_interval_sec = poll_interval_sec
+        self.idle_poll_interval_sec = idle_poll_interval_sec
+        self.max_search_interval_sec = max_search_interval_sec
+        self.full_sweep_interval_sec = full_sweep_interval_sec
+        self.scheduler = Scheduler()
+        self.change_seq = None
+        self.next_full_sweep_at = 0
+        self.retry_at = 0
+        self.next_search_at = None
+        self.torrents = None
+        self.pending_writes = []
 
     def start(self) -> None:
-        """Starts the probe which initiates the search, download and update
+        """Starts the probe which initiates the search, download and update.
+        Only the items which are due are processed.
         """
+        if time.time() < self.retry_at:
+            return
+        self.torrents = None
+        self.pending_writes = []
         try:
             self.probe()
             self.update()
-        except ConnectionError:
+            self.next_search_at = self.get_next_search_at()
+        except (ConnectionError, Timeout):
             logging.info(f"Failed to reach jackett!")
+            self.retry_at = time.time() + self.poll_interval_sec
         except APIConnectionError:
             logging.info(f"Failed to reach qbittorrent!")
+            self.retry_at = time.time() + self.poll_interval_sec
         except IMDbDataAccessError:
             logging.error(f"Failed to find show information on imdb")
+            self.retry_at = time.time() + self.poll_interval_sec
+        finally:
+            # Give the connection of the worker thread back to the pool
+            self.db.close()
+        if self.jackett.cache:
+            logging.debug(f"Jackett cache {self.jackett.cache.stats()}")
+
+    def next_due(self) -> float:
+        """Retrieves the time at which the probe has work to do
+
+        Returns:
+            float: the next due time or None if there's nothing scheduled
+        """
+        due_times = [due for due in (self.scheduler.next_due(), self.next_search_at) if due is not None]
+        if not due_times:
+            return None
+        return max(min(due_times), self.retry_at)
+
+    def is_due(self, id: int, type: str, state: str) -> bool:
+        """Checks if the specified item is due
+
+        Args:
+            id (int): the id
+            type (str): Either SHOW, SEASON, EPISODE or MOVIE
+            state (str): the current state
+
+        Returns:
+            bool: true if the item is due, false otherwise
+        """
+        return self.scheduler.is_due((type, id), state)
+
+    def record_search_miss(self, id: int, type: str) -> None:
+        """Postpone the next search of an item that wasn't found (exponential backoff)
+
+        Args:
+            id (int): the id
+            type (str): Either SEASON, EPISODE or MOVIE
+        """
+        self.db.record_search_miss(SEARCH_TABLES[type], id, self.search_interval_sec, self.max_search_interval_sec)
+
+    def reschedule(self, id: int, type: str, state: str) -> None:
+        """Schedule the next check of the specified item according to its state.
+        Searching items are retried after the search interval, active torrents after the
+        poll interval and idle torrents after the idle poll interval.
+        Note: searches of movies, seasons and episodes are postponed through record_search_miss instead.
+
+        Args:
+            id (int): the id
+            type (str): Either SHOW, SEASON, EPISODE or MOVIE
+            state (str): the current state
+        """
+        if state == self.db.states.SEARCHING:
+            delay_sec = self.search_interval_sec
+        elif state in [self.db.states.DOWNLOADING, self.db.states.DELETING]:
+            delay_sec = self.poll_interval_sec
+        else:
+            delay_sec = self.idle_poll_interval_sec
+        self.scheduler.schedule((type, id), delay_sec, state)
 
     @abstractmethod
     def probe(self):
         pass
 
+    @abstractmethod
+    def get_next_search_at(self) -> int:
+        pass
+
     @abstractmethod
     def update(self):
         pass
 
-    def update_torrent_states(self, id: int, hash: str, current_state: str, type: str) -> None:
+    def collect_changes(self) -> dict:
+        """Syncs the torrent mirror and collects the database entries that changed since the previous cycle.
+        Every entry must be reconciled on the first cycle, periodically (full sweep) and whenever
+        some changes may be missing.
+
+        Returns:
+            dict: the ids of the changed entries by table, or None if every entry must be reconciled
+        """
+        self.torrents = self.qbit.sync()
+        now = time.time()
+        if (self.change_seq is None or self.qbit.full_update or now >= self.next_full_sweep_at
+                or not self.db.is_change_log_complete(self.change_seq)):
+            self.change_seq = self.db.get_last_change_seq()
+            self.next_full_sweep_at = now + self.full_sweep_interval_sec
+            self.db.prune_changes(max_age_sec=2 * self.full_sweep_interval_sec)
+            return None
+
+        changed_ids = {}
+        for change in self.db.get_changes_since(self.change_seq):
+            changed_ids.setdefault(change['table_name'], set()).add(change['row_id'])
+            self.change_seq = change['seq']
+        return changed_ids
+
+    def get_entries_to_reconcile(self, table: str, changed_ids: dict) -> list:
+        """Retrieves the entries of the specified table whose torrent may need to be reconciled:
+        every entry with an active torrent or, unless it's a full sweep, only the changed ones.
+
+        Args:
+            table (str): the table (movies, tv_show_seasons or tv_show_season_episodes)
+            changed_ids (dict): the ids of the changed entries by table (see collect_changes)
+
+        Returns:
+            list: the entries
+        """
+        if changed_ids is None:
+            return self.db.get_active_torrents(table)
+        return [entry for entry in self.db.get_entries(table, changed_ids.get(table, ()), self.qbit.changed_hashes)
+                if entry['hash'] and entry['state'] not in (self.db.states.SEARCHING, self.db.states.COMPLETED)]
+
+    def queue_write(self, write, *args) -> None:
+        """Queues a database write, applied later by apply_writes.
+        The torrent reconciliation talks to qbittorrent first and writes the outcome afterwards, so the
+        database write lock is never held during qbittorrent requests.
+
+        Args:
+            write (callable): the database write
+            args: the write arguments
+        """
+        self.pending_writes.append((write, args))
+
+    def apply_writes(self) -> None:
+        """Applies the queued database writes (see queue_write), in the caller's transaction if any"""
+        pending_writes, self.pending_writes = self.pending_writes, []
+        for write, args in pending_writes:
+            write(*args)
+
+    def get_torrent(self, hash: str) -> dict:
+        """Retrieves the torrent with the specified hash from the qbittorrent mirror.
+        The mirror is synced with the changes since the previous cycle, the first time a torrent is
+        needed in a cycle.
+
+        Args:
+            hash (str): the torrent hash
+
+        Returns:
+            dict: the torrent or None if qbittorrent doesn't have it
+        """
+        if self.torrents is None:
+            self.torrents = self.qbit.sync()
+        return self.torrents.get(hash.lower())
+
+    def update_torrent_states(self, id: int, hash: str, current_state: str, type: str, force: bool = False) -> None:
         """Update the db states to match the torrent states and vice-versa.
+        The qbittorrent requests are made right away, the database changes are queued (see queue_write).
 
         Args:
             id (int): the id
             hash (str): the torrent hash
             current_state (str): the current state
             type (str): Either SEASON, EPISODE or MOVIE
+            force (bool, optional): if true, update even if the item isn't due (e.g. it changed)
         """
         if type not in ['SEASON', 'EPISODE', 'MOVIE']:
             raise Exception(f"invalid type: {type}")
 
+        if not force and not self.is_due(id, type, current_state):
+            return
+        self.reschedule(id, type, current_state)
+
         new_state = current_state
-        torrents = self.qbit.torrents_info(status_filter=None, hashes=hash)
+        torrent = self.get_torrent(hash)
 
         # If it can't find the torrent, it was deleted manually by the user, delete from db as well
-        if not torrents:
-            self._delete_db_entry(id, type)
-
-        for torrent in torrents:
+        if torrent is None:
+            self.queue_write(self._delete_db_entry, id, type)
+        else:
             # Remove torrent marked for deleting
             if new_state == self.db.states.DELETING:
                 self.qbit.delete(hash)
-                self._delete_db_entry(id, type)
+                self.queue_write(self._delete_db_entry, id, type)
 
             # State changed from paused, therefore resume
             if current_state != self.db.states.PAUSED and 'paused' in torrent["state"].lower():
@@ -101,11 +295,11 @@ class Probe(ABC):
                 time_since_added_sec = int(time.time()) - int(torrent["added_on"])
                 if time_since_added_sec > self.retention_period_sec:
                     self.qbit.delete(hash)
-                    self._update_db_entry_state(id, type, self.db.states.COMPLETED)
+                    self.queue_write(self._update_db_entry_state, id, type, self.db.states.COMPLETED)
 
             # Change the torrent state if it finished the download and it's now uploading
             if current_state == self.db.states.DOWNLOADING and torrent["state"] == "uploading":
-                self._update_db_entry_state(id, type, self.db.states.SEEDING)
+                self.queue_write(self._update_db_entry_state, id, type, self.db.states.SEEDING)
 
             # Stop download for torrents stopped
             if current_state == self.db.states.PAUSED and 'paused' not in torrent["state"].lower():
@@ -118,6 +312,7 @@ class Probe(ABC):
             id (int): the id of the databse
             type (str): the type (EPISODE, SEASON or MOVIE)
         """
+        self.scheduler.forget((type, id))
         if type == 'EPISODE':
             self.db.delete_episode(id)
         elif type == 'SEASON':
@@ -152,4 +347,5 @@ class Probe(ABC):
 
     def shutdown(self) -> None:
         """Close resources"""
+        self.jackett.close()
         self.db.close()
@@ -1,5 +1,6 @@
 import logging
-from datetime import datetime
+import time
+from data.air_dates import get_air_timestamp, today
 from tools import IMDBFinder
 from utils import config
 from .probe import Probe
@@ -25,6 +26,17 @@ class TVShowProbe(Probe):
         the path were the TV Shows will be stored
     retention_period_sec:int
         the maximum seeding period after which the torrents get removed
+    imdb_cache_path: str
+        the imdb show metadata cache file path, None to disable the cache
+    imdb_cache_ttl_sec: dict
+        the time to live of the cached show metadata of each show status (ended, airing or unknown)
+    air_date_burst_sec: int
+        the period after an episode air date during which the episode is searched every
+        air_date_burst_interval_sec, before the regular search backoff
+    air_date_burst_interval_sec: int
+        the period between searches of an episode that aired recently
+    imdb_workers: int
+        the maximum number of shows fetched from imdb at the same time
     """
 
     def __init__(
@@ -36,10 +48,20 @@ class TVShowProbe(Probe):
             data_path: str,
             tv_shows_storage_dir: str,
             retention_period_sec: int,
+            imdb_cache_path: str = None,
+            imdb_cache_ttl_sec: dict = None,
+            air_date_burst_sec: int = 172800,
+            air_date_burst_interval_sec: int = 300,
+            imdb_workers: int = 4,
+            **kwargs
     ) -> None:
         super().__init__(jackett_api_key, jackett_api_url, qbit_hostname,
-                         qbit_port, data_path, tv_shows_storage_dir, retention_period_sec)
-        self.imdb_finder = IMDBFinder()
+                         qbit_port, data_path, tv_shows_storage_dir, retention_period_sec, **kwargs)
+        self.imdb_finder = IMDBFinder(imdb_cache_path, imdb_cache_ttl_sec)
+        self.air_date_burst_sec = air_date_burst_sec
+        self.air_date_burst_interval_sec = air_date_burst_interval_sec
+        self.imdb_workers = imdb_workers
+        self.imdb_fetch_errors = {}
 
     @staticmethod
     def new(config: config):
@@ -59,54 +81,128 @@ class TVShowProbe(Probe):
             config.DB_PATH,
             config.shows.directory,
             config.shows.rentention_period_sec,
+            search_interval_sec=config.scheduler.search_interval_sec,
+            poll_interval_sec=config.scheduler.poll_interval_sec,
+            idle_poll_interval_sec=config.scheduler.idle_poll_interval_sec,
+            max_search_interval_sec=config.scheduler.max_search_interval_sec,
+            full_sweep_interval_sec=config.scheduler.full_sweep_interval_sec,
+            jackett_cache_path=config.JACKETT_CACHE_PATH,
+            jackett_cache_ttl_sec=config.jackett.cache_ttl_sec,
+            imdb_cache_path=config.IMDB_CACHE_PATH,
+            imdb_cache_ttl_sec=config.imdb.cache_ttl_sec,
+            air_date_burst_sec=config.scheduler.air_date_burst_sec,
+            air_date_burst_interval_sec=config.scheduler.air_date_burst_interval_sec,
+            imdb_workers=config.imdb.workers,
         )
 
     def probe(self) -> None:
         """Search and download tv shows added to the database (state=SEARCHING)
-        Only probe if the database 'state' column matches the self.db.states.SEARCHING state.
+        Only probe if the database 'state' column matches the self.db.states.SEARCHING state
+        and the show, season or episode search is due.
         """
-        # Keep searching for new episodes and seasons while the show isn't complete
-        for show in self.db.get_tv_shows_by_state(state=self.db.states.SEARCHING):
-            self.search_seasons(show)
+        # Keep searching for new episodes and seasons while the show isn't complete,
+        # nothing changes until the next known episode airs
+        due_shows = [show for show in self.db.get_tv_shows_by_state(state=self.db.states.SEARCHING)
+                     if not (show['next_air_date'] and show['next_air_date'] > today())
+                     and self.is_due(show['id'], 'SHOW', show['state'])]
+        if due_shows:
+            self.search_seasons(due_shows)
 
         # Search for the torrents of the seasons
-        for season in self.db.get_tv_show_with_seasons_by_state(state=self.db.states.SEARCHING):
+        for season in self.db.get_tv_show_with_seasons_by_state(state=self.db.states.SEARCHING, due=True):
             self.download_season(season)
 
-    def search_seasons(self, tv_show: dict) -> None:
-        """Search for new seasons and episodes of the specified show
+    def search_seasons(self, tv_shows: list) -> None:
+        """Search for new seasons and episodes of the specified shows.
+        The shows are fetched from imdb concurrently (imdb_workers) and stored in a single commit.
+        Known seasons with every episode are only retrieved from imdb (or the imdb cache) if
+        they're the latest season, and the imdb seasons are compared in memory to the known episodes.
+
+        A show that couldn't be fetched doesn't block the others, it's retried later (see record_fetch_error).
+
+        Args:
+            tv_shows (list): the tv show database entries
+        """
+        known_seasons = {show['id']: self.db.get_tv_show_episode_numbers(show['id']) for show in tv_shows}
+        imdb_shows = self.imdb_finder.fetch_shows(
+            {show['imdbid']: self.get_complete_seasons(known_seasons[show['id']]) for show in tv_shows},
+            workers=self.imdb_workers)
+
+        with self.db.transaction():
+            for show in tv_shows:
+                imdb_show = imdb_shows[show['imdbid']]
+                if isinstance(imdb_show, Exception):
+                    self.record_fetch_error(show, imdb_show)
+                    continue
+                self.imdb_fetch_errors.pop(show['id'], None)
+                self.store_seasons(show['id'], known_seasons[show['id']], imdb_show)
+                self.reschedule(show['id'], 'SHOW', show['state'])
+
+    def record_fetch_error(self, tv_show: dict, error: Exception) -> None:
+        """Postpone the next imdb fetch of a show that couldn't be fetched (exponential backoff,
+        like record_search_miss)
 
         Args:
             tv_show (dict): the tv show database entry
+            error (Exception): the imdb error
+        """
+        attempts = self.imdb_fetch_errors[tv_show['id']] = self.imdb_fetch_errors.get(tv_show['id'], 0) + 1
+        delay_sec = min(self.search_interval_sec * 2 ** (attempts - 1), self.max_search_interval_sec)
+        logging.warning(f"Failed to fetch show {tv_show['name']} ({tv_show['imdbid']}) from imdb, "
+                        f"retrying in {delay_sec} seconds: {error}")
+        self.scheduler.schedule(('SHOW', tv_show['id']), delay_sec, tv_show['state'])
+
+    @staticmethod
+    def get_complete_seasons(known_seasons: dict) -> set:
+        """Retrieves the known seasons that don't need to be retrieved from imdb again:
+        every season with all its episodes, except for the latest season
+
+        Args:
+            known_seasons (dict): the known seasons and episodes (see TBDatabase.get_tv_show_episode_numbers)
+
+        Returns:
+            set: the season numbers
+        """
+        latest_season_number = max(known_seasons, default=None)
+        return {season_number for season_number, season in known_seasons.items()
+                if season_number != latest_season_number and
+                len(season['episodes']) >= season['season_number_episodes']}
+
+    def store_seasons(self, show_id: int, known_seasons: dict, imdb_show: dict) -> None:
+        """Stores the new seasons and episodes of the specified show
+
+        Args:
+            show_id (int): the show id
+            known_seasons (dict): the known seasons and episodes (see TBDatabase.get_tv_show_episode_numbers)
+            imdb_show (dict): the imdb show metadata (see IMDBFinder.fetch_show)
         """
-        show_id = tv_show.get('id')
-        show_imdbid = tv_show.get('imdbid')
-        known_seasons = self.db.get_tv_show_season_numbers(show_id)
-        imdb_show = self.imdb_finder.fetch_show(show_imdbid)
-
-        # Search on imdb for all seasons of the show
-        for imdb_season_number in imdb_show['episodes']:
-            imdb_season = imdb_show['episodes'][imdb_season_number]
-            if imdb_season_number not in known_seasons:
-                season_id = self.db.add_tv_show_season(
-                    show_id=show_id,
-                    season_number=imdb_season_number,
-                    season_number_episodes=len(imdb_season))
+        season_ids = self.db.add_tv_show_seasons(
+            show_id,
+            {season_number: len(imdb_season) for season_number, imdb_season in imdb_show['episodes'].items()
+             if season_number not in known_seasons})
+        for imdb_season_number, imdb_season in imdb_show['episodes'].items():
+            known_season = known_seasons.get(imdb_season_number)
+            if known_season is None:
+                season_id = season_ids[imdb_season_number]
+                known_episodes = set()
             else:
-                season_id = self.db.get_season_id(show_id,
-                                                  season_number=imdb_season_number)
-                self.db.update_show_season(season_id,
-                                           season_number_episodes=len(imdb_season.keys()))
+                season_id = known_season['id']
+                known_episodes = known_season['episodes']
+                if known_season['season_number_episodes'] != len(imdb_season):
+                    self.db.update_show_season(season_id, season_number_episodes=len(imdb_season))
 
             # Update with new episodes added during the season release
-            known_episodes = self.db.get_tv_show_season_episode_numbers(season_id)
-            for episode in imdb_season:
-                if episode not in known_episodes and 'original air date' in imdb_season[episode]:
-                    self.db.add_season_episode(
-                        season_id=season_id,
-                        episode_name=imdb_season[episode]['title'],
-                        episode_number=episode,
-                        air_date=imdb_season[episode]['original air date'])
+            new_episodes = [
+                {
+                    'name': imdb_season[episode]['title'],
+                    'episode_number': episode,
+                    'air_date': imdb_season[episode]['original air date']
+                }
+                for episode in imdb_season
+                if episode not in known_episodes and 'original air date' in imdb_season[episode]]
+            if new_episodes:
+                self.db.add_season_episodes(season_id, new_episodes)
+        self.db.update_next_air_dates(show_id)
 
     def download_season(self, season: dict) -> None:
         """Download all the available episodes for the specified season.
@@ -119,7 +215,7 @@ class TVShowProbe(Probe):
         season_id = season['season_id']
         season_number = season['season_number']
         season_number_episodes = season['season_number_episodes']
-        show_resolution_profile = set(season.get("resolution_profile").split(','))
+        show_resolution_profile = set(season["resolution_profile"].split(','))
         max_episode_size_bytes = self.mb_to_bytes(season["max_episode_size_mb"])
         show_name = season['show_name']
         imdbid = season['show_imdbid']
@@ -136,24 +232,94 @@ class TVShowProbe(Probe):
                 self.db.update_show_season(
                     id=season_id,
                     state=self.db.states.DOWNLOADING,
-                    hash=hash)
+                    hash=hash,
+                    search_attempts=0,
+                    next_search_at=None)
+            else:
+                self.record_search_miss(season_id, 'SEASON')
         # Download individual episodes (if full season wasn't available)
         else:
-            for episode in episodes:
-                if episode['state'] == self.db.states.SEARCHING:
-                    episode_number = episode['episode_number']
-                    hash = self.download(
-                        show_name,
-                        season_number,
-                        max_episode_size_bytes,
-                        show_resolution_profile,
-                        imdbid,
-                        episode_number=episode_number)
-                    if hash:
-                        self.db.update_tv_show_season_episode(
-                            id=season_id,
-                            state=self.db.states.DOWNLOADING,
-                            hash=hash)
+            wanted_episodes = {episode['episode_number']: episode for episode in episodes
+                               if episode['state'] == self.db.states.SEARCHING and self.is_aired(episode)
+                               and self.is_search_due(episode)}
+            if not wanted_episodes:
+                return
+            # A single search for the season, matched locally to every wanted episode
+            jackett_results = self.jackett.search_tvseries_episodes(
+                name=show_name,
+                season=season_number,
+                episodes=set(wanted_episodes),
+                resolution_profile=show_resolution_profile,
+                max_size_bytes=max_episode_size_bytes,
+                min_number_seeds=2,
+                imdbid=imdbid)
+            for episode_number, episode in wanted_episodes.items():
+                hash = self.download_best(jackett_results[episode_number])
+                if hash:
+                    self.db.update_tv_show_season_episode(
+                        id=episode['id'],
+                        state=self.db.states.DOWNLOADING,
+                        hash=hash,
+                        search_attempts=0,
+                        next_search_at=None)
+                else:
+                    logging.debug(f"TV Show {show_name}.S{season_number}.E{episode_number} not found!")
+                    if self.is_in_air_date_burst(episode):
+                        # Releases usually show up soon after the air date, search again shortly
+                        self.db.postpone_search('tv_show_season_episodes', episode['id'],
+                                                self.air_date_burst_interval_sec)
+                    else:
+                        self.record_search_miss(episode['id'], 'EPISODE')
+
+    @staticmethod
+    def is_aired(episode: dict) -> bool:
+        """Checks if the specified episode already aired (or its air date is unknown)
+
+        Args:
+            episode (dict): the episode database entry
+
+        Returns:
+            bool: false if the episode air date is after today
+        """
+        return get_air_timestamp(episode['air_date']) is None or episode['air_date'] <= today()
+
+    def is_in_air_date_burst(self, episode: dict) -> bool:
+        """Checks if the specified episode aired recently (within air_date_burst_sec)
+
+        Args:
+            episode (dict): the episode database entry
+
+        Returns:
+            bool: true if the episode is in its frequent search period
+        """
+        aired_at = get_air_timestamp(episode['air_date'])
+        return aired_at is not None and aired_at <= time.time() < aired_at + self.air_date_burst_sec
+
+    def is_search_due(self, episode: dict) -> bool:
+        """Checks if the search of the specified episode is due.
+        The first search after the episode airs is always due, regardless of previous unsuccessful searches.
+
+        Args:
+            episode (dict): the episode database entry
+
+        Returns:
+            bool: true if the episode was never searched or its next search is due
+        """
+        if self.is_in_air_date_burst(episode) and \
+                (episode['last_searched_at'] or 0) < get_air_timestamp(episode['air_date']):
+            return True
+        return episode['next_search_at'] is None or episode['next_search_at'] <= time.time()
+
+    def get_next_search_at(self) -> int:
+        """Retrieves the time of the next postponed season or episode search
+
+        Returns:
+            int: the time (epoch seconds) or None if no search is postponed
+        """
+        due_times = [due for due in (self.db.get_next_search_at("tv_show_seasons"),
+                                     self.db.get_next_search_at("tv_show_season_episodes"))
+                     if due is not None]
+        return min(due_times) if due_times else None
 
     def is_season_complete(self, episodes: list) -> bool:
         """Checks if the specified list of episodes for a season
@@ -171,14 +337,8 @@ class TVShowProbe(Probe):
             if episode['state'] != self.db.states.SEARCHING:
                 return False
 
-        last_episode_number = len(episodes)
-
-        try:
-            last_episode_date = self.parse_date(episodes[last_episode_number - 1]['air_date'].replace('.', ''))
-            return (datetime.now() - last_episode_date).days > 0
-        except ValueError as e:
-            logging.error(e)
-            return False
+        last_episode_air_date = episodes[-1]['air_date']
+        return get_air_timestamp(last_episode_air_date) is not None and last_episode_air_date < today()
 
     def download(self, name: str,
                  season: int,
@@ -206,99 +366,59 @@ class TVShowProbe(Probe):
             min_number_seeds=2,
             episode=episode_number,
             imdbid=imdbid)
+        hash = self.download_best(jackett_result)
+        if not hash:
+            logging.debug(f"TV Show {name}.S{season}.E{episode_number} not found!")
+        return hash
+
+    def download_best(self, jackett_result: list) -> str:
+        """Download the best of the specified jackett results (sorted by seeds)
+
+        Args:
+            jackett_result (list): the jackett results
+
+        Returns:
+            str: The torrent hash or None if there are no results
+        """
         if jackett_result:
             tv_show = jackett_result[0]  # Highest number of seeds
             magnetUri = tv_show["MagnetUri"]
             self.qbit.download(magnetUri, self.storage_dir)
             return tv_show["InfoHash"]
-        else:
-            logging.debug(f"TV Show {name}.S{season}.E{episode_number} not found!")
+        return None
 
     def update(self) -> None:
         """Updates the database state to reflect the current downloads
         """
 
+        # If there's episodes with no hash,
+        # it means that the season was downloaded as a whole or the episode hasn't been released
+        # in both cases, match the episode state with season state
+        self.db.update_unhashed_episode_states()
+
+        # Only the entries or torrents that changed since the previous cycle, unless it's a full sweep
+        changed_ids = self.collect_changes()
+        force = changed_ids is not None
+
         # Update tv show season episodes
-        episodes = self.db.get_all_episodes()
-        for episode in episodes:
-            episode_id = episode['id']
-            episode_state = episode['state']
-            episode_hash = episode['hash']
-            season_id = episode['season_id']
-            # If there's episodes with no hash, 
-            # it means that the season was downloaded as a whole or the episode hasn't been released
-            # in both cases, match the episode state with season state
-            if not episode_hash:
-                season_state = self.db.get_tv_show_season(season_id)['state']
-                self.db.update_tv_show_season_episode(episode_id, state=season_state)
-                continue
-            # Do nothing
-            if episode_state in [self.db.states.SEARCHING, self.db.states.COMPLETED]:
-                continue
-
-            self.update_torrent_states(episode_id, episode_hash, episode_state, type='EPISODE')
+        for episode in self.get_entries_to_reconcile('tv_show_season_episodes', changed_ids):
+            self.update_torrent_states(episode['id'], episode['hash'], episode['state'], type='EPISODE', force=force)
 
         # Update tv show seasons
-        seasons = self.db.get_all_seasons()
-        for season in seasons:
-            season_id = season['id']
-            season_state = season['state']
-            season_hash = season['hash']
-            season_episodes_states = self.db.get_season_episodes_states(season_id)
-            # If there's no season hash, it means that the episodes were downloaded individually
-            if not season_hash:
-                new_show_state = self.calculate_parent_state(season_state, season_episodes_states)
-                self.db.update_show_season(season_id, state=new_show_state)
-                continue
-            # Do nothing
-            if season_state in [self.db.states.SEARCHING, self.db.states.COMPLETED]:
-                continue
-
-            self.update_torrent_states(season_id, season_hash, season_state, type='SEASON')
+        # If there's no season hash, it means that the episodes were downloaded individually
+        # The state updates are committed after the qbittorrent requests, the season states depend on the episodes
+        with self.db.transaction():
+            self.apply_writes()
+            self.db.update_season_states()
+        for season in self.get_entries_to_reconcile('tv_show_seasons', changed_ids):
+            self.update_torrent_states(season['id'], season['hash'], season['state'], type='SEASON', force=force)
 
         # Update tv show
-        shows = self.db.get_all_tv_shows()
-        for show in shows:
-            show_id = show['id']
-            show_state = show['state']
-            show_season_states = self.db.get_season_states(show_id=show_id)
-            new_show_state = self.calculate_parent_state(show_state, show_season_states)
-            if new_show_state == self.db.states.DELETING or show_state == self.db.states.DELETING:
-                self.db.delete_tv_show(show_id)
-            else:
-                self.db.update_tv_show(show_id, state=new_show_state)
-
-    def calculate_parent_state(self, current_parent_state: str, child_states: set) -> str:
-        """Updates the parent (show or season) state to reflect the child
-        states (season or episode)
-
-        Args:
-            current_parent_state (str): the current parent state
-            child_states (set): the children state set
-
-        Returns:
-            str: the new parent state
-        """
-        parent_state = current_parent_state
-        if self.db.states.SEARCHING in child_states:
-            parent_state = self.db.states.SEARCHING
-        elif self.db.states.DOWNLOADING in child_states:
-            parent_state = self.db.states.DOWNLOADING
-        elif self.db.states.PAUSED in child_states:
-            parent_state = self.db.states.PAUSED
-        if len(child_states) == 1 and not current_parent_state in child_states:
-            if self.db.states.COMPLETED in child_states:
-                parent_state = self.db.states.COMPLETED
-            elif self.db.states.SEEDING in child_states:
-                parent_state = self.db.states.SEEDING
-            elif self.db.states.DELETING in child_states:
-                parent_state = self.db.states.DELETING
-
-        return parent_state
-
-    def shutdown(self) -> None:
-        """Close resources"""
-        self.db.close()
+        with self.db.transaction():
+            self.apply_writes()
+            show_ids = self.db.update_tv_show_states()
+        for show_id in show_ids:
+            self.scheduler.forget(('SHOW', show_id))
 
     def mb_to_bytes(self, value: int) -> int:
         """convert the specified value int megabytes to bytes
@@ -310,12 +430,3 @@ class TVShowProbe(Probe):
             [int]: the value in byes
         """
         return value * 1024 * 1024
-
-    @staticmethod
-    def parse_date(date_text: str):
-        for fmt in ("%d %b %Y", '%Y', '%d/%m/%Y', '%Y-%m-%d',  '%d%m%Y'):
-            try:
-                return datetime.strptime(date_text, fmt)
-            except ValueError:
-                pass
-        raise ValueError(f'Failed to parse date {date_text}')
\ No newline at end of file
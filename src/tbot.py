@@ -2,22 +2,17 @@ import logging
 import time
 import signal
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 from utils import config
-from data import TBDatabase
+from data import TBDatabase, QueryStats
 from probes import MovieProbe
 from visuals import Visuals
+from tools import IMDBFinder, TokenBucket
 from probes import TVShowProbe
 import logging.handlers as handlers
 
-file_handler = handlers.RotatingFileHandler(f"{config.ROOT_PATH}/tbot.log", maxBytes=1048576, backupCount=5)
-stdout_handler = logging.StreamHandler(sys.stdout)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s',
-    handlers=[file_handler, stdout_handler]
-)
-
 
 def main():
     """
@@ -25,18 +20,32 @@ def main():
     Used to load the initial configuration, create the database and start the torrent bot.
     """
     config.create_config()
+    # The log file is in the root path, which exists once the configuration is created
+    file_handler = handlers.RotatingFileHandler(f"{config.ROOT_PATH}/tbot.log", maxBytes=1048576, backupCount=5)
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s',
+        handlers=[file_handler, stdout_handler]
+    )
     logging.info(config.ASCII_ART)
 
     logging.info("Loading configurations")
     config.load_config()
 
     logging.info("Initializing data")
+    if config.database.query_stats:
+        TBDatabase.query_stats = QueryStats(slow_query_ms=config.database.slow_query_ms)
+    # Every imdb request (probes and frontend) shares the same rate limit
+    IMDBFinder.rate_limiter = TokenBucket(config.imdb.requests_per_sec, config.imdb.burst_requests)
     db = TBDatabase(config.DB_PATH)
     db.create_schema()
     db.close()
 
     logging.info("Starting Torrent Bot.")
-    tbot = TorrentBot()
+    tbot = TorrentBot.new(config)
+    signal.signal(signal.SIGINT, tbot.exit_gracefully)
+    signal.signal(signal.SIGTERM, tbot.exit_gracefully)
     tbot.start()
 
 
@@ -47,39 +56,122 @@ class TorrentBot:
 
     In addition to the probes, the torrent bot also initializes a frontend (called visuals), which will be listening on the configured
     host and port for the frontend.
+
+    The probes run on a pool of workers (probes.workers in the configuration). Each probe has its own database connection
+    and is never run by two workers at the same time. With a single worker, the probes run one after the other.
+
+    Attributes
+    ----------
+    visuals : Visuals
+        the frontend
+    probes : list
+        the probes (movies and tv shows)
+    workers : int
+        the number of probes that can run at the same time
+    max_sleep_sec : float
+        the maximum time to sleep between cycles
     """
 
-    def __init__(self) -> None:
-        self.visuals = Visuals.new(config)
-        self.movies_probe = MovieProbe.new(config)
-        self.series_probe = TVShowProbe.new(config)
+    def __init__(self, visuals: Visuals, probes: list, workers: int = 1, max_sleep_sec: float = 30) -> None:
+        self.visuals = visuals
+        self.probes = probes
+        self.workers = max(1, workers)
+        self.max_sleep_sec = max_sleep_sec
+        self.wakeup = threading.Event()
+        self.changed = False
+        self.visuals.on_change = self.notify_change
         self.running = True
-        signal.signal(signal.SIGINT, self.exit_gracefully)
-        signal.signal(signal.SIGTERM, self.exit_gracefully)
+
+    @staticmethod
+    def new(config: config):
+        """Create a new TorrentBot object directly from the resources
+
+        Args:
+            config (resources): the configuration parameters for the application
+
+        Returns:
+            TorrentBot: The torrent bot object
+        """
+        return TorrentBot(Visuals.new(config), [MovieProbe.new(config), TVShowProbe.new(config)],
+                          config.probes.workers, config.scheduler.max_sleep_sec)
 
     def start(self) -> None:
         """Start torrent bot. 
         The starting procedure includes initializing the frontend and 
-        continuously probing for new torrents.
+        continuously probing for new torrents. Between cycles, the bot sleeps until
+        the next item is due, until the frontend changes the database or, with several
+        workers, until a busy probe finishes.
         """
         logging.info("Starting visuals")
         self.visuals.start()
-        while self.running:
-            logging.debug("Probing...")
-            self.movies_probe.start()
-            self.series_probe.start()
-            logging.debug(f"Going to sleep...")
-            time.sleep(5)
+        logging.info(f"Starting probes with {self.workers} worker(s)")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="probe") as executor:
+            running_probes = {}
+            run_probes = True
+            while self.running:
+                if run_probes:
+                    logging.debug("Probing...")
+                    for probe in self.probes:
+                        future = running_probes.get(probe)
+                        # Skip probes still busy with the previous cycle
+                        if future is None or future.done():
+                            running_probes[probe] = future = executor.submit(probe.start)
+                            future.add_done_callback(partial(self.probe_done, probe))
+                if self.workers == 1:
+                    wait(running_probes.values())
+                busy_probes = [probe for probe, future in running_probes.items() if not future.done()]
+                sleep_sec = self.time_until_next_due(busy_probes)
+                logging.debug(f"Going to sleep for {sleep_sec:.1f} seconds...")
+                # A busy probe that finishes only wakes the bot up to include its next due time
+                run_probes = not self.wakeup.wait(sleep_sec) or self.changed
+                self.wakeup.clear()
+                self.changed = False
+
+            logging.info(f"Shutting down..")
+        for probe in self.probes:
+            probe.shutdown()
+
+    def probe_done(self, probe, future) -> None:
+        """Logs the failure (if any) of a probe cycle and, with several workers,
+        wakes up the bot so that the sleep time includes the next due time of the probe
+
+        Args:
+            probe (Probe): the probe
+            future (Future): the finished probe cycle
+        """
+        if future.exception() is not None:
+            logging.error(f"{type(probe).__name__} failed", exc_info=future.exception())
+        if self.workers > 1:
+            self.wakeup.set()
+
+    def time_until_next_due(self, busy_probes: list = ()) -> float:
+        """Calculates the time until the next probe item is due.
+        Busy probes are ignored, their due times are refreshed once they finish.
 
-        logging.info(f"Shutting down..")
-        self.movies_probe.shutdown()
-        self.series_probe.shutdown()
+        Args:
+            busy_probes (list, optional): the probes still busy with the previous cycle
+
+        Returns:
+            float: the number of seconds to sleep, at most the configured max sleep period
+        """
+        due_times = [due for due in (probe.next_due() for probe in self.probes if probe not in busy_probes)
+                     if due is not None]
+        if not due_times:
+            return self.max_sleep_sec
+        return min(max(min(due_times) - time.time(), 1), self.max_sleep_sec)
+
+    def notify_change(self) -> None:
+        """Wakes up the bot to run the idle probes after the frontend changed the database
+        """
+        self.changed = True
+        self.wakeup.set()
 
     def exit_gracefully(self, *args) -> None:
         """Change the bot running flag to False
         """
         logging.info(f"Received terminating signal..")
         self.running = False
+        self.wakeup.set()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,9 @@
 from .jackett import JackettClient
+from .jackett_cache import JackettCache
+from .release_parser import parse_release, Release
 from .qbit import QbittorrentClient
 from .epguides import EPGuidesClient
 from .imdb_finder import IMDBFinder
+from .imdb_cache import IMDBCache
+from .rate_limiter import TokenBucket
+from .search_cache import SearchCache
@@ -0,0 +1,94 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class IMDBCache:
+    """
+    Persistent (sqlite) cache for imdb show metadata (seasons and episodes) with a time to live
+    per show status, so that ended shows are kept for a long time and airing shows are refreshed often
+
+    Attributes
+    ----------
+    db_file_path : str
+        the cache file path (sqlite)
+    ttl_sec : dict
+        the time to live in seconds of the shows with each status (e.g. {"ended": 2592000, "airing": 21600})
+    default_ttl_sec : int
+        the time to live in seconds of the shows whose status isn't in ttl_sec
+    """
+
+    ENDED = "ended"
+    AIRING = "airing"
+    UNKNOWN = "unknown"
+
+    def __init__(self, db_file_path: str, ttl_sec: dict = None, default_ttl_sec: int = 86400) -> None:
+        self.db_file_path = db_file_path
+        self.ttl_sec = ttl_sec or {}
+        self.default_ttl_sec = default_ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_file_path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS imdb_shows (
+            "imdbid" INTEGER PRIMARY KEY,
+            "status" TEXT NOT NULL,
+            "fetched_at" INTEGER NOT NULL,
+            "expires_at" INTEGER NOT NULL,
+            "show" TEXT NOT NULL)
+        """)
+        self.connection.commit()
+
+    def get(self, imdbid: int, allow_expired: bool = False) -> dict:
+        """Retrieves the cached metadata of the specified show
+
+        Args:
+            imdbid (int): the show imdb id
+            allow_expired (bool, optional): true to retrieve expired metadata too (e.g. when imdb is unreachable)
+
+        Returns:
+            dict: the show metadata (see IMDBFinder.compact_show) or None if it isn't cached or expired
+        """
+        min_expires_at = 0 if allow_expired else int(time.time())
+        with self.lock:
+            row = self.connection.execute("SELECT show FROM imdb_shows WHERE imdbid=? AND expires_at>?",
+                                          (int(imdbid), min_expires_at)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        show = json.loads(row[0])
+        # json object keys are strings, the season and episode numbers are integers
+        show["episodes"] = {int(season_number): {int(episode_number): episode
+                                                 for episode_number, episode in season.items()}
+                            for season_number, season in show["episodes"].items()}
+        return show
+
+    def put(self, imdbid: int, status: str, show: dict) -> None:
+        """Stores the metadata of the specified show
+
+        Args:
+            imdbid (int): the show imdb id
+            status (str): the show status (IMDBCache.ENDED, IMDBCache.AIRING or IMDBCache.UNKNOWN)
+            show (dict): the show metadata (see IMDBFinder.compact_show)
+        """
+        now = int(time.time())
+        expires_at = now + self.ttl_sec.get(status, self.default_ttl_sec)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO imdb_shows(imdbid, status, fetched_at, expires_at, show) VALUES(?,?,?,?,?)",
+                (int(imdbid), status, now, expires_at, json.dumps(show)))
+            self.connection.commit()
+
+    def stats(self) -> dict:
+        """Retrieves the cache hit and miss counts
+
+        Returns:
+            dict: the number of hits and misses
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        """Close the cache connection"""
+        self.connection.close()
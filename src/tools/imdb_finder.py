@@ -1,13 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
 import imdb
-from functools import lru_cache
+import logging
+import threading
+from .imdb_cache import IMDBCache
 
 
 class IMDBFinder:
     """IMDB Finder
+
+    Every thread uses its own Cinemagoer instance, so a finder can fetch shows concurrently
+    (see fetch_shows).
+
+    Attributes
+    ----------
+    cache : IMDBCache
+        optional persistent cache of the show metadata retrieved by fetch_show
+    rate_limiter : TokenBucket
+        optional rate limiter of the imdb requests, shared by every finder when set on the
+        class (IMDBFinder.rate_limiter = TokenBucket(...))
     """
 
-    def __init__(self) -> None:
-        self.finder = imdb.Cinemagoer()
+    EPISODE_FIELDS = ("title", "original air date")
+    rate_limiter = None
+
+    def __init__(self, cache_path: str = None, cache_ttl_sec: dict = None) -> None:
+        self._local = threading.local()
+        self.cache = IMDBCache(cache_path, cache_ttl_sec) if cache_path else None
+
+    @property
+    def finder(self) -> object:
+        """The Cinemagoer instance of the current thread (Cinemagoer instances aren't thread-safe)"""
+        finder = getattr(self._local, "finder", None)
+        if finder is None:
+            finder = self._local.finder = self.create_finder()
+        return finder
+
+    def create_finder(self) -> object:
+        """Creates a Cinemagoer instance
+
+        Returns:
+            object: the Cinemagoer instance
+        """
+        return imdb.Cinemagoer()
+
+    def throttle(self, requests: int = 1) -> None:
+        """Waits until the specified number of imdb requests can be made without exceeding the rate limit
+
+        Args:
+            requests (int, optional): the number of requests
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(requests)
 
     def search(self, title: str) -> object:
         """Search for the show/movie with the specified title
@@ -18,6 +61,7 @@ class IMDBFinder:
         Returns:
             object: the movie object
         """
+        self.throttle()
         results =  self.finder.search_movie(title)
         for result in results:
             result.data['imdbid'] = self.get_imdbid(result)
@@ -51,6 +95,7 @@ class IMDBFinder:
         Returns:
             object: the show/movie object
         """
+        self.throttle()
         return self.finder.get_movie(imdbid)
 
     def update_show_with_seasons(self, series: object) -> None:
@@ -59,22 +104,131 @@ class IMDBFinder:
         Args:
             series (object): the series
         """
+        # One request per season
+        self.throttle(max(1, len(series.get('seasons') or [])))
         self.finder.update(series, 'episodes')
 
-    @lru_cache(maxsize=1000)
-    def fetch_show(self, imdbid: str) -> object:
-        """Fetches a show given by the specified imdb id
+    def update_show_seasons(self, series: object, skip_seasons: set) -> None:
+        """Updates the specified series object with the seasons and episodes,
+        except for the specified seasons (which aren't retrieved)
+
+        Args:
+            series (object): the series
+            skip_seasons (set): the numbers of the seasons that aren't retrieved
+        """
+        season_numbers = set()
+        for season_number in series.get('seasons') or []:
+            try:
+                season_numbers.add(int(season_number))
+            except ValueError:
+                continue
+        if not season_numbers:
+            # The season numbers are unknown, every season has to be retrieved
+            self.update_show_with_seasons(series)
+            return
+        season_numbers -= set(skip_seasons)
+        if season_numbers:
+            self.throttle(len(season_numbers))
+            self.finder.update_series_seasons(series, sorted(season_numbers))
+
+    def fetch_show(self, imdbid: str, skip_seasons: set = None) -> dict:
+        """Fetches a show given by the specified imdb id, from the cache if it has
+        the show and it didn't expire yet.
+        Seasons in skip_seasons (e.g. seasons known to be complete) are only retrieved from the cache
+        (even if it expired). Shows that were never cached are retrieved in full to seed the cache.
 
         Args:
             imdbid (str): the imdb id
+            skip_seasons (set, optional): the numbers of the seasons that don't need to be retrieved
 
         Returns:
-            object: the show object
+            dict: the show metadata (see compact_show)
         """
-        show = self.fetch(imdbid)
-        self.update_show_with_seasons(show)
+        cached_show = None
+        if self.cache:
+            show = self.cache.get(imdbid)
+            if show is not None:
+                return show
+            cached_show = self.cache.get(imdbid, allow_expired=True)
+            if cached_show is None:
+                skip_seasons = None
+        try:
+            imdb_show = self.fetch(imdbid)
+            if skip_seasons:
+                self.update_show_seasons(imdb_show, skip_seasons)
+            else:
+                self.update_show_with_seasons(imdb_show)
+        except imdb.IMDbError as error:
+            if cached_show is None:
+                raise
+            logging.warning(f"Failed to refresh show {imdbid}, using the cached metadata: {error}")
+            return cached_show
+        show = self.compact_show(imdb_show)
+        if self.cache:
+            if skip_seasons:
+                # Only the cache has the skipped seasons
+                cached_show["episodes"].update(show["episodes"])
+                show["episodes"] = cached_show["episodes"]
+            self.cache.put(imdbid, self.get_show_status(imdb_show), show)
         return show
 
+    def fetch_shows(self, skip_seasons: dict, workers: int = 4) -> dict:
+        """Fetches multiple shows concurrently (see fetch_show), on a pool of workers.
+        The imdb requests of every worker are subject to the rate limiter.
+
+        Args:
+            skip_seasons (dict): the numbers of the seasons that don't need to be retrieved, by show imdb id
+            workers (int, optional): the maximum number of shows fetched at the same time
+
+        Returns:
+            dict: the show metadata, or the IMDbError raised while fetching it, by show imdb id
+        """
+        def fetch_show(imdbid):
+            try:
+                return self.fetch_show(imdbid, skip_seasons[imdbid])
+            except imdb.IMDbError as error:
+                return error
+
+        workers = min(workers, len(skip_seasons))
+        if workers <= 1:
+            return {imdbid: fetch_show(imdbid) for imdbid in skip_seasons}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imdb") as executor:
+            return dict(zip(skip_seasons, executor.map(fetch_show, skip_seasons)))
+
+    @classmethod
+    def compact_show(cls, show: object) -> dict:
+        """Keeps only the show metadata used by the probes: the title and the title
+        and air date of each episode
+
+        Args:
+            show (object): the show object updated with the seasons and episodes
+
+        Returns:
+            dict: {"title": <title>, "episodes": {<season>: {<episode>: {"title": ..., "original air date": ...}}}}
+        """
+        return {
+            "title": show.get("title"),
+            "episodes": {season_number: {episode_number: {field: episode[field] for field in cls.EPISODE_FIELDS
+                                                          if field in episode}
+                                         for episode_number, episode in season.items()}
+                         for season_number, season in show.get("episodes", {}).items()}
+        }
+
+    @staticmethod
+    def get_show_status(show: object) -> str:
+        """Retrieves the status of the specified show from its series years (e.g. 2008-2013 or 2019-)
+
+        Args:
+            show (object): the show object
+
+        Returns:
+            str: IMDBCache.AIRING, IMDBCache.ENDED or IMDBCache.UNKNOWN
+        """
+        series_years = str(show.get("series years") or "").strip()
+        if not series_years:
+            return IMDBCache.UNKNOWN
+        return IMDBCache.AIRING if series_years.endswith("-") else IMDBCache.ENDED
+
     def get_imdbid(self, entry: object) -> str:
         """Retreive the imdb for the specified entry (movie or show)
 
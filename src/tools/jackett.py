@@ -1,25 +1,228 @@
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from .jackett_cache import JackettCache
+from .release_parser import parse_release, matches_profile, Release
+import codecs
+import heapq
 import requests
 import json
 import re
 
+# Only the result fields used by the bot are kept in memory
+RESULT_FIELDS = ("Title", "Size", "Seeders", "Imdb", "InfoHash", "MagnetUri", "Link")
+_RESULTS_START = re.compile(r'"Results"\s*:\s*\[')
+_SEPARATORS = " \t\r\n,"
+
 
 class JackettClient:
     """
     A wrapper client for jackett api cals
 
+    The client keeps a pool of keep-alive connections (gzip encoded) and sends the queries of
+    every resolution in a resolution profile at the same time, merging the results.
+    Responses are decoded as they are streamed, keeping only the best results (by seeders)
+    that match the search filters.
+
     Attributes
     ----------
     api_key : str
         the jacket api key
     api_url : str
         the jacket api url
+    timeout_sec : float
+        the timeout of each request in seconds
+    max_parallel_requests : int
+        the maximum number of queries sent at the same time
+    cache : JackettCache
+        the (optional) cache for the query results
+    max_results : int
+        the maximum number of results kept per query (and per episode for season searches)
 
     """
 
-    def __init__(self, api_key: str, api_url="http://127.0.0.1:9117/api/v2.0") -> None:
+    def __init__(self, api_key: str, api_url="http://127.0.0.1:9117/api/v2.0",
+                 timeout_sec: float = 60, max_parallel_requests: int = 4,
+                 cache: JackettCache = None, max_results: int = 50) -> None:
         self.api_key = api_key
         self.api_url = api_url
+        self.timeout_sec = timeout_sec
+        self.cache = cache
+        self.max_results = max_results
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_parallel_requests)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel_requests,
+                                           thread_name_prefix="jackett")
+
+    def query(self, query: str, category: int, accept=None, top_k: int = None) -> list:
+        """Sends a single query to all jackett indexers, unless the results are cached.
+        The response is decoded while it's streamed. Without a cache only the top_k results are ever kept,
+        with a cache every result (with RESULT_FIELDS only) is cached and filtered after reading it, so
+        that every search with the same query shares the cached results.
+
+        Args:
+            query (str): the search query
+            category (int): the torznab category (2000 for movies, 5000 for tv)
+            accept (callable, optional): filter applied to each result
+            top_k (int, optional): the number of results to keep. Defaults to max_results
+
+        Returns:
+            list: the best accepted jackett results (with RESULT_FIELDS only) sorted by Seeders, descending
+        """
+        top_k = top_k or self.max_results
+        if self.cache:
+            results = self.cache.get(query, category)
+            if results is None:
+                results = self.request(query, category)
+                self.cache.put(query, category, results)
+            return self.select_results(results, accept, top_k)
+        return self.request(query, category, accept, top_k)
+
+    def request(self, query: str, category: int, accept=None, top_k: int = None) -> list:
+        """Sends a single query to all jackett indexers
+
+        Args:
+            query (str): the search query
+            category (int): the torznab category (2000 for movies, 5000 for tv)
+            accept (callable, optional): filter applied to each result as it arrives
+            top_k (int, optional): the number of results to keep, None to keep every result
+
+        Returns:
+            list: the accepted jackett results (with RESULT_FIELDS only) sorted by Seeders, descending
+        """
+        with self.session.get(
+            f"{self.api_url}/indexers/all/results",
+            params={"apikey": self.api_key, "query": query, "category": category},
+            timeout=self.timeout_sec,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            return self.read_results(response.iter_content(chunk_size=65536), accept, top_k)
+
+    @staticmethod
+    def select_results(results: list, accept=None, top_k: int = 50) -> list:
+        """Filters already decoded results (e.g. cached), keeping only the top_k results by seeders
+
+        Args:
+            results (list): the results sorted by Seeders, descending
+            accept (callable, optional): filter applied to each result
+            top_k (int, optional): the number of results to keep
+
+        Returns:
+            list: the best accepted results sorted by Seeders, descending
+        """
+        selected = []
+        for result in results:
+            if accept is None or accept(result):
+                selected.append(result)
+                if len(selected) == top_k:
+                    break
+        return selected
+
+    @staticmethod
+    def read_results(chunks, accept=None, top_k: int = 50) -> list:
+        """Incrementally decodes the "Results" array of a jackett response, filtering each
+        result as soon as it's decoded and keeping only the top_k results by seeders.
+        Peak memory depends on top_k and the size of a single result, not on the response size.
+
+        Args:
+            chunks (iterable): the response body chunks (bytes)
+            accept (callable, optional): filter applied to each result
+            top_k (int, optional): the number of results to keep, None to keep every result
+
+        Returns:
+            list: the best results sorted by Seeders, descending
+        """
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        best = []
+        buffer = ""
+        in_results = False
+        done = False
+        count = 0
+        chunks = iter(chunks)
+        while not done:
+            chunk = next(chunks, None)
+            final = chunk is None
+            buffer += text_decoder.decode(chunk or b"", final=final)
+            if not in_results:
+                match = _RESULTS_START.search(buffer)
+                if match is None:
+                    # Keep the tail in case the key is split between chunks
+                    buffer = buffer[-64:]
+                    done = final
+                    continue
+                buffer = buffer[match.end():]
+                in_results = True
+
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position] in _SEPARATORS:
+                    position += 1
+                if position == len(buffer):
+                    break
+                if buffer[position] == "]":
+                    done = True
+                    break
+                try:
+                    result, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break  # Incomplete result, wait for the next chunk
+                result = {field: result.get(field) for field in RESULT_FIELDS}
+                if accept is not None and not accept(result):
+                    continue
+                count += 1
+                item = (result["Seeders"] or 0, -count, result)
+                if top_k is None or len(best) < top_k:
+                    heapq.heappush(best, item)
+                else:
+                    heapq.heappushpop(best, item)
+            buffer = buffer[position:]
+            done = done or final
+        return [result for _, _, result in sorted(best, reverse=True)]
+
+    def search(self, name: str, resolution_profile: set, category: int, accept=None, top_k: int = None) -> list:
+        """Sends the queries of every resolution in the profile at the same time and merges the
+        results. Results returned by more than one query are only kept once.
+
+        Args:
+            name (str): the name of the movie or tv show
+            resolution_profile (set): The resolution profile, check the docs for details
+            category (int): the torznab category (2000 for movies, 5000 for tv)
+            accept (callable, optional): filter applied to each result
+            top_k (int, optional): the number of results to keep per query
+
+        Returns:
+            list: the merged jackett results
+        """
+        queries = []
+        for res in resolution_profile:
+            if res.lower() == 'any':
+                queries.append(name)
+            else:
+                queries.append(f"{name} {res.replace('+', ' ')}")
+
+        results = []
+        seen = set()
+        for query_results in self.executor.map(
+                lambda query: self.query(query, category, accept, top_k), queries):
+            for result in query_results:
+                key = result.get("InfoHash") or result.get("Link") or result.get("Title")
+                if key in seen:
+                    continue
+                seen.add(key)
+                results.append(result)
+        return results
+
+    def close(self) -> None:
+        """Close the connection pool and the cache"""
+        self.executor.shutdown(wait=False)
+        self.session.close()
+        if self.cache:
+            self.cache.close()
 
     def search_movies(
         self,
@@ -45,37 +248,24 @@ class JackettClient:
         Returns:
             list: a list of movies sorted by Seeders, ascending
         """
-        movies = []
-        for res in resolution_profile:
-            if res.lower() == 'any':
-                query = name
-            else:
-                query = f"{name}+{res}"
-
-            request_url = f"{self.api_url}/indexers/all/results?"\
-                f"apikey={self.api_key}&"\
-                f"query={query}&"\
-                f"category=2000"
-            result = requests.get(request_url)
-            result.raise_for_status()
-            contents = result.json()
-            if len(contents["Results"]) > 0:
-                for result in contents["Results"]:
-                    size = result["Size"]
-                    title = result["Title"].lower()
-                    seeders = result['Seeders']
-                    tracker_imdb = result['Imdb']
-                    if max_size_bytes is not None and size > max_size_bytes:
-                        continue
-                    if year is not None and year not in title:
-                        continue
-                    if lang is not None and lang.lower() not in title:
-                        continue
-                    if min_number_seeds is not None and seeders < min_number_seeds:
-                        continue
-                    if imdbid and tracker_imdb and tracker_imdb != imdbid:
-                        continue
-                    movies.append(result)
+        def accept(result: dict) -> bool:
+            size = result["Size"]
+            seeders = result['Seeders']
+            tracker_imdb = result['Imdb']
+            if max_size_bytes is not None and size > max_size_bytes:
+                return False
+            if min_number_seeds is not None and seeders < min_number_seeds:
+                return False
+            if imdbid and tracker_imdb and tracker_imdb != imdbid:
+                return False
+            if lang is not None and lang.lower() not in result["Title"].lower():
+                return False
+            release = parse_release(result["Title"])
+            if year is not None and release.year != int(year):
+                return False
+            return matches_profile(release, resolution_profile)
+
+        movies = self.search(name, resolution_profile, category=2000, accept=accept)
         return sorted(movies, key=lambda i: i['Seeders'], reverse=True)
 
     def search_tvseries(
@@ -103,39 +293,114 @@ class JackettClient:
         Returns:
             list: [description]
         """
-        tv_series = []
-        for res in resolution_profile:
-            if res.lower() == 'any':
-                query = name
-            else:
-                query = f"{name}+{res}"
-
-            request_url = f"{self.api_url}/indexers/all/results?"\
-                f"apikey={self.api_key}&"\
-                f"query={query}&"\
-                f"category=5000"
-            result = requests.get(request_url)
-            result.raise_for_status()
-            contents = result.json()
-            if len(contents["Results"]) > 0:
-                for result in contents["Results"]:
-                    size = result["Size"]
-                    title = result["Title"].lower()
-                    seeders = result['Seeders']
-                    tracker_imdb = result['Imdb']
-                    if max_size_bytes is not None and size > max_size_bytes:
-                        continue
-                    if lang is not None and lang.lower() not in title:
-                        continue
-                    if min_number_seeds is not None and seeders < min_number_seeds:
-                        continue
-                    if not re.search(f"(season|s).?[0-9]?{season}", title):
-                        continue
-                    if not episode and re.search(f"(episode|ep|e).?[0-9]+", title):
-                        continue
-                    if episode and not re.search(f"(episode|ep|e).?0*{episode}", title):
-                        continue
-                    if imdbid and tracker_imdb and tracker_imdb != imdbid:
-                        continue
-                    tv_series.append(result)
+        accept_season = self.tvseries_filter(resolution_profile, season, max_size_bytes, lang,
+                                             min_number_seeds, imdbid)
+
+        def accept(result: dict) -> bool:
+            release = accept_season(result)
+            return release is not None and self.matches_episode(release, episode)
+
+        tv_series = self.search(name, resolution_profile, category=5000, accept=accept)
         return sorted(tv_series, key=lambda i: i['Seeders'], reverse=True)
+
+    def search_tvseries_episodes(
+        self,
+        name: str,
+        resolution_profile: set,
+        season: int,
+        episodes: set,
+        max_size_bytes: int = None,
+        lang: str = None,
+        min_number_seeds: int = None,
+        imdbid: int = None
+    ) -> dict:
+        """Searches Jackett once for a TV Series season and matches the results locally to
+        every one of the specified episodes (batch version of search_tvseries).
+
+        Args:
+            name (str): The name of the TV Series
+            resolution_profile (set): The resolution profile, check the docs for details
+            season (int): The season
+            episodes (set): The episode numbers
+            max_size_bytes (int, optional): the maximum size of an episode in bytes
+            lang (str, optional): The desired language
+            min_number_seeds (int, optional): The minimum seeds
+            imdbid (int, optional) the movie imdbid
+        Returns:
+            dict: the results of each episode (sorted by Seeders, descending), indexed by episode number
+        """
+        accept_season = self.tvseries_filter(resolution_profile, season, max_size_bytes, lang,
+                                             min_number_seeds, imdbid)
+
+        # Titles are only parsed once, the accepted releases are matched to the episodes afterwards
+        releases = {}
+
+        def accept(result: dict) -> bool:
+            release = accept_season(result)
+            if release is None:
+                return False
+            releases[result["Title"]] = release
+            return any(self.matches_episode(release, episode) for episode in episodes)
+
+        tv_series = {episode: [] for episode in episodes}
+        for result in self.search(name, resolution_profile, category=5000, accept=accept,
+                                  top_k=self.max_results * len(episodes)):
+            release = releases[result["Title"]]
+            for episode in episodes:
+                if self.matches_episode(release, episode):
+                    tv_series[episode].append(result)
+        return {episode: sorted(results, key=lambda i: i['Seeders'], reverse=True)
+                for episode, results in tv_series.items()}
+
+    @staticmethod
+    def tvseries_filter(resolution_profile: set, season: int, max_size_bytes: int = None, lang: str = None,
+                        min_number_seeds: int = None, imdbid: int = None):
+        """Creates a filter for the jackett results that match the specified TV Series season characteristics.
+
+        Args:
+            resolution_profile (set): The resolution profile, check the docs for details
+            season (int): The season
+            max_size_bytes (int, optional): the maximum size in bytes
+            lang (str, optional): The desired language
+            min_number_seeds (int, optional): The minimum seeds
+            imdbid (int, optional) the movie imdbid
+
+        Returns:
+            callable: the filter, which returns the parsed release of matching results and None otherwise
+        """
+        def accept_season(result: dict) -> Release:
+            size = result["Size"]
+            seeders = result['Seeders']
+            tracker_imdb = result['Imdb']
+            if max_size_bytes is not None and size > max_size_bytes:
+                return None
+            if min_number_seeds is not None and seeders < min_number_seeds:
+                return None
+            if imdbid and tracker_imdb and tracker_imdb != imdbid:
+                return None
+            if lang is not None and lang.lower() not in result["Title"].lower():
+                return None
+            release = parse_release(result["Title"])
+            if release.season != season:
+                return None
+            if not matches_profile(release, resolution_profile):
+                return None
+            return release
+
+        return accept_season
+
+    @staticmethod
+    def matches_episode(release: Release, episode: int = None) -> bool:
+        """Checks if the release contains the specified episode, or is a full season if
+        no episode is specified
+
+        Args:
+            release (Release): the release record
+            episode (int, optional): The episode number
+
+        Returns:
+            bool: true if the release matches
+        """
+        if not episode:
+            return release.pack
+        return release.episode_start is not None and release.episode_start <= episode <= release.episode_end
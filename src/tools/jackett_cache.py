@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class JackettCache:
+    """
+    Persistent (sqlite) cache for jackett search results with a time to live per category.
+    The unfiltered results of each query are cached, so that every search with the same query
+    (e.g. season pack and episode searches of a show) shares them.
+    The cache file is shared by the probes and the frontend: it uses WAL mode, and writers wait
+    for each other (busy timeout) instead of failing.
+
+    Attributes
+    ----------
+    db_file_path : str
+        the cache file path (sqlite)
+    ttl_sec : dict
+        the time to live in seconds of the results of each category (e.g. {2000: 3600})
+    default_ttl_sec : int
+        the time to live in seconds of the results of categories not in ttl_sec
+    busy_timeout_ms : int
+        the time to wait for a lock held by another connection before failing
+    """
+
+    def __init__(self, db_file_path: str, ttl_sec: dict = None, default_ttl_sec: int = 3600,
+                 busy_timeout_ms: int = 5000) -> None:
+        self.db_file_path = db_file_path
+        self.ttl_sec = ttl_sec or {}
+        self.default_ttl_sec = default_ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_file_path, timeout=busy_timeout_ms / 1000,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(jackett_results)")]
+        if "filter" in columns:
+            # Results cached per filter are incomplete
+            self.connection.execute("DROP TABLE jackett_results")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS jackett_results (
+            "query" TEXT NOT NULL,
+            "category" INTEGER NOT NULL,
+            "fetched_at" INTEGER NOT NULL,
+            "results" TEXT NOT NULL,
+            PRIMARY KEY(query, category))
+        """)
+        self.connection.commit()
+
+    def get(self, query: str, category: int) -> list:
+        """Retrieves the cached results of the specified query
+
+        Args:
+            query (str): the search query
+            category (int): the torznab category
+
+        Returns:
+            list: the results or None if they aren't cached or expired
+        """
+        min_fetched_at = int(time.time()) - self.ttl_sec.get(category, self.default_ttl_sec)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT results FROM jackett_results WHERE query=? AND category=? AND fetched_at>=?",
+                (query, category, min_fetched_at)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, query: str, category: int, results: list) -> None:
+        """Stores the results of the specified query and removes expired entries
+
+        Args:
+            query (str): the search query
+            category (int): the torznab category
+            results (list): the query results
+        """
+        now = int(time.time())
+        max_ttl_sec = max([self.default_ttl_sec, *self.ttl_sec.values()])
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jackett_results(query, category, fetched_at, results) VALUES(?,?,?,?)",
+                (query, category, now, json.dumps(results)))
+            self.connection.execute("DELETE FROM jackett_results WHERE fetched_at<?", (now - max_ttl_sec,))
+            self.connection.commit()
+
+    def invalidate(self, name: str) -> None:
+        """Removes the cached results of every query for the specified movie or tv show name,
+        so that the next search goes to jackett
+
+        Args:
+            name (str): the movie or tv show name
+        """
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM jackett_results WHERE query=? OR substr(query, 1, ?)=?",
+                (name, len(name) + 1, f"{name} "))
+            self.connection.commit()
+
+    def stats(self) -> dict:
+        """Retrieves the cache hit and miss counts
+
+        Returns:
+            dict: the number of hits and misses
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        """Close the cache connection"""
+        self.connection.close()
@@ -12,11 +12,24 @@ class QbittorrentClient:
         the listen address
     qbit: port
         the listen port
+    rid: int
+        the response id of the last sync
+    torrents: dict
+        the local torrent mirror, updated by sync
+    changed_hashes: set
+        the (lowercase) hashes of the torrents that changed or were removed in the last sync
+    full_update: bool
+        true if the last sync rebuilt the whole mirror (changed_hashes is then incomplete,
+        removed torrents aren't reported)
 
     """
 
     def __init__(self, host: str = "localhost", port: int = 8080) -> None:
         self.qbt_client = qbittorrentapi.Client(host=host, port=port)
+        self.rid = 0
+        self.torrents = {}
+        self.changed_hashes = set()
+        self.full_update = False
 
     def download(
         self, magnetic_uri: str, save_path: str, is_paused: bool = False
@@ -47,6 +60,29 @@ class QbittorrentClient:
         """
         return self.qbt_client.torrents_info(status_filter=status_filter, torrent_hashes=hashes)
 
+    def sync(self) -> dict:
+        """Update the local torrent mirror with the changes since the last sync (sync/maindata).
+        Only the torrents (and fields) that changed since the last response id (rid) are transferred.
+        The mirror is rebuilt from scratch when qbittorrent sends a full update.
+
+        Returns:
+            dict: the torrents indexed by their (lowercase) hash
+        """
+        maindata = self.qbt_client.sync_maindata(rid=self.rid)
+        self.full_update = bool(maindata.get("full_update"))
+        self.changed_hashes = set()
+        if self.full_update:
+            self.torrents = {}
+        for hash, changes in (maindata.get("torrents") or {}).items():
+            torrent = self.torrents.setdefault(hash.lower(), {"hash": hash})
+            torrent.update(changes)
+            self.changed_hashes.add(hash.lower())
+        for hash in maindata.get("torrents_removed") or []:
+            self.torrents.pop(hash.lower(), None)
+            self.changed_hashes.add(hash.lower())
+        self.rid = maindata.get("rid", 0)
+        return self.torrents
+
     def delete(self, torrent_hashes: list) -> None:
         """Deletes the torrents given by the hash list
 
@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    The bucket holds up to burst tokens and is refilled at rate_per_sec tokens per second.
+    Every request takes tokens from the bucket, waiting for the refill when it's empty, so the
+    requests of every thread sharing the bucket stay under rate_per_sec on average.
+
+    Attributes
+    ----------
+    rate_per_sec : float
+        the number of tokens added per second
+    burst : int
+        the maximum number of tokens (requests that can be made at once after an idle period)
+    """
+
+    def __init__(self, rate_per_sec: float, burst: int = 1) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: int = 1, now: float = None) -> float:
+        """Takes the specified number of tokens if the bucket has them
+
+        Args:
+            tokens (int, optional): the number of tokens. Requests larger than burst only need a full bucket
+            now (float, optional): the current (monotonic) time. Defaults to time.monotonic()
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the number of seconds to wait before trying again
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_sec)
+            self._updated_at = now
+            needed = min(tokens, self.burst)
+            if self._tokens >= needed:
+                # Larger requests leave a debt that delays the next ones
+                self._tokens -= tokens
+                return 0
+            return (needed - self._tokens) / self.rate_per_sec
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Takes the specified number of tokens, waiting until the bucket has them
+
+        Args:
+            tokens (int, optional): the number of tokens
+        """
+        wait_sec = self.try_acquire(tokens)
+        while wait_sec > 0:
+            time.sleep(wait_sec)
+            wait_sec = self.try_acquire(tokens)
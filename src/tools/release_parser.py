@@ -0,0 +1,121 @@
+from collections import namedtuple
+from functools import lru_cache
+import re
+
+Release = namedtuple("Release", ["resolution", "source", "codec", "season",
+                                 "episode_start", "episode_end", "year", "pack"])
+Release.__doc__ = """Structured release record parsed from a torrent title
+
+Attributes
+----------
+resolution : str
+    the resolution (e.g. 1080p), None if unknown
+source : str
+    the source (e.g. bluray, web-dl, webrip), None if unknown
+codec : str
+    the video codec (e.g. h264), None if unknown
+season : int
+    the season number, None if it's not a tv show release
+episode_start : int
+    the first episode in the release, None for full seasons
+episode_end : int
+    the last episode in the release, None for full seasons
+year : int
+    the release year, None if unknown
+pack : bool
+    true if the release contains one or more full seasons
+"""
+
+# A single precompiled expression reads a title once. The search starts at the season/episode
+# tag (s01e02, s01e02-e04, 1x02, season 1 episode 2), or at the first year of a movie, and reads
+# the year, resolution, source and codec that follow it. Optional parts are written as empty
+# alternatives "(?:...|)", which the re module matches faster than "(?:...)?".
+_END = r"(?![a-z0-9])"
+_RELEASE = re.compile(
+    r"[^a-z0-9](?:"
+    r"(?:(?P<year_before>(?:19|20)\d\d)[^a-z0-9]+|)"
+    r"(?:s(?P<season>\d{1,2})(?:[^a-z0-9]?e(?P<episode_start>\d{1,3})"
+    r"(?:(?:-?e?\d{1,3})*-?e?(?P<episode_end>\d{1,3})|)|)"
+    r"|season[^a-z0-9]*(?P<word_season>\d{1,2})"
+    r"(?:[^a-z0-9]+(?:episode|ep|e)[^a-z0-9]*(?P<word_episode>\d{1,3})|)"
+    r"|(?P<x_season>\d{1,2})x(?P<x_episode>\d{2,3}))" + _END +
+    r"(?:[^a-z0-9]+(?P<complete>complete)" + _END + "|)"
+    r"|(?P<movie_year>(?:19|20)\d\d)" + _END +
+    r")"
+    r"(?:.*?[^a-z0-9](?P<year>(?:19|20)\d\d)" + _END + "|)"
+    r"(?:.*?[^a-z0-9](?P<resolution>(?:2160|1080|720|576|480)p|4k|uhd)" + _END + "|)"
+    r"(?:.*?[^a-z0-9](?P<source>blu-?ray|bdrip|brrip|web-?dl|webrip|web|hdrip|hdtv|dvdrip|dvd|remux|hdcam|cam)"
+    + _END + "|)"
+    r"(?:.*?[^a-z0-9](?P<codec>[xh]\.?26[45]|avc|hevc|xvid|av1)" + _END + "|)")
+# Spellings normalized after the match, the others are kept as matched
+_RESOLUTIONS = {"4k": "2160p", "uhd": "2160p"}
+_SOURCES = {"blu-ray": "bluray", "webdl": "web-dl"}
+_CODECS = {"x264": "h264", "h.264": "h264", "x.264": "h264", "avc": "h264", "x265": "h265",
+           "h.265": "h265", "x.265": "h265", "hevc": "h265"}
+_UNKNOWN = Release(None, None, None, None, None, None, None, False)
+
+
+@lru_cache(maxsize=8192)
+def parse_release(title: str) -> Release:
+    """Parses a torrent title into a release record with a single regular expression search.
+    Releases are cached by title, since the cached jackett results are filtered again for every
+    season and episode search of a show.
+
+    Args:
+        title (str): the torrent title
+
+    Returns:
+        Release: the release record
+    """
+    match = _RELEASE.search(title.lower())
+    if match is None:
+        return _UNKNOWN
+    (year_before, season, episode_start, episode_end, word_season, word_episode, x_season, x_episode,
+     complete, movie_year, year, resolution, source, codec) = match.groups()
+
+    if season is not None:
+        # s01, s01e02, s01e02e03, s01e02-e04
+        season = int(season)
+        if episode_start is not None:
+            episode_start = int(episode_start)
+            episode_end = int(episode_end) if episode_end is not None else episode_start
+    elif word_season is not None:
+        # season 1, season 1 episode 2
+        season = int(word_season)
+        if word_episode is not None:
+            episode_start = episode_end = int(word_episode)
+    elif x_season is not None:
+        # 1x02
+        season = int(x_season)
+        episode_start = episode_end = int(x_episode)
+
+    year = year or movie_year or year_before  # The last year wins (e.g. "Blade Runner 2049 2017")
+    if resolution is not None:
+        resolution = _RESOLUTIONS.get(resolution, resolution)
+    if source is not None:
+        source = _SOURCES.get(source, source)
+    if codec is not None:
+        codec = _CODECS.get(codec, codec)
+    pack = episode_start is None and (season is not None or complete is not None)
+    return Release(resolution, source, codec, season, episode_start, episode_end,
+                   int(year) if year is not None else None, pack)
+
+
+def matches_profile(release: Release, resolution_profile: set) -> bool:
+    """Checks if the release resolution matches an entry of the resolution profile (e.g. {'1080p', '720p+webrip'}).
+    The source of an entry (e.g. webrip) only narrows the jackett query, and unknown release resolutions are accepted.
+
+    Args:
+        release (Release): the release record
+        resolution_profile (set): the resolution profile
+
+    Returns:
+        bool: true if the release matches the profile
+    """
+    if release.resolution is None:
+        return True
+    for entry in resolution_profile:
+        resolution = entry.lower().partition('+')[0]
+        if resolution == 'any' or resolution == release.resolution:
+            return True
+    return False
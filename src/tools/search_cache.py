@@ -0,0 +1,118 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class _Flight:
+    """A search in progress, shared by every request for the same query"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class SearchCache:
+    """
+    In-memory LRU cache for search results with a time to live.
+
+    Queries are normalized (case and whitespace), and concurrent searches for the same
+    query wait for a single search (single-flight) instead of searching again.
+    A failed search isn't cached, its error is raised to every waiting request.
+
+    Attributes
+    ----------
+    max_entries : int
+        the maximum number of cached queries, the least recently used are evicted
+    ttl_sec : int
+        the time to live in seconds of the cached results
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_sec: int = 3600) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_sec = ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalizes a search query, so that queries differing only in case or whitespace share the results
+
+        Args:
+            query (str): the search query
+
+        Returns:
+            str: the normalized query
+        """
+        return " ".join((query or "").split()).casefold()
+
+    def get(self, query: str, search, now: float = None) -> list:
+        """Retrieves the results of the specified query, searching if they aren't cached or expired
+
+        Args:
+            query (str): the search query
+            search (callable): retrieves the results of a query (called with the query with collapsed whitespace)
+            now (float, optional): the current (monotonic) time. Defaults to time.monotonic()
+
+        Returns:
+            list: the query results
+        """
+        key = self.normalize(query)
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            # Wait for the search in progress
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.results
+        try:
+            flight.results = search(" ".join((query or "").split()))
+        except Exception as error:
+            flight.error = error
+            raise
+        else:
+            with self.lock:
+                self._entries[key] = (now + self.ttl_sec, flight.results)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            return flight.results
+        finally:
+            with self.lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        """Retrieves the cache statistics
+
+        Returns:
+            dict: the number of hits, misses (searches), coalesced requests (that waited for
+            a search in progress), evictions and cached queries
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "evictions": self.evictions, "size": len(self._entries)}
+
+    def clear(self) -> None:
+        """Discards the cached results"""
+        with self.lock:
+            self._entries.clear()
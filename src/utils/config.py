@@ -8,6 +8,8 @@ import secrets
 ROOT_PATH = f"{Path.home()}/.tbot"
 CONFIG_PATH = f"{ROOT_PATH}/config.yaml"
 DB_PATH = f"{ROOT_PATH}/tbot.db"
+JACKETT_CACHE_PATH = f"{ROOT_PATH}/jackett_cache.db"
+IMDB_CACHE_PATH = f"{ROOT_PATH}/imdb_cache.db"
 RES_PROFILES = {
     "1080p+bluray",
     "1080p+webrip,1080p+web-dl,1080p+hdrip,1080p+brrip",
@@ -26,20 +28,31 @@ ASCII_ART = '''
     |_|\___/|_|  |_|  \___|_| |_|\__| |____/ \___/ \__|
 '''
 
-jackett, qbit, movies, shows, frontend = None, None, None, None, None
-_jackett = namedtuple("jackett", ["api_key", "api_url"])
+jackett, qbit, movies, shows, frontend, scheduler, probes, database, imdb = (None, None, None, None, None, None, None,
+                                                                          None, None)
+_jackett = namedtuple("jackett", ["api_key", "api_url", "cache_ttl_sec"])
 _qbit = namedtuple("qbit", ["hostname", "port"])
 _movies = namedtuple("movies", ['directory', 'rentention_period_sec'])
 _shows = namedtuple("shows", ['directory', 'rentention_period_sec'])
-_frontend = namedtuple("frontend", ['secret_key', 'hostname', 'port'])
+_frontend = namedtuple("frontend", ['secret_key', 'hostname', 'port', 'search_cache_size', 'search_cache_ttl_sec'])
+_scheduler = namedtuple("scheduler", ['search_interval_sec', 'max_search_interval_sec', 'poll_interval_sec',
+                                      'idle_poll_interval_sec', 'max_sleep_sec', 'full_sweep_interval_sec',
+                                      'air_date_burst_sec', 'air_date_burst_interval_sec'])
+_probes = namedtuple("probes", ['workers'])
+_database = namedtuple("database", ['query_stats', 'slow_query_ms'])
+_imdb = namedtuple("imdb", ['cache_ttl_sec', 'workers', 'requests_per_sec', 'burst_requests'])
 
 
 def load_config():
-    global jackett, qbit, movies, shows, frontend
+    global jackett, qbit, movies, shows, frontend, scheduler, probes, database, imdb
     with open(CONFIG_PATH, 'r') as f:
         configuration = yaml.safe_load(f)
         jackett = _jackett(api_key=configuration['jackett']['api_key'],
-                           api_url=configuration['jackett']['api_url'])
+                           api_url=configuration['jackett']['api_url'],
+                           cache_ttl_sec={
+                               2000: configuration['jackett'].get('movies_cache_ttl_sec', 3600),
+                               5000: configuration['jackett'].get('shows_cache_ttl_sec', 1800)
+                           })
         qbit = _qbit(hostname=configuration['qbittorrent']['hostname'],
                      port=configuration['qbittorrent']['port'])
         movies = _movies(directory=configuration['movies']['directory'],
@@ -48,7 +61,30 @@ def load_config():
                        rentention_period_sec=configuration['shows']['retention_period_days'] * 30 * 60 * 60)
         frontend = _frontend(secret_key=configuration['frontend'].get('secret_key', secrets.token_hex()),
                              hostname=configuration['frontend'].get('hostname', 'localhost'),
-                             port=configuration['frontend'].get('port', 5000))
+                             port=configuration['frontend'].get('port', 5000),
+                             search_cache_size=configuration['frontend'].get('search_cache_size', 256),
+                             search_cache_ttl_sec=configuration['frontend'].get('search_cache_ttl_sec', 3600))
+        scheduler_cfg = configuration.get('scheduler', {})
+        scheduler = _scheduler(search_interval_sec=scheduler_cfg.get('search_interval_sec', 900),
+                               max_search_interval_sec=scheduler_cfg.get('max_search_interval_sec', 86400),
+                               poll_interval_sec=scheduler_cfg.get('poll_interval_sec', 5),
+                               idle_poll_interval_sec=scheduler_cfg.get('idle_poll_interval_sec', 60),
+                               max_sleep_sec=scheduler_cfg.get('max_sleep_sec', 30),
+                               full_sweep_interval_sec=scheduler_cfg.get('full_sweep_interval_sec', 300),
+                               air_date_burst_sec=scheduler_cfg.get('air_date_burst_sec', 172800),
+                               air_date_burst_interval_sec=scheduler_cfg.get('air_date_burst_interval_sec', 300))
+        probes = _probes(workers=configuration.get('probes', {}).get('workers', 1))
+        database_cfg = configuration.get('database', {})
+        database = _database(query_stats=database_cfg.get('query_stats', False),
+                             slow_query_ms=database_cfg.get('slow_query_ms', 100))
+        imdb_cfg = configuration.get('imdb', {})
+        imdb = _imdb(cache_ttl_sec={
+            'ended': imdb_cfg.get('ended_shows_cache_ttl_sec', 2592000),
+            'airing': imdb_cfg.get('airing_shows_cache_ttl_sec', 21600),
+            'unknown': imdb_cfg.get('shows_cache_ttl_sec', 86400)
+        }, workers=imdb_cfg.get('workers', 4),
+            requests_per_sec=imdb_cfg.get('requests_per_sec', 2),
+            burst_requests=imdb_cfg.get('burst_requests', 5))
 
 
 def create_config():
@@ -67,7 +103,9 @@ def create_config():
         yaml_dict = {
             'jackett': {
                 'api_key': jackett_api_key,
-                'api_url': 'http://127.0.0.1:9117/api/v2.0'
+                'api_url': 'http://127.0.0.1:9117/api/v2.0',
+                'movies_cache_ttl_sec': 3600,
+                'shows_cache_ttl_sec': 1800
             },
             'qbittorrent': {
                 'hostname': '127.0.0.1',
@@ -83,7 +121,34 @@ def create_config():
             },
             'frontend': {
                 'hostname': '127.0.0.1',
-                'port': 5000
+                'port': 5000,
+                'search_cache_size': 256,
+                'search_cache_ttl_sec': 3600
+            },
+            'scheduler': {
+                'search_interval_sec': 900,
+                'max_search_interval_sec': 86400,
+                'poll_interval_sec': 5,
+                'idle_poll_interval_sec': 60,
+                'max_sleep_sec': 30,
+                'full_sweep_interval_sec': 300,
+                'air_date_burst_sec': 172800,
+                'air_date_burst_interval_sec': 300
+            },
+            'probes': {
+                'workers': 1
+            },
+            'database': {
+                'query_stats': False,
+                'slow_query_ms': 100
+            },
+            'imdb': {
+                'ended_shows_cache_ttl_sec': 2592000,
+                'airing_shows_cache_ttl_sec': 21600,
+                'shows_cache_ttl_sec': 86400,
+                'workers': 4,
+                'requests_per_sec': 2,
+                'burst_requests': 5
             }
         }
         with open(CONFIG_PATH, 'w') as file:
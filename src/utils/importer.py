@@ -0,0 +1,317 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from imdb import IMDbError
+from data import TBDatabase
+from tools import IMDBFinder, TokenBucket
+from utils import config
+from sqlite3 import IntegrityError
+import argparse
+import csv
+import logging
+import re
+import threading
+
+ImportReport = namedtuple("ImportReport", ["movies", "tv_shows", "duplicates", "not_found", "invalid"])
+ImportReport.__doc__ = """Result of a watchlist import
+
+Attributes
+----------
+movies : list
+    the names of the added movies
+tv_shows : list
+    the names of the added tv shows
+duplicates : list
+    the names of the entries that already exist (in the database or earlier in the file)
+not_found : list
+    the names of the entries that couldn't be found on imdb
+invalid : list
+    the names of the entries with an invalid max size (not a positive number), which aren't imported
+"""
+
+_IMDBID = re.compile(r"(\d+)")
+_SHOW_TYPES = {"show", "series", "tv", "tv show", "tv_show", "tvseries", "tvminiseries", "tv series", "tv mini series"}
+
+
+class WatchlistImporter:
+    """
+    Bulk importer for watchlists: csv files with a name (or title), an imdbid (optional) and a type
+    (optional) column, or IMDb list exports (Const, Title and Title Type columns).
+
+    The missing imdb ids, types and cover urls are looked up on imdb by a bounded pool of workers,
+    each with its own IMDBFinder. Every entry is then added in a single transaction, entries that
+    already exist are reported as duplicates.
+
+    Attributes
+    ----------
+    db_file_path : str
+        the database file path
+    max_size_mb : int
+        the max size of the imported movies (unless the file has a max_size_mb column)
+    max_episode_size_mb : int
+        the max episode size of the imported tv shows (unless the file has a max_episode_size_mb column)
+    resolution_profile : str
+        the resolution profile of the imported entries (unless the file has a resolution_profile column)
+    workers : int
+        the maximum number of concurrent imdb lookups
+    """
+
+    def __init__(self, db_file_path: str, max_size_mb: int = 10240, max_episode_size_mb: int = 1024,
+                 resolution_profile: str = "1080p", workers: int = 8, finder_factory=IMDBFinder) -> None:
+        self.db_file_path = db_file_path
+        self.max_size_mb = max_size_mb
+        self.max_episode_size_mb = max_episode_size_mb
+        self.resolution_profile = resolution_profile
+        self.workers = workers
+        self.finder_factory = finder_factory
+        self._local = threading.local()
+
+    def read(self, lines) -> list:
+        """Reads the watchlist entries from a csv file
+
+        Args:
+            lines (iterable): the csv lines (e.g. an open file)
+
+        Returns:
+            list: the entries (dicts with the name, imdbid, type, cover_url and sizes, None if unknown or,
+            for the sizes, invalid)
+        """
+        entries = []
+        for row in csv.DictReader(lines):
+            row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+            name = row.get("title") or row.get("name")
+            imdbid = _IMDBID.search(row.get("const") or row.get("imdbid") or row.get("imdb_id") or "")
+            type = (row.get("title type") or row.get("type") or row.get("kind") or "").lower()
+            if not name and not imdbid:
+                continue
+            if type:
+                type = "tv_show" if type in _SHOW_TYPES or "series" in type else "movie"
+            entries.append({
+                "name": name or None,
+                "imdbid": int(imdbid.group(1)) if imdbid else None,
+                "type": type or None,
+                "cover_url": row.get("cover_url") or row.get("cover url") or "",
+                "max_size_mb": _size_mb(row.get("max_size_mb"), self.max_size_mb),
+                "max_episode_size_mb": _size_mb(row.get("max_episode_size_mb"), self.max_episode_size_mb),
+                "resolution_profile": row.get("resolution_profile") or self.resolution_profile,
+            })
+        return entries
+
+    def resolve(self, entry: dict) -> dict:
+        """Looks up the missing imdb id, type and cover url of the specified entry
+
+        Args:
+            entry (dict): the watchlist entry
+
+        Returns:
+            dict: the complete entry or None if it wasn't found on imdb
+        """
+        if entry["imdbid"] is not None and entry["type"] and entry["cover_url"] and entry["name"]:
+            return entry
+        finder = getattr(self._local, "finder", None)
+        if finder is None:
+            finder = self._local.finder = self.finder_factory()
+        try:
+            if entry["imdbid"] is None:
+                kind = "series" if entry["type"] == "tv_show" else "movie" if entry["type"] else None
+                item = next((result for result in finder.search(entry["name"])
+                             if (kind or "movie") in result.get("kind", "") or
+                             (kind is None and "series" in result.get("kind", ""))), None)
+                if item is None:
+                    return None
+            else:
+                item = finder.fetch(f"{entry['imdbid']:07d}")
+        except IMDbError as error:
+            logging.info(f"Failed to find {entry['name'] or entry['imdbid']} on imdb: {error}")
+            return None
+        resolved = dict(entry)
+        resolved["imdbid"] = int(item.get("imdbid") or entry["imdbid"] or finder.get_imdbid(item))
+        resolved["name"] = entry["name"] or item.get("title")
+        resolved["type"] = entry["type"] or ("tv_show" if "series" in item.get("kind", "") else "movie")
+        resolved["cover_url"] = entry["cover_url"] or item.get("full-size cover url") or item.get("cover url") or ""
+        return resolved
+
+    def import_entries(self, entries: list, progress=None) -> ImportReport:
+        """Resolves and adds the specified entries to the database (single transaction).
+        Entries with an invalid max size are reported as invalid and skipped.
+
+        Args:
+            entries (list): the watchlist entries (see read)
+            progress (callable, optional): called with the number of entries looked up on imdb so far
+
+        Returns:
+            ImportReport: the import report
+
+        Raises:
+            IntegrityError: if an entry is invalid, nothing is imported
+        """
+        invalid = [entry["name"] or f"tt{entry['imdbid']:07d}" for entry in entries
+                   if entry["max_size_mb"] is None or entry["max_episode_size_mb"] is None]
+        entries = [entry for entry in entries
+                   if entry["max_size_mb"] is not None and entry["max_episode_size_mb"] is not None]
+        resolved_entries = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="importer") as executor:
+            for resolved in executor.map(self.resolve, entries):
+                resolved_entries.append(resolved)
+                if progress is not None:
+                    progress(len(resolved_entries))
+
+        movies, tv_shows, duplicates, not_found = [], [], [], []
+        seen = set()
+        for entry, resolved in zip(entries, resolved_entries):
+            if resolved is None:
+                not_found.append(entry["name"] or f"tt{entry['imdbid']:07d}")
+                continue
+            if resolved["imdbid"] in seen or resolved["name"].lower() in seen:
+                duplicates.append(resolved["name"])
+                continue
+            seen.update((resolved["imdbid"], resolved["name"].lower()))
+            if resolved["type"] == "tv_show":
+                tv_shows.append(resolved)
+            else:
+                movies.append(resolved)
+
+        db = TBDatabase(self.db_file_path)
+        try:
+            with db.transaction():
+                existing_movies = db.add_movies(movies)
+                existing_tv_shows = db.add_tv_shows(tv_shows)
+        finally:
+            db.close()
+        duplicates += [entry["name"] for entry in existing_movies + existing_tv_shows]
+        return ImportReport(
+            movies=[movie["name"] for movie in movies if movie not in existing_movies],
+            tv_shows=[tv_show["name"] for tv_show in tv_shows if tv_show not in existing_tv_shows],
+            duplicates=duplicates,
+            not_found=not_found,
+            invalid=invalid)
+
+    def import_file(self, lines) -> ImportReport:
+        """Imports the entries of a csv file
+
+        Args:
+            lines (iterable): the csv lines (e.g. an open file)
+
+        Returns:
+            ImportReport: the import report
+        """
+        return self.import_entries(self.read(lines))
+
+
+class ImportJob:
+    """
+    A watchlist import running in a background thread, so that the frontend can answer right away
+    and show the progress and the report on a follow-up page.
+
+    Attributes
+    ----------
+    importer : WatchlistImporter
+        the importer of the entries
+    entries : list
+        the watchlist entries (see WatchlistImporter.read)
+    resolved : int
+        the number of entries looked up on imdb so far
+    report : ImportReport
+        the import report, None until the import is done or if it failed
+    error : str
+        the error message if the import failed, None otherwise
+    done : threading.Event
+        set when the import is done or failed
+    on_done : callable
+        optional listener called with the report after a successful import
+    """
+
+    def __init__(self, importer: WatchlistImporter, entries: list, on_done=None) -> None:
+        self.importer = importer
+        self.entries = entries
+        self.resolved = 0
+        self.report = None
+        self.error = None
+        self.done = threading.Event()
+        self.on_done = on_done
+
+    def start(self) -> None:
+        """Starts the import in a background thread"""
+        thread = threading.Thread(target=self.run, name="importer-job")
+        thread.daemon = True
+        thread.start()
+
+    def run(self) -> None:
+        """Runs the import, failures are logged and kept in the error message"""
+        try:
+            self.report = self.importer.import_entries(self.entries, progress=self.update_progress)
+        except IntegrityError as error:
+            logging.info(error)
+            self.error = "Failed to import watchlist, invalid entry!"
+        except Exception as error:
+            logging.exception(error)
+            self.error = f"Failed to import watchlist: {error}"
+        else:
+            if self.on_done is not None:
+                self.on_done(self.report)
+        finally:
+            self.done.set()
+
+    def update_progress(self, resolved: int) -> None:
+        """Updates the number of entries looked up on imdb
+
+        Args:
+            resolved (int): the number of entries looked up on imdb so far
+        """
+        self.resolved = resolved
+
+
+def _size_mb(value: str, default: int) -> int:
+    """Parses a max size cell
+
+    Args:
+        value (str): the cell value
+        default (int): the size used for empty cells
+
+    Returns:
+        int: the size in megabytes, None if it isn't a positive number
+    """
+    if not value:
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        return None
+    return size if size > 0 else None
+
+
+def main():
+    """
+    Command line watchlist import, e.g. python -m utils.importer watchlist.csv
+    """
+    parser = argparse.ArgumentParser(description="Import a watchlist (csv or IMDb list export) into torrent bot")
+    parser.add_argument("file", help="the csv file")
+    parser.add_argument("--db", default=config.DB_PATH, help="the database file path")
+    parser.add_argument("--max-size-mb", type=int, default=10240, help="the max size of each movie")
+    parser.add_argument("--max-episode-size-mb", type=int, default=1024, help="the max size of each episode")
+    parser.add_argument("--resolution-profile", default="1080p", choices=sorted(config.RES_PROFILES),
+                        help="the resolution profile")
+    parser.add_argument("--workers", type=int, default=8, help="the maximum number of concurrent imdb lookups")
+    args = parser.parse_args()
+
+    config.create_config()
+    config.load_config()
+    # The imdb lookups are rate limited like the bot ones (imdb.requests_per_sec and imdb.burst_requests)
+    IMDBFinder.rate_limiter = TokenBucket(config.imdb.requests_per_sec, config.imdb.burst_requests)
+    db = TBDatabase(args.db)
+    db.create_schema()
+    db.close()
+    importer = WatchlistImporter(args.db, args.max_size_mb, args.max_episode_size_mb, args.resolution_profile,
+                                 args.workers)
+    with open(args.file, newline="", encoding="utf-8-sig") as file:
+        report = importer.import_file(file)
+    print(f"Added {len(report.movies)} movies and {len(report.tv_shows)} tv shows")
+    for name in report.duplicates:
+        print(f"Duplicate: {name}")
+    for name in report.not_found:
+        print(f"Not found: {name}")
+    for name in report.invalid:
+        print(f"Invalid max size: {name}")
+
+
+if __name__ == "__main__":
+    main()
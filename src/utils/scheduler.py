@@ -0,0 +1,82 @@
+import heapq
+import threading
+import time
+
+
+class Scheduler:
+    """
+    Due-time scheduler backed by a priority queue (heap).
+
+    Every tracked item (movie, show, season, episode or torrent) is identified by a key,
+    typically a tuple like ('MOVIE', 1). The scheduler stores the next due time of each key
+    together with the state the item had when it was scheduled. An item is due when its
+    due time has passed, when it was never scheduled or when its state changed since it
+    was scheduled (e.g. a movie paused or resumed through the frontend).
+
+    Outdated heap entries are discarded lazily.
+    """
+
+    def __init__(self) -> None:
+        self._heap = []
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_due(self, key: tuple, state: str = None, now: float = None) -> bool:
+        """Checks if the item given by the specified key is due
+
+        Args:
+            key (tuple): the item key
+            state (str, optional): the current item state
+            now (float, optional): the current time. Defaults to time.time()
+
+        Returns:
+            bool: true if the item is due, false otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return True
+        due, scheduled_state = entry
+        if scheduled_state != state:
+            return True
+        return due <= (now if now is not None else time.time())
+
+    def schedule(self, key: tuple, delay_sec: float, state: str = None) -> None:
+        """Schedule the item given by the specified key
+
+        Args:
+            key (tuple): the item key
+            delay_sec (float): the number of seconds after which the item is due
+            state (str, optional): the item state at the time of scheduling
+        """
+        due = time.time() + delay_sec
+        with self._lock:
+            self._entries[key] = (due, state)
+            heapq.heappush(self._heap, (due, key))
+
+    def forget(self, key: tuple) -> None:
+        """Stop tracking the item given by the specified key
+
+        Args:
+            key (tuple): the item key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def next_due(self) -> float:
+        """Retrieves the time at which the next item is due
+
+        Returns:
+            float: the next due time or None if there are no scheduled items
+        """
+        with self._lock:
+            while self._heap:
+                due, key = self._heap[0]
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == due:
+                    return due
+                heapq.heappop(self._heap)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._entries)
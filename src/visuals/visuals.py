@@ -2,13 +2,18 @@ import threading
 import logging
 import os
 import sys
+import uuid
+from collections import OrderedDict
 from sqlite3.dbapi2 import Error
 from flask import Flask, render_template, request, redirect, url_for, flash
 from flask import current_app, g
 from tools import IMDBFinder, imdb_finder
+from tools import JackettCache, SearchCache
 from data.database import TBDatabase
 from utils import config
+from utils.importer import WatchlistImporter, ImportJob
 from sqlite3 import IntegrityError
+import io
 
 class Visuals:
     """Torrent Bot Frontend (aka visuals) using Flask's framework.
@@ -25,10 +30,20 @@ class Visuals:
         the listen address for the frontend
     port: int
         the listen port for the frontend
+    on_change: callable
+        optional listener called after requests that may have changed the database
+    jackett_cache: JackettCache
+        the jackett results cache, used to bypass the cache for added and resumed entries
+    search_cache: SearchCache
+        the imdb search results cache of the search endpoint
+    import_jobs: OrderedDict
+        the latest watchlist imports (ImportJob) by id, shown on their follow-up page
     """
+    MAX_IMPORT_JOBS = 16
 
     def __init__(self, database_path: str, secret_key: str,
-                 resolution_profiles: set, hostname: str, port: int):
+                 resolution_profiles: set, hostname: str, port: int, jackett_cache_path: str = None,
+                 search_cache_size: int = 256, search_cache_ttl_sec: int = 3600):
         if getattr(sys, 'frozen', False):
             template_folder = os.path.join(sys._MEIPASS, 'templates')
             self.app = Flask(__name__, template_folder=template_folder)
@@ -37,6 +52,7 @@ class Visuals:
         self.app.secret_key = secret_key
         self.app.config["DB"] = database_path
         self.app.teardown_appcontext(self.close_db)
+        self.app.after_request(self.notify_change)
         self.app.add_url_rule("/", "index", self.index)
         self.app.add_url_rule("/index", "index", self.index)
         self.app.add_url_rule("/movies", "movies", self.movies)
@@ -65,11 +81,20 @@ class Visuals:
                               "pause_season", self.pause_season, methods=["POST", "DELETE"])
         self.app.add_url_rule("/resume_season/<string:id>/<string:show_id>",
                               "resume_season", self.resume_season, methods=["POST", "DELETE"])
+        self.app.add_url_rule("/import_watchlist", "import_watchlist",
+                              self.import_watchlist, methods=["POST", "GET"])
+        self.app.add_url_rule("/import_watchlist/<string:id>", "import_watchlist_job", self.import_watchlist_job)
         self.app.add_url_rule("/search", "search", self.search)
+        self.app.add_url_rule("/stats", "stats", self.stats)
         self.resolution_profiles = resolution_profiles
         self.imdb_finder = IMDBFinder()
         self.hostname = hostname
         self.port = port
+        self.on_change = None
+        self.jackett_cache = JackettCache(jackett_cache_path) if jackett_cache_path else None
+        self.search_cache = SearchCache(search_cache_size, search_cache_ttl_sec)
+        self.import_jobs = OrderedDict()
+        self.import_jobs_lock = threading.Lock()
 
     @staticmethod
     def new(config: config):
@@ -82,7 +107,8 @@ class Visuals:
             Visuals: The visuals object
         """
         return Visuals(
-            config.DB_PATH, config.frontend.secret_key, config.RES_PROFILES, config.frontend.hostname, config.frontend.port
+            config.DB_PATH, config.frontend.secret_key, config.RES_PROFILES, config.frontend.hostname, config.frontend.port,
+            config.JACKETT_CACHE_PATH, config.frontend.search_cache_size, config.frontend.search_cache_ttl_sec
         )
 
     def start(self) -> None:
@@ -105,6 +131,9 @@ class Visuals:
         Returns:
             str: index.html page
         """
+        db = self.get_db(read_only=True)
+        g.summary = db.get_state_summary()
+        g.states = db.states.get_states()
         return render_template("index.html")
 
     def movies(self) -> str:
@@ -113,7 +142,7 @@ class Visuals:
         Returns:
             str: movies.html page
         """
-        db = self.get_db()
+        db = self.get_db(read_only=True)
         g.movies = db.get_all_movies()
         return render_template("movies.html")
 
@@ -123,7 +152,7 @@ class Visuals:
         Returns:
             str: tv_shows.html page
         """
-        db = self.get_db()
+        db = self.get_db(read_only=True)
         g.tv_shows = db.get_all_tv_shows()
         return render_template("tv_shows.html")
 
@@ -133,16 +162,17 @@ class Visuals:
         Returns:
             int: tv_show_seaons.html page
         """
-        db = self.get_db()
+        db = self.get_db(read_only=True)
         g.tv_show_seasons = db.get_tv_show_with_seasons(id)
         if g.tv_show_seasons:
             g.show_name = g.tv_show_seasons[0]['show_name']
         return render_template("tv_show_seasons.html")
     
     def tv_show_season_episodes(self, id: int) -> str:
-        db = self.get_db()
-        g.show_id = db.get_tv_show_season(id)['show_id']
-        g.tv_show_season_episodes = db.get_tv_show_season_with_episodes(id)
+        db = self.get_db(read_only=True)
+        with db.snapshot():
+            g.show_id = db.get_tv_show_season(id)['show_id']
+            g.tv_show_season_episodes = db.get_tv_show_season_with_episodes(id)
         if g.tv_show_season_episodes:
             g.season_number = g.tv_show_season_episodes[0]['season_number']
         return render_template("tv_show_season_episodes.html")
@@ -163,14 +193,17 @@ class Visuals:
             valid_input = self.validate_fields(max_size_mb, resolution_profile, imdbid)
             if valid_input:
                 try:
-                    db.update_movie(
-                        id=id,
-                        max_size_mb=max_size_mb,
-                        resolution_profile=resolution_profile,
-                        state=db.states.SEARCHING,
-                        imdbid=imdbid,
-                        cover_url=cover_url
-                    )
+                    with db.transaction():
+                        db.update_movie(
+                            id=id,
+                            max_size_mb=max_size_mb,
+                            resolution_profile=resolution_profile,
+                            state=db.states.SEARCHING,
+                            imdbid=imdbid,
+                            cover_url=cover_url
+                        )
+                        db.reset_search_backoff("movies", id)
+                    self.invalidate_jackett_cache(db.get_movie(id)["name"])
                     flash("Movie Updated", "success")
                 except IntegrityError as error:
                     logging.info(error)
@@ -260,7 +293,10 @@ class Visuals:
             str: the movies.html page
         """
         db = self.get_db()
-        db.update_movie(id, state=db.states.SEARCHING)
+        with db.transaction():
+            db.update_movie(id, state=db.states.SEARCHING)
+            db.reset_search_backoff("movies", id)
+        self.invalidate_jackett_cache(db.get_movie(id)["name"])
         flash("Movie Download Resumed", "success")
         return redirect(url_for("movies"))
 
@@ -274,13 +310,14 @@ class Visuals:
             str: tv_shows.html page
         """
         db = self.get_db()
-        db.update_tv_show(id=id, state=db.states.DELETING)
-        seasons = db.get_tv_show_with_seasons(id=id)
-        for season in seasons:
-            db.update_show_season(id=season['season_id'], state=db.states.DELETING)
-            episodes = db.get_tv_show_season_with_episodes(id=season['season_id'])
-            for episode in episodes:
-                db.update_tv_show_season_episode(id=episode['episode_id'], state=db.states.DELETING)
+        with db.transaction():
+            db.update_tv_show(id=id, state=db.states.DELETING)
+            seasons = db.get_tv_show_with_seasons(id=id)
+            for season in seasons:
+                db.update_show_season(id=season['season_id'], state=db.states.DELETING)
+                episodes = db.get_tv_show_season_with_episodes(id=season['season_id'])
+                for episode in episodes:
+                    db.update_tv_show_season_episode(id=episode['episode_id'], state=db.states.DELETING)
         flash("Tv Show Marked for deletion", "success")
         return redirect(url_for("tv_shows"))
 
@@ -310,7 +347,12 @@ class Visuals:
             str: tv_show_seasons.html page
         """
         db = self.get_db()
-        db.update_show_season(id, state=db.states.SEARCHING)
+        with db.transaction():
+            db.update_show_season(id, state=db.states.SEARCHING)
+            db.reset_search_backoff("tv_show_seasons", id)
+            for episode in db.get_season_episodes(season_id=id):
+                db.reset_search_backoff("tv_show_season_episodes", episode['id'])
+        self.invalidate_jackett_cache(db.get_tv_show(show_id)["name"])
         flash("Tv Season download resumed", "success")
         return redirect(url_for("tv_show_seasons", id=show_id))
 
@@ -331,6 +373,7 @@ class Visuals:
             if valid_input:
                 try:
                     db.add_movie(name, max_size_mb, resolution_profile, imdbid, cover_url)
+                    self.invalidate_jackett_cache(name)
                     flash("Movie Added", "success")
                 except IntegrityError as error:
                     logging.info(error)
@@ -360,6 +403,7 @@ class Visuals:
             if valid_input:
                 try:
                     db.add_tv_show(name, max_episode_size_mb, resolution_profile, imdbid, cover_url)
+                    self.invalidate_jackett_cache(name)
                     flash("TV Show Added", "success")
                 except IntegrityError as error:
                     logging.info(error)
@@ -372,37 +416,139 @@ class Visuals:
         g.resolution_options = self.resolution_profiles
         return render_template("add_tv_show.html")
 
+    def import_watchlist(self) -> str:
+        """Bulk watchlist import endpoint (csv or IMDb list export).
+        The file is read right away and imported in a background thread (ImportJob),
+        whose progress and report are shown on a follow-up page.
+
+        Returns:
+            str: import_watchlist.html page or a redirect to the import follow-up page
+        """
+        g.job = None
+        if request.method == "POST":
+            file = request.files.get("watchlist")
+            max_size_mb = request.form.get("max_size_mb", default=0, type=int)
+            max_episode_size_mb = request.form.get("max_episode_size_mb", default=0, type=int)
+            resolution_profile = request.form["resolution_profile"]
+            valid_input = self.validate_fields(min(max_size_mb, max_episode_size_mb), resolution_profile, 0)
+            if not file or not file.filename:
+                flash("No watchlist file selected!", "danger")
+            elif valid_input:
+                importer = WatchlistImporter(current_app.config["DB"], max_size_mb, max_episode_size_mb,
+                                             resolution_profile)
+                entries = importer.read(io.TextIOWrapper(file.stream, encoding="utf-8-sig", newline=""))
+                job = ImportJob(importer, entries, on_done=self.import_done)
+                job_id = uuid.uuid4().hex
+                with self.import_jobs_lock:
+                    self.import_jobs[job_id] = job
+                    while len(self.import_jobs) > self.MAX_IMPORT_JOBS:
+                        self.import_jobs.popitem(last=False)
+                job.start()
+                return redirect(url_for("import_watchlist_job", id=job_id))
+        g.resolution_options = self.resolution_profiles
+        return render_template("import_watchlist.html")
+
+    def import_watchlist_job(self, id: str) -> str:
+        """Watchlist import follow-up endpoint, with the import progress or its report
+
+        Args:
+            id (str): the import id
+
+        Returns:
+            str: import_watchlist.html page
+        """
+        with self.import_jobs_lock:
+            g.job = self.import_jobs.get(id)
+        if g.job is None:
+            flash("Watchlist import not found!", "danger")
+            return redirect(url_for("import_watchlist"))
+        g.resolution_options = self.resolution_profiles
+        return render_template("import_watchlist.html")
+
+    def import_done(self, report) -> None:
+        """Invalidates the cached jackett results of the imported entries and notifies the on_change listener
+        (if any) after a background watchlist import
+
+        Args:
+            report (ImportReport): the import report
+        """
+        self.invalidate_jackett_cache(*report.movies, *report.tv_shows)
+        if self.on_change:
+            self.on_change()
+
     def search(self):
-        """Search shows/movies endpoint
+        """Search shows/movies endpoint.
+        The results are cached (search_cache), identical searches made at the same time share one imdb search
 
         Returns:
             str: search.html page
         """
         search_query = request.args.get('search')
-        g.results = self.imdb_finder.search(search_query)
+        g.results = self.search_cache.get(search_query, self.imdb_finder.search)
         return render_template('search.html')
 
-    def get_db(self) -> TBDatabase:
+    def stats(self) -> str:
+        """Database query statistics (database.query_stats in the configuration) and search cache statistics endpoint
+
+        Returns:
+            str: stats.html page
+        """
+        g.stats = TBDatabase.query_stats.get_stats() if TBDatabase.query_stats else None
+        g.search_cache_stats = self.search_cache.stats()
+        return render_template("stats.html")
+
+    def notify_change(self, response):
+        """Notifies the on_change listener (if any) after requests that may have changed the database
+
+        Args:
+            response: the flask response
+
+        Returns:
+            the unchanged flask response
+        """
+        if request.method == "POST" and self.on_change:
+            self.on_change()
+        return response
+
+    def invalidate_jackett_cache(self, *names: str) -> None:
+        """Removes the cached jackett results for the specified movies or tv shows,
+        so that the next probe search bypasses the cache
+
+        Args:
+            names (str): the movie or tv show names
+        """
+        if not self.jackett_cache:
+            return
+        for name in names:
+            self.jackett_cache.invalidate(name)
+
+    def get_db(self, read_only: bool = False) -> TBDatabase:
         """Get database
 
+        Args:
+            read_only (bool): true to get a read-only handler (used to render pages),
+            whose reads never wait for the probe writes
+
         Returns:
             TBDatabase: Torrent Bot Database
         """
-        if "db" not in g:
-            g.db = TBDatabase(current_app.config["DB"])
+        key = "read_db" if read_only else "db"
+        if key not in g:
+            setattr(g, key, TBDatabase(current_app.config["DB"], row_mode="row", read_only=read_only))
 
-        return g.db
+        return g.get(key)
 
     def close_db(self, error: Error) -> None:
-        """Closes the database connection
+        """Closes the database connections
 
         Args:
             error (Error): Error
         """
-        db = g.pop("db", None)
+        for key in ("db", "read_db"):
+            db = g.pop(key, None)
 
-        if db is not None:
-            db.close()
+            if db is not None:
+                db.close()
 
     def validate_fields(self, max_size_mb: int, resolution_profile: set,  imdbid: int, name: str = None):
         """Validates if the fields: name, max_size_mb and resolution_profile
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The bot runs from src/ (e.g. "from tools import ..." in the probes), the tests import src.<package>
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -1,5 +1,12 @@
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
-from src.data import TBDatabase
+from src.data import TBDatabase, QueryStats
+from src.data.states import TorrentState
 
 
 class TestTBDatabase(unittest.TestCase):
@@ -8,5 +15,293 @@ class TestTBDatabase(unittest.TestCase):
         db.create_schema()
         db.close()
 
+    def test_search_backoff(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            movie_id = db.add_movie('Movie', 1000, '1080p', 1, '')
+            searching = db.states.SEARCHING
+            self.assertEqual(len(db.get_movies_by_state(searching, due=True)), 1)
+
+            db.record_search_miss('movies', movie_id, base_delay_sec=60, max_delay_sec=150)
+            movie = db.get_movie(movie_id)
+            self.assertEqual(movie['search_attempts'], 1)
+            self.assertEqual(movie['next_search_at'] - movie['last_searched_at'], 60)
+            self.assertEqual(db.get_movies_by_state(searching, due=True), [])
+            self.assertEqual(len(db.get_movies_by_state(searching)), 1)
+
+            # The delay doubles after every miss, up to the maximum delay
+            db.record_search_miss('movies', movie_id, base_delay_sec=60, max_delay_sec=150)
+            movie = db.get_movie(movie_id)
+            self.assertEqual(movie['next_search_at'] - movie['last_searched_at'], 120)
+            db.record_search_miss('movies', movie_id, base_delay_sec=60, max_delay_sec=150)
+            movie = db.get_movie(movie_id)
+            self.assertEqual(movie['next_search_at'] - movie['last_searched_at'], 150)
+            self.assertGreater(db.get_next_search_at('movies'), time.time())
+
+            db.reset_search_backoff('movies', movie_id)
+            self.assertEqual(len(db.get_movies_by_state(searching, due=True)), 1)
+            self.assertIsNone(db.get_next_search_at('movies'))
+            db.close()
+
+    def test_connections(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            self.assertEqual(db.connection.execute('PRAGMA journal_mode').fetchone()['journal_mode'], 'wal')
+            self.assertIs(db.connection, db.connection)
+
+            # Every thread uses its own connection
+            connections = []
+            thread = threading.Thread(target=lambda: connections.append(db.connection))
+            thread.start()
+            thread.join()
+            self.assertIsNot(connections[0], db.connection)
+
+            # Released connections are reused
+            connection = db.connection
+            db.close()
+            self.assertIs(TBDatabase(db.db_file_path).connection, connection)
+            db.close()
+            db.connections.close_idle()
+
+    def test_read_only(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            db.add_movie('Movie', 1000, '1080p', 1, '')
+            read_db = TBDatabase(db.db_file_path, read_only=True)
+            self.assertIsNot(read_db.connections, db.connections)
+            self.assertEqual(len(read_db.get_all_movies()), 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                read_db.add_movie('Other', 1000, '1080p', 2, '')
+
+            # Reads inside a snapshot don't see (nor wait for) the writes made in the meantime
+            with read_db.snapshot():
+                self.assertEqual(len(read_db.get_all_movies()), 1)
+                with db.transaction():
+                    db.add_movie('Other', 1000, '1080p', 2, '')
+                    self.assertEqual(len(read_db.get_all_movies()), 1)
+                self.assertEqual(len(read_db.get_all_movies()), 1)
+            self.assertEqual(len(read_db.get_all_movies()), 2)
+            read_db.close()
+            db.close()
+            read_db.connections.close_idle()
+
+    def test_query_stats(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'), row_mode='row')
+            db.create_schema()
+            db.query_stats = QueryStats(slow_query_ms=float('inf'))
+            ids = [db.add_movie(f'Movie {i}', 1000, '1080p', i, '') for i in range(3)]
+            self.assertEqual(len(db.get_entries('movies', ids=ids)), 3)
+            self.assertEqual(len(db.get_entries('movies', ids=ids[:1])), 1)
+            self.assertEqual(db.get_movie(ids[0])['name'], 'Movie 0')
+            stats = {stat['sql']: stat for stat in db.query_stats.get_stats()}
+            # Placeholder lists are grouped
+            self.assertEqual(stats['SELECT * FROM movies WHERE id IN (?, ...)']['count'], 1)
+            self.assertEqual(stats['SELECT * FROM movies WHERE id IN (?)']['count'], 1)
+            insert = next(stat for sql, stat in stats.items() if sql.startswith('INSERT INTO movies'))
+            self.assertEqual(insert['count'], 3)
+            self.assertLessEqual(insert['p50_ms'], insert['p99_ms'])
+
+            # Slow statements are logged with their query plan
+            db.query_stats.slow_query_ms = 0
+            with self.assertLogs(level='WARNING') as logs:
+                db.get_movies_by_state(db.states.SEARCHING)
+            self.assertIn('movies_state_idx', logs.output[0])
+            db.query_stats.reset()
+            self.assertEqual(db.query_stats.get_stats(), [])
+            db.close()
+
+    def test_row_mode(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'), row_mode='row')
+            db.create_schema()
+            movie_id = db.add_movie('Movie', 1000, '1080p', 1, '')
+            movie = db.get_movie(movie_id)
+            self.assertIsInstance(movie, sqlite3.Row)
+            self.assertEqual(movie['name'], 'Movie')
+            self.assertEqual(dict(movie), TBDatabase(db.db_file_path).get_movie(movie_id))
+            with self.assertRaises(Exception):
+                TBDatabase(db.db_file_path, row_mode='tuple')
+            db.close()
+
+    def test_transaction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            show_id = db.add_tv_show('Show', 1000, '1080p', 1, '')
+            with db.transaction():
+                season_ids = db.add_tv_show_seasons(show_id, {1: 2, 2: 1})
+                db.add_season_episodes(season_ids[1], [
+                    {'name': 'Pilot', 'episode_number': 1, 'air_date': '1 Jan. 2020'},
+                    {'name': 'Second', 'episode_number': 2, 'air_date': '8 Jan. 2020'}])
+                # Nothing is visible to other connections until the transaction is committed
+                other_db = TBDatabase(db.db_file_path)
+                other_connection = other_db.connections.connect()
+                self.assertEqual(other_connection.execute('SELECT * FROM tv_show_seasons').fetchall(), [])
+            self.assertEqual(len(other_connection.execute('SELECT * FROM tv_show_seasons').fetchall()), 2)
+            self.assertEqual(db.get_tv_show_season_episode_numbers(season_ids[1]), {1, 2})
+            other_connection.close()
+
+            # Changes are rolled back when the block raises an exception
+            with self.assertRaises(sqlite3.IntegrityError):
+                with db.transaction():
+                    db.update_show_season(season_ids[2], state=db.states.PAUSED)
+                    db.add_tv_show_seasons(show_id, {1: 2})
+            self.assertEqual(db.get_tv_show_season(season_ids[2])['state'], db.states.SEARCHING)
+            db.close()
+
+    def test_change_log(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            self.assertEqual(db.get_last_change_seq(), 0)
+            movie_id = db.add_movie('Movie', 1000, '1080p', 1, '')
+            seq = db.get_last_change_seq()
+
+            # Only state and hash changes are logged
+            db.update_movie(movie_id, max_size_mb=2000)
+            db.record_search_miss('movies', movie_id, base_delay_sec=60, max_delay_sec=150)
+            db.update_movie(movie_id, state=db.states.SEARCHING)
+            self.assertEqual(db.get_changes_since(seq), [])
+            db.update_movie(movie_id, state=db.states.DOWNLOADING, hash='ABCDEF')
+            db.delete_movie(movie_id)
+            changes = db.get_changes_since(seq)
+            self.assertEqual([(change['table_name'], change['row_id'], change['operation']) for change in changes],
+                             [('movies', movie_id, 'UPDATE'), ('movies', movie_id, 'DELETE')])
+            self.assertEqual(changes[-1]['seq'], db.get_last_change_seq())
+            self.assertEqual(len(db.get_changes_since(seq, limit=1)), 1)
+
+            # Pruned changes can't be retrieved anymore
+            self.assertTrue(db.is_change_log_complete(0))
+            db.prune_changes(max_age_sec=-1)
+            self.assertFalse(db.is_change_log_complete(seq))
+            self.assertTrue(db.is_change_log_complete(db.get_last_change_seq()))
+
+            movie_id = db.add_movie('Other', 1000, '1080p', 2, '')
+            db.update_movie(movie_id, hash='ABCDEF')
+            self.assertEqual(len(db.get_entries('movies', hashes={'abcdef'})), 1)
+            self.assertEqual(len(db.get_entries('movies', ids={movie_id}, hashes={'abcdef'})), 1)
+            self.assertEqual(db.get_entries('movies'), [])
+            db.close()
+
+    def test_state_summary(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            self.assertEqual(db.get_state_summary(), {})
+            movie_id = db.add_movie('Movie', 1000, '1080p', 1, '')
+            db.add_movie('Other', 1000, '1080p', 2, '')
+            db.update_movie(movie_id, state=db.states.DOWNLOADING)
+            show_id = db.add_tv_show('Show', 1000, '1080p', 3, '')
+            season_ids = db.add_tv_show_seasons(show_id, {1: 2, 2: 2})
+            db.add_season_episodes(season_ids[1], [{'name': '', 'episode_number': episode, 'air_date': ''}
+                                                   for episode in (1, 2)])
+            db.update_show_season(season_ids[2], state=db.states.PAUSED)
+            db.update_unhashed_episode_states()
+            self.assertEqual(db.get_state_summary(), {
+                'movie': {db.states.SEARCHING: 1, db.states.DOWNLOADING: 1},
+                'tv_show': {db.states.SEARCHING: 1},
+                'season': {db.states.SEARCHING: 1, db.states.PAUSED: 1},
+                'episode': {db.states.SEARCHING: 2},
+            })
+            # Cascading deletes are counted too
+            db.delete_tv_show(show_id)
+            db.delete_movie(movie_id)
+            self.assertEqual(db.get_state_summary(), {'movie': {db.states.SEARCHING: 1}})
+            self.assertEqual(db.get_all_tv_shows_season_episodes(), [])
+            db.close()
+
+    def test_air_dates(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'), row_mode='row')
+            db.create_schema()
+            show_id = db.add_tv_show('Show', 1000, '1080p', 1, '')
+            season_ids = db.add_tv_show_seasons(show_id, {1: 4})
+            db.add_season_episodes(season_ids[1], [
+                {'name': '', 'episode_number': 1, 'air_date': '20 Jan. 2008'},
+                {'name': '', 'episode_number': 2, 'air_date': '12 Dec. 2998'},
+                {'name': '', 'episode_number': 3, 'air_date': 'TBA'},
+            ])
+            db.add_season_episode(season_ids[1], '', 4, '1 Jan. 2999')
+            self.assertEqual([episode['air_date'] for episode in db.get_season_episodes(season_ids[1])],
+                             ['2008-01-20', '2998-12-12', 'TBA', '2999-01-01'])
+            self.assertIsNone(db.get_tv_show(show_id)['next_air_date'])
+            db.update_next_air_dates(show_id)
+            self.assertEqual(db.get_tv_show(show_id)['next_air_date'], '2998-12-12')
+            db.delete_episode(db.get_season_episodes(season_ids[1])[1]['id'])
+            db.update_next_air_dates()
+            self.assertEqual(db.get_tv_show(show_id)['next_air_date'], '2999-01-01')
+
+            episode_id = db.get_season_episodes(season_ids[1])[0]['id']
+            for _ in range(3):
+                db.record_search_miss('tv_show_season_episodes', episode_id, base_delay_sec=60, max_delay_sec=3600)
+            db.postpone_search('tv_show_season_episodes', episode_id, 300)
+            episode = db.get_season_episodes(season_ids[1])[0]
+            self.assertEqual(episode['search_attempts'], 0)
+            self.assertEqual(episode['next_search_at'] - episode['last_searched_at'], 300)
+            db.close()
+
+    def test_tv_show_episode_numbers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'), row_mode='row')
+            db.create_schema()
+            show_id = db.add_tv_show('Show', 1000, '1080p', 1, '')
+            self.assertEqual(db.get_tv_show_episode_numbers(show_id), {})
+            season_ids = db.add_tv_show_seasons(show_id, {1: 2, 2: 3})
+            db.add_season_episodes(season_ids[1], [{'name': '', 'episode_number': episode, 'air_date': ''}
+                                                   for episode in (1, 2)])
+            self.assertEqual(db.get_tv_show_episode_numbers(show_id), {
+                1: {'id': season_ids[1], 'season_number_episodes': 2, 'episodes': {1, 2}},
+                2: {'id': season_ids[2], 'season_number_episodes': 3, 'episodes': set()},
+            })
+            db.close()
+
+    def test_parent_states(self):
+        states = TorrentState.get_states()
+        child_state_sets = [{state for i, state in enumerate(states) if mask & (1 << i)}
+                            for mask in range(1 << len(states))]
+        cases = list(itertools.product(states, child_state_sets))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = TBDatabase(os.path.join(tmp_dir, 'tbot.db'))
+            db.create_schema()
+            with db.transaction():
+                season_show_id = db.add_tv_show('Seasons', 1000, '1080p', 0, '')
+                seasons = []
+                shows = []
+                for i, (parent_state, child_states) in enumerate(cases):
+                    # Seasons with episodes in every child state
+                    season_id = db.add_tv_show_season(season_show_id, i, len(child_states))
+                    db.update_show_season(season_id, state=parent_state)
+                    db.add_season_episodes(season_id, [
+                        {'name': state, 'episode_number': number, 'air_date': ''}
+                        for number, state in enumerate(child_states)])
+                    for episode in db.get_season_episodes(season_id):
+                        db.update_tv_show_season_episode(episode['id'], state=episode['name'], hash='hash')
+                    seasons.append(season_id)
+
+                    # Shows with seasons in every child state
+                    show_id = db.add_tv_show(f'Show {i}', 1000, '1080p', i + 1, '')
+                    db.update_tv_show(show_id, state=parent_state)
+                    season_ids = db.add_tv_show_seasons(show_id, {number: 1 for number in range(len(child_states))})
+                    for number, state in enumerate(child_states):
+                        db.update_show_season(season_ids[number], state=state, hash='hash')
+                    shows.append(show_id)
+
+            db.update_season_states()
+            deleted_ids = set(db.update_tv_show_states())
+            for (parent_state, child_states), season_id, show_id in zip(cases, seasons, shows):
+                expected_state = TorrentState.parent_state(parent_state, child_states)
+                with self.subTest(parent_state=parent_state, child_states=child_states):
+                    self.assertEqual(db.get_tv_show_season(season_id)['state'], expected_state)
+                    if expected_state == TorrentState.DELETING or parent_state == TorrentState.DELETING:
+                        self.assertIn(show_id, deleted_ids)
+                        self.assertIsNone(db.get_tv_show(show_id))
+                    else:
+                        self.assertEqual(db.get_tv_show(show_id)['state'], expected_state)
+            db.close()
+
 if __name__ == '__main__':
     unittest.main()
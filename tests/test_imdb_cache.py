@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+from imdb import IMDbDataAccessError
+from src.tools import IMDBCache, IMDBFinder
+
+
+class FakeCinemagoer:
+    """Cinemagoer stand-in retrieving the episodes from a fixed catalogue, recording the retrieved seasons"""
+    def __init__(self, shows):
+        self.shows = shows
+        self.updated_seasons = []
+
+    def update(self, series, info):
+        self.update_series_seasons(series, list(self.shows[series["imdbid"]]["episodes"]))
+
+    def update_series_seasons(self, series, season_nums):
+        self.updated_seasons.append(list(season_nums))
+        episodes = self.shows[series["imdbid"]]["episodes"]
+        series["episodes"] = {season_number: episodes[season_number] for season_number in season_nums}
+
+
+class FakeIMDBFinder(IMDBFinder):
+    """IMDBFinder with fake imdb requests, counting the fetched shows"""
+    shows = {
+        1: {"title": "Ended Show", "series years": "2008-2013",
+            "episodes": {1: {1: {"title": "Pilot", "original air date": "20 Jan. 2008", "rating": 8}}}},
+        2: {"title": "Airing Show", "series years": "2019-",
+            "episodes": {1: {1: {"title": "Pilot", "original air date": "1 Jan. 2019"}, 2: {"title": "TBA"}}}},
+        3: {"title": "Long Show", "series years": "2000-",
+            "episodes": {season: {1: {"title": f"S{season}", "original air date": "1 Jan. 2000"}}
+                         for season in range(1, 31)}},
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.fake_finder = FakeCinemagoer(self.shows)
+        super().__init__(*args, **kwargs)
+        self.fetched = []
+        self.offline = False
+
+    def create_finder(self):
+        return self.fake_finder
+
+    def fetch(self, imdbid):
+        if self.offline or imdbid not in self.shows:
+            raise IMDbDataAccessError("offline")
+        self.fetched.append(imdbid)
+        show = self.shows[imdbid]
+        return {"imdbid": imdbid, "title": show["title"], "series years": show["series years"],
+                "seasons": [str(season_number) for season_number in show["episodes"]]}
+
+
+class TestIMDBCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "imdb_cache.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fetch_show(self):
+        finder = FakeIMDBFinder(self.cache_path, {IMDBCache.ENDED: 3600, IMDBCache.AIRING: 60})
+        show = finder.fetch_show(2)
+        self.assertEqual(show["episodes"][1][1], {"title": "Pilot", "original air date": "1 Jan. 2019"})
+        self.assertNotIn("original air date", show["episodes"][1][2])
+        self.assertEqual(finder.fetch_show(2), show)
+        self.assertEqual(finder.fetched, [2])
+        finder.cache.close()
+
+        # A restart reads the shows from disk
+        finder = FakeIMDBFinder(self.cache_path)
+        self.assertEqual(finder.fetch_show(2), show)
+        self.assertEqual(finder.fetched, [])
+        finder.cache.close()
+
+    def test_ttl_by_status(self):
+        finder = FakeIMDBFinder(self.cache_path, {IMDBCache.ENDED: 3600, IMDBCache.AIRING: -1})
+        self.assertEqual(finder.get_show_status(finder.shows[1]), IMDBCache.ENDED)
+        self.assertEqual(finder.get_show_status(finder.shows[2]), IMDBCache.AIRING)
+        self.assertEqual(finder.get_show_status({}), IMDBCache.UNKNOWN)
+        finder.fetch_show(1)
+        finder.fetch_show(2)
+        finder.fetch_show(1)
+        finder.fetch_show(2)
+        # The airing show expired right away and was fetched again
+        self.assertEqual(finder.fetched, [1, 2, 2])
+
+        # Expired shows are still used when imdb is unreachable
+        finder.offline = True
+        self.assertEqual(finder.fetch_show(2)["title"], "Airing Show")
+        with self.assertRaises(IMDbDataAccessError):
+            finder.fetch_show(4)
+        finder.cache.close()
+
+    def test_skip_seasons(self):
+        finder = FakeIMDBFinder(self.cache_path, {IMDBCache.AIRING: -1})
+        # Without a cached copy, every season is retrieved to seed the cache
+        show = finder.fetch_show(3, skip_seasons=set(range(1, 29)))
+        self.assertEqual(len(finder.finder.updated_seasons[-1]), 30)
+        self.assertEqual(len(show["episodes"]), 30)
+        self.assertEqual(len(finder.cache.get(3, allow_expired=True)["episodes"]), 30)
+
+        # An expired cached copy is refreshed with the retrieved seasons
+        finder.shows[3]["episodes"][30][2] = {"title": "New", "original air date": "2 Jan. 2000"}
+        show = finder.fetch_show(3, skip_seasons=set(range(1, 30)))
+        del finder.shows[3]["episodes"][30][2]
+        self.assertEqual(finder.finder.updated_seasons[-1], [30])
+        self.assertEqual(len(show["episodes"]), 30)
+        self.assertEqual(set(finder.cache.get(3, allow_expired=True)["episodes"][30]), {1, 2})
+        finder.cache.close()
+
+    def test_seed_cache(self):
+        # Every library has complete known seasons, the show is still cached after the first fetch
+        finder = FakeIMDBFinder(self.cache_path, {IMDBCache.AIRING: 3600})
+        for _ in range(3):
+            self.assertEqual(len(finder.fetch_show(3, skip_seasons=set(range(1, 30)))["episodes"]), 30)
+        self.assertEqual(finder.fetched, [3])
+        self.assertIsNotNone(finder.cache.get(3))
+        finder.cache.close()
+
+    def test_fetch_shows(self):
+        finder = FakeIMDBFinder(self.cache_path)
+        shows = finder.fetch_shows({1: set(), 2: set(), 3: set(range(1, 30)), 4: set()}, workers=4)
+        self.assertEqual(list(shows), [1, 2, 3, 4])
+        self.assertEqual(shows[1]["title"], "Ended Show")
+        self.assertEqual(len(shows[3]["episodes"]), 30)
+        # A show that couldn't be fetched doesn't prevent fetching the others
+        self.assertIsInstance(shows[4], IMDbDataAccessError)
+        self.assertEqual(sorted(finder.fetched), [1, 2, 3])
+        finder.cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from src.data import TBDatabase
+from src.utils.importer import WatchlistImporter, ImportJob
+
+
+class FakeFinder:
+    """IMDBFinder stand-in with a fixed catalogue, counting the finders created"""
+    catalogue = {
+        "The Matrix": {"imdbid": "0133093", "title": "The Matrix", "kind": "movie", "cover url": "matrix.jpg"},
+        "Breaking Bad": {"imdbid": "0903747", "title": "Breaking Bad", "kind": "tv series",
+                         "full-size cover url": "bb.jpg"},
+    }
+    instances = []
+
+    def __init__(self):
+        FakeFinder.instances.append(threading.get_ident())
+
+    def search(self, title):
+        return [self.catalogue[title]] if title in self.catalogue else []
+
+    def fetch(self, imdbid):
+        return next(item for item in self.catalogue.values() if item["imdbid"] == imdbid)
+
+
+class TestWatchlistImporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file_path = os.path.join(self.tmp_dir.name, "tbot.db")
+        self.db = TBDatabase(self.db_file_path)
+        self.db.create_schema()
+        FakeFinder.instances = []
+
+    def tearDown(self):
+        self.db.close()
+        self.db.connections.close_idle()
+        self.tmp_dir.cleanup()
+
+    def test_read(self):
+        importer = WatchlistImporter(self.db_file_path, max_size_mb=2000)
+        imdb_export = io.StringIO("Position,Const,Created,Title,Title Type\n"
+                                  "1,tt0133093,2020-01-01,The Matrix,movie\n"
+                                  "2,tt0903747,2020-01-01,Breaking Bad,tvSeries\n")
+        entries = importer.read(imdb_export)
+        self.assertEqual([(entry["name"], entry["imdbid"], entry["type"]) for entry in entries],
+                         [("The Matrix", 133093, "movie"), ("Breaking Bad", 903747, "tv_show")])
+        self.assertEqual(entries[0]["max_size_mb"], 2000)
+        entries = importer.read(io.StringIO("name,max_size_mb\nThe Matrix,500\n,\n"))
+        self.assertEqual(len(entries), 1)
+        self.assertIsNone(entries[0]["imdbid"])
+        self.assertEqual(entries[0]["max_size_mb"], 500)
+        # Invalid sizes are reported by the import instead of failing the whole file
+        entries = importer.read(io.StringIO("name,imdbid,type,max_size_mb,max_episode_size_mb\n"
+                                            "The Matrix,133093,movie,large,\n"
+                                            "Breaking Bad,903747,tv_show,,-1\n"
+                                            "Known Movie,1234,movie,700,\n"))
+        self.assertEqual([(entry["max_size_mb"], entry["max_episode_size_mb"]) for entry in entries],
+                         [(None, 1024), (2000, None), (700, 1024)])
+        FakeFinder.catalogue["Known Movie"] = {"imdbid": "0001234", "title": "Known Movie", "kind": "movie"}
+        report = WatchlistImporter(self.db_file_path, finder_factory=FakeFinder).import_entries(entries)
+        del FakeFinder.catalogue["Known Movie"]
+        self.assertEqual(report.invalid, ["The Matrix", "Breaking Bad"])
+        self.assertEqual(report.movies, ["Known Movie"])
+
+    def test_import(self):
+        self.db.add_movie("The Matrix", 1000, "1080p", 133093, "")
+        importer = WatchlistImporter(self.db_file_path, workers=2, finder_factory=FakeFinder)
+        watchlist = io.StringIO("name,imdbid,type\n"
+                                "The Matrix,,\n"
+                                "Breaking Bad,,tv_show\n"
+                                "Breaking Bad,903747,\n"
+                                "Unknown Movie,,movie\n"
+                                "Known Movie,1234,movie\n")
+        # Known Movie has every field except the cover url and is looked up by id
+        FakeFinder.catalogue["Known Movie"] = {"imdbid": "0001234", "title": "Known Movie", "kind": "movie"}
+        report = importer.import_file(watchlist)
+        del FakeFinder.catalogue["Known Movie"]
+        self.assertEqual(report.movies, ["Known Movie"])
+        self.assertEqual(report.tv_shows, ["Breaking Bad"])
+        self.assertEqual(sorted(report.duplicates), ["Breaking Bad", "The Matrix"])
+        self.assertEqual(report.not_found, ["Unknown Movie"])
+        self.assertLessEqual(len(FakeFinder.instances), 2)
+        tv_show = self.db.get_all_tv_shows()[0]
+        self.assertEqual((tv_show["imdbid"], tv_show["cover_url"]), (903747, "bb.jpg"))
+        self.assertEqual(len(self.db.get_all_movies()), 2)
+
+    def test_import_job(self):
+        importer = WatchlistImporter(self.db_file_path, workers=2, finder_factory=FakeFinder)
+        entries = importer.read(io.StringIO("name\nThe Matrix\nBreaking Bad\nUnknown Movie\n"))
+        reports = []
+        job = ImportJob(importer, entries, on_done=reports.append)
+        job.start()
+        self.assertTrue(job.done.wait(5))
+        self.assertIsNone(job.error)
+        self.assertEqual(job.resolved, 3)
+        self.assertEqual((job.report.movies, job.report.tv_shows, job.report.not_found),
+                         (["The Matrix"], ["Breaking Bad"], ["Unknown Movie"]))
+        self.assertEqual(reports, [job.report])
+
+        # A failed import is reported on the job, the listener isn't called
+        broken = {"name": "Broken", "imdbid": 2, "type": "movie", "cover_url": "broken.jpg", "max_size_mb": 1000,
+                  "max_episode_size_mb": 1000, "resolution_profile": None}
+        job = ImportJob(importer, [broken], on_done=reports.append)
+        job.run()
+        self.assertTrue(job.done.is_set())
+        self.assertIsNone(job.report)
+        self.assertEqual(job.error, "Failed to import watchlist, invalid entry!")
+        self.assertEqual(len(reports), 1)
+
+    def test_invalid_entries(self):
+        movie = {"name": "The Matrix", "max_size_mb": 1000, "resolution_profile": "1080p", "imdbid": 133093,
+                 "cover_url": ""}
+        self.assertEqual(self.db.add_movies([movie]), [])
+        # Same name or same imdbid
+        same_name = dict(movie, imdbid=1)
+        same_imdbid = dict(movie, name="Matrix")
+        self.assertEqual(self.db.add_movies([same_name, same_imdbid]), [same_name, same_imdbid])
+
+        # Only duplicates are skipped, malformed entries fail the whole import
+        broken = dict(movie, name="Broken", imdbid=2, max_size_mb=None)
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.db.transaction():
+                self.db.add_movies([dict(movie, name="Valid", imdbid=3), broken])
+        self.assertEqual([movie["name"] for movie in self.db.get_all_movies()], ["The Matrix"])
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.add_tv_shows([{"name": None, "max_episode_size_mb": 1000, "resolution_profile": "1080p",
+                                   "imdbid": 4, "cover_url": ""}])
+
+
+if __name__ == '__main__':
+    unittest.main()
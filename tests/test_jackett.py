@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+from src.tools import JackettCache, JackettClient
+
+GB = 1024 ** 3
+
+
+def result(title, seeders, size=GB, imdb=None):
+    return {"Title": title, "Size": size, "Seeders": seeders, "Imdb": imdb, "InfoHash": title,
+            "MagnetUri": f"magnet:?xt={title}", "Link": None, "Tracker": "tracker", "Description": "x" * 10}
+
+
+class FakeResponse:
+    """requests response stand-in streaming a fixed body"""
+    def __init__(self, body, chunk_size):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=None):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+class FakeSession:
+    """requests session stand-in answering every query with the same jackett results"""
+    def __init__(self, results, chunk_size=1024):
+        self.body = json.dumps({"Indexers": [], "Results": results}).encode("utf-8")
+        self.chunk_size = chunk_size
+        self.queries = []
+
+    def get(self, url, params=None, **kwargs):
+        self.queries.append(params["query"])
+        return FakeResponse(self.body, self.chunk_size)
+
+    def close(self):
+        pass
+
+
+class TestJackettClient(unittest.TestCase):
+    def setUp(self):
+        self.client = JackettClient("key", "http://localhost:9117/api/v2.0")
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_read_results(self):
+        results = [result(f"Título {index} – 日本語 [\"Results\": ]", seeders)
+                   for index, seeders in enumerate([5, 80, 3, 80, 42, 0, 17, 99, 42, 7, 64, 1])]
+        results[3]["Description"] = {"nested": ["]", {"Results": [1, 2]}]}
+        body = json.dumps({"Indexers": [{"ID": "x", "Results": 3}], "Results": results},
+                          ensure_ascii=False, indent=2).encode("utf-8")
+
+        def accept(entry):
+            return entry["Seeders"] >= 3
+
+        expected = sorted(({field: entry.get(field) for field in ("Title", "Size", "Seeders", "Imdb", "InfoHash",
+                                                                   "MagnetUri", "Link")}
+                           for entry in json.loads(body)["Results"] if accept(entry)),
+                          key=lambda entry: entry["Seeders"], reverse=True)[:5]
+        # Chunks split keys, strings and multibyte characters at every possible position
+        for chunk_size in (1, 2, 3, 7, 64, 1000, len(body)):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = FakeResponse(body, chunk_size).iter_content()
+                self.assertEqual(JackettClient.read_results(chunks, accept, top_k=5), expected)
+
+        # A truncated response keeps the results decoded so far
+        truncated = body[:body.index("Título 4".encode("utf-8"))]
+        self.assertEqual([entry["Seeders"] for entry in JackettClient.read_results([truncated], top_k=10)],
+                         [80, 80, 5, 3])
+
+    def test_search_tvseries_episodes(self):
+        self.client.session = FakeSession([
+            result("Show.S02E01.1080p.WEB-DL.x264", 30),
+            result("Show.S02E01.1080p.WEBRip.x264", 50),
+            result("Show.S02E02-E03.1080p.WEB-DL.x264", 20),
+            result("Show.S02E04.1080p.WEB-DL.x264", 1),
+            result("Show.S02E05.1080p.WEB-DL.x264", 40, size=10 * GB),
+            result("Show.S02E05.720p.WEB-DL.x264", 40),
+            result("Show.S02.1080p.WEB-DL.x264", 90),
+            result("Show.S01E01.1080p.WEB-DL.x264", 90),
+            result("Show.S02E06.1080p.WEB-DL.x264", 90, imdb=999),
+        ])
+        results = self.client.search_tvseries_episodes(
+            "Show", {"1080p"}, season=2, episodes={1, 2, 3, 4, 5, 6}, max_size_bytes=2 * GB,
+            min_number_seeds=2, imdbid=123)
+        titles = {episode: [entry["Title"] for entry in entries] for episode, entries in results.items()}
+        self.assertEqual(titles, {
+            1: ["Show.S02E01.1080p.WEBRip.x264", "Show.S02E01.1080p.WEB-DL.x264"],
+            # The range is assigned to each of its episodes, the season pack to none
+            2: ["Show.S02E02-E03.1080p.WEB-DL.x264"],
+            3: ["Show.S02E02-E03.1080p.WEB-DL.x264"],
+            # Not enough seeders, too large or another resolution, another show
+            4: [],
+            5: [],
+            6: [],
+        })
+        # A single query for the whole season
+        self.assertEqual(self.client.session.queries, ["Show 1080p"])
+
+    def test_cached_searches(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            client = JackettClient("key", "http://localhost:9117/api/v2.0", max_results=2,
+                                   cache=JackettCache(os.path.join(tmp_dir, "jackett_cache.db")))
+            client.session = FakeSession([
+                result("Show.S02E01.1080p.WEB-DL.x264", 30),
+                result("Show.S02E02.1080p.WEB-DL.x264", 20),
+                result("Show.S02E02.1080p.WEBRip.x264", 25),
+                result("Show.S02E02.1080p.HDTV.x264", 15),
+                result("Show.S02.1080p.WEB-DL.x264", 90),
+            ])
+            # Searches with different filters (season pack, wanted episodes) share the cached results
+            packs = client.search_tvseries("Show", {"1080p"}, season=2)
+            first = client.search_tvseries_episodes("Show", {"1080p"}, season=2, episodes={1, 2})
+            second = client.search_tvseries_episodes("Show", {"1080p"}, season=2, episodes={2})
+            client.close()
+        self.assertEqual(client.session.queries, ["Show 1080p"])
+        self.assertEqual([entry["Title"] for entry in packs], ["Show.S02.1080p.WEB-DL.x264"])
+        self.assertEqual([entry["Title"] for entry in first[1]], ["Show.S02E01.1080p.WEB-DL.x264"])
+        # The top results are selected after reading the cache (max_results per wanted episode)
+        self.assertEqual(len(first[2]), 3)
+        self.assertEqual([entry["Title"] for entry in second[2]],
+                         ["Show.S02E02.1080p.WEBRip.x264", "Show.S02E02.1080p.WEB-DL.x264"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from src.tools import JackettCache
+
+
+class TestJackettCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "jackett_cache.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ttl_by_category(self):
+        cache = JackettCache(self.cache_path, {2000: 3600, 5000: -1})
+        self.assertEqual(cache.connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        cache.put("Movie 1080p", 2000, [{"Title": "Movie.1080p"}])
+        cache.put("Show 1080p", 5000, [{"Title": "Show.S01E01.1080p"}])
+        self.assertEqual(cache.get("Movie 1080p", 2000), [{"Title": "Movie.1080p"}])
+        self.assertIsNone(cache.get("Movie 720p", 2000))
+        # The tv results expired right away
+        self.assertIsNone(cache.get("Show 1080p", 5000))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2})
+        cache.close()
+
+        # Another connection (e.g. the frontend) reads the same file
+        cache = JackettCache(self.cache_path, {2000: 3600})
+        self.assertEqual(cache.get("Movie 1080p", 2000), [{"Title": "Movie.1080p"}])
+        cache.close()
+
+    def test_invalidate(self):
+        cache = JackettCache(self.cache_path)
+        for query in ("Show", "Show 1080p", "Show 720p webrip", "Show Spin-off 1080p", "Other Show 1080p"):
+            cache.put(query, 5000, [])
+        frontend_cache = JackettCache(self.cache_path)
+        frontend_cache.invalidate("Show")
+        frontend_cache.close()
+        # Every query of the show is removed (and of shows whose name starts with it, which is harmless)
+        remaining = [query for query in ("Show", "Show 1080p", "Show 720p webrip", "Show Spin-off 1080p",
+                                         "Other Show 1080p") if cache.get(query, 5000) is not None]
+        self.assertEqual(remaining, ["Other Show 1080p"])
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.data import TBDatabase
+from src.data.migrations import MIGRATIONS, get_schema_version
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file_path = os.path.join(self.tmp_dir.name, 'tbot.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def query_plan(self, db: TBDatabase, sql: str, parameters: tuple = ()) -> str:
+        rows = db.connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        return "\n".join(row['detail'] for row in rows)
+
+    def test_schema_version(self):
+        db = TBDatabase(self.db_file_path)
+        db.create_schema()
+        self.assertEqual(get_schema_version(db.connection), len(MIGRATIONS))
+        # Running the migrations again is a no-op
+        db.create_schema()
+        self.assertEqual(get_schema_version(db.connection), len(MIGRATIONS))
+        db.close()
+
+    def test_migrate_unversioned_database(self):
+        # Databases created before migrations existed have user_version 0
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("""CREATE TABLE movies (
+            "id" INTEGER PRIMARY KEY AUTOINCREMENT, "name" TEXT UNIQUE NOT NULL,
+            "max_size_mb" INTEGER NOT NULL, "resolution_profile" TEXT NOT NULL,
+            "state" TEXT NOT NULL DEFAULT 'SEARCHING', "imdbid" INTEGER UNIQUE NOT NULL,
+            "cover_url" TEXT, "hash" TEXT)""")
+        connection.execute("INSERT INTO movies(name, max_size_mb, resolution_profile, imdbid) VALUES('Movie', 1, '1080p', 1)")
+        connection.commit()
+        connection.close()
+
+        db = TBDatabase(self.db_file_path)
+        db.create_schema()
+        movie = db.get_all_movies()[0]
+        self.assertEqual(movie['name'], 'Movie')
+        self.assertEqual(movie['search_attempts'], 0)
+        db.close()
+
+    def test_normalize_air_dates(self):
+        # Databases created before the air dates were normalized have imdb formatted air dates
+        connection = sqlite3.connect(self.db_file_path)
+        cur = connection.cursor()
+        for migration in MIGRATIONS[:5]:
+            migration(cur)
+        cur.execute("PRAGMA user_version = 5")
+        cur.execute("INSERT INTO tv_shows(name, max_episode_size_mb, resolution_profile, imdbid) "
+                    "VALUES('Show', 1, '1080p', 1)")
+        cur.execute("INSERT INTO tv_show_seasons(show_id, season_number, season_number_episodes) VALUES(1, 1, 3)")
+        cur.executemany("INSERT INTO tv_show_season_episodes(season_id, name, episode_number, air_date) "
+                        "VALUES(1, '', ?, ?)", [(1, '20 Jan. 2008'), (2, '2008'), (3, '1 Jan. 2999')])
+        connection.commit()
+        connection.close()
+
+        db = TBDatabase(self.db_file_path)
+        db.create_schema()
+        self.assertEqual([episode['air_date'] for episode in db.get_all_episodes()],
+                         ['2008-01-20', '2008-01-01', '2999-01-01'])
+        self.assertEqual(db.get_all_tv_shows()[0]['next_air_date'], '2999-01-01')
+        db.close()
+
+    def test_query_plans(self):
+        db = TBDatabase(self.db_file_path)
+        db.create_schema()
+        queries = [
+            ("SELECT * FROM movies WHERE state=?", ('SEARCHING',)),
+            ("SELECT * FROM movies WHERE state=? AND (next_search_at IS NULL OR next_search_at<=?)", ('SEARCHING', 0)),
+            ("SELECT * FROM movies WHERE hash=?", ('abc',)),
+            ("SELECT * FROM tv_shows WHERE state=?", ('SEARCHING',)),
+            ("SELECT * FROM tv_show_seasons WHERE show_id=?", (1,)),
+            ("SELECT * FROM tv_show_seasons WHERE hash=?", ('abc',)),
+            ("SELECT * FROM tv_show_season_episodes WHERE season_id=?", (1,)),
+            ("SELECT * FROM tv_show_season_episodes WHERE hash=?", ('abc',)),
+            ("SELECT * FROM tv_show_season_episodes WHERE state=?", ('SEARCHING',)),
+            ("SELECT * FROM tv_shows_with_seasons_view WHERE season_state=?", ('SEARCHING',)),
+            ("SELECT * FROM tv_shows_with_seasons_view WHERE show_id=?", (1,)),
+            ("SELECT * FROM tv_show_seasons_with_episodes_view WHERE season_state=?", ('SEARCHING',)),
+            ("SELECT * FROM tv_show_seasons_with_episodes_view WHERE season_id=?", (1,)),
+            ("SELECT * FROM tv_show_season_episodes WHERE air_date>?", ('2020-01-01',)),
+        ]
+        for sql, parameters in queries:
+            with self.subTest(sql=sql):
+                plan = self.query_plan(db, sql, parameters)
+                self.assertNotRegex(plan, r"SCAN (movies|tv_shows|tv_show_seasons|tv_show_season_episodes)\b", plan)
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
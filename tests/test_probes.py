@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from imdb import IMDbDataAccessError
+from src.probes import MovieProbe, TVShowProbe
+
+
+class FakeQbit:
+    """qbittorrent stand-in serving a fixed torrent mirror, checking that no other
+    database handler is blocked by the probe during the qbittorrent requests"""
+    def __init__(self, db_path, torrents):
+        self.db_path = db_path
+        self.torrents = torrents
+        self.full_update = True
+        self.changed_hashes = set()
+        self.requests = []
+
+    def assert_db_unlocked(self):
+        connection = sqlite3.connect(self.db_path, timeout=0)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.rollback()
+        finally:
+            connection.close()
+
+    def sync(self):
+        self.assert_db_unlocked()
+        self.requests.append("sync")
+        return self.torrents
+
+    def delete(self, hash):
+        self.assert_db_unlocked()
+        self.requests.append(("delete", hash))
+
+    def resume(self, hash):
+        self.assert_db_unlocked()
+        self.requests.append(("resume", hash))
+
+    def stop(self, hash):
+        self.assert_db_unlocked()
+        self.requests.append(("stop", hash))
+
+
+class TestProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "tbot.db")
+        self.probe = MovieProbe("key", "http://localhost:9117", "localhost", 8080, self.db_path,
+                                self.tmp_dir.name, retention_period_sec=60)
+        self.probe.db.create_schema()
+
+    def tearDown(self):
+        self.probe.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_update_outside_transaction(self):
+        db = self.probe.db
+        deleting_id = db.add_movie("Deleting", 1000, "1080p", 1, "")
+        db.update_movie(deleting_id, hash="AAA", state=db.states.DELETING)
+        seeding_id = db.add_movie("Seeding", 1000, "1080p", 2, "")
+        db.update_movie(seeding_id, hash="BBB", state=db.states.SEEDING)
+        downloading_id = db.add_movie("Downloading", 1000, "1080p", 3, "")
+        db.update_movie(downloading_id, hash="CCC", state=db.states.DOWNLOADING)
+        self.probe.qbit = FakeQbit(self.db_path, {
+            "aaa": {"hash": "AAA", "state": "uploading", "added_on": 0},
+            "bbb": {"hash": "BBB", "state": "uploading", "added_on": 0},
+            "ccc": {"hash": "CCC", "state": "uploading", "added_on": 0},
+        })
+
+        self.probe.start()
+        self.assertEqual(self.probe.qbit.requests, ["sync", ("delete", "AAA"), ("delete", "BBB")])
+        # The outcome of the qbittorrent requests is written afterwards
+        self.assertIsNone(db.get_movie(deleting_id))
+        self.assertEqual(db.get_movie(seeding_id)["state"], db.states.COMPLETED)
+        self.assertEqual(db.get_movie(downloading_id)["state"], db.states.SEEDING)
+        self.assertEqual(self.probe.pending_writes, [])
+
+
+class FakeIMDBFinder:
+    """IMDBFinder stand-in serving a fixed catalogue, failing for unknown shows"""
+    def __init__(self, shows):
+        self.shows = shows
+
+    def fetch_shows(self, skip_seasons, workers=4):
+        return {imdbid: self.shows.get(imdbid) or IMDbDataAccessError("not found") for imdbid in skip_seasons}
+
+
+class TestTVShowProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "tbot.db")
+        self.probe = TVShowProbe("key", "http://localhost:9117", "localhost", 8080, self.db_path,
+                                 self.tmp_dir.name, retention_period_sec=60,
+                                 search_interval_sec=60, max_search_interval_sec=150)
+        self.probe.db.create_schema()
+
+    def tearDown(self):
+        self.probe.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_next_search_at(self):
+        db = self.probe.db
+        show_id = db.add_tv_show("Show", 1000, "1080p", 2, "")
+        season_id = db.add_tv_show_season(show_id, 1, 2)
+        episode_id = db.add_season_episode(season_id, "Pilot", 1, "2019-01-01")
+        now = int(time.time())
+        # The episode backoff expired, but the complete season is searched as a whole and was postponed
+        db.update_tv_show_season_episode(episode_id, next_search_at=now - 60)
+        db.update_show_season(season_id, next_search_at=now + 86400)
+        self.assertEqual(self.probe.get_next_search_at(), now + 86400)
+        db.update_show_season(season_id, next_search_at=now - 60)
+        self.assertIsNone(self.probe.get_next_search_at())
+
+    def test_fetch_error(self):
+        db = self.probe.db
+        db.add_tv_show("Removed", 1000, "1080p", 1, "")
+        show_id = db.add_tv_show("Show", 1000, "1080p", 2, "")
+        self.probe.imdb_finder = FakeIMDBFinder({2: {"title": "Show", "episodes": {
+            1: {1: {"title": "Pilot", "original air date": "1 Jan. 2019"}}}}})
+        shows = {show["imdbid"]: show for show in db.get_tv_shows_by_state(db.states.SEARCHING)}
+
+        # The show that can't be fetched doesn't prevent storing the other one
+        with self.assertLogs(level="WARNING"):
+            self.probe.search_seasons(list(shows.values()))
+        self.assertEqual(list(db.get_tv_show_episode_numbers(show_id)[1]["episodes"]), [1])
+
+        # and it's retried later, the delay doubles after every error
+        removed = shows[1]
+        self.assertFalse(self.probe.is_due(removed["id"], "SHOW", removed["state"]))
+        for delay_sec in (60, 120, 150):
+            self.assertFalse(self.probe.scheduler.is_due(("SHOW", removed["id"]), removed["state"],
+                                                         now=time.time() + delay_sec - 5))
+            self.assertTrue(self.probe.scheduler.is_due(("SHOW", removed["id"]), removed["state"],
+                                                        now=time.time() + delay_sec + 5))
+            with self.assertLogs(level="WARNING"):
+                self.probe.search_seasons([removed])
+
+
+if __name__ == '__main__':
+    unittest.main()
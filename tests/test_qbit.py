@@ -0,0 +1,52 @@
+import unittest
+from src.tools import QbittorrentClient
+
+
+class FakeQbtClient:
+    """qbittorrentapi client stand-in answering sync/maindata with canned responses"""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.rids = []
+
+    def sync_maindata(self, rid=0):
+        self.rids.append(rid)
+        return self.responses.pop(0)
+
+
+class TestQbittorrentClient(unittest.TestCase):
+    def test_sync(self):
+        client = QbittorrentClient()
+        client.qbt_client = FakeQbtClient([
+            {"rid": 1, "full_update": True, "torrents": {
+                "AAA": {"state": "downloading", "progress": 0.5, "added_on": 10},
+                "bbb": {"state": "uploading", "progress": 1, "added_on": 20}}},
+            # Partial update: only the changed fields of the changed torrents
+            {"rid": 2, "torrents": {"AAA": {"state": "uploading", "progress": 1}},
+             "torrents_removed": ["BBB"]},
+            {"rid": 3},
+            {"rid": 4, "full_update": True, "torrents": {"ccc": {"state": "pausedUP"}}},
+        ])
+
+        torrents = client.sync()
+        self.assertTrue(client.full_update)
+        self.assertEqual(set(torrents), {"aaa", "bbb"})
+        self.assertEqual(torrents["aaa"], {"hash": "AAA", "state": "downloading", "progress": 0.5, "added_on": 10})
+        self.assertEqual(client.changed_hashes, {"aaa", "bbb"})
+
+        torrents = client.sync()
+        self.assertFalse(client.full_update)
+        # The changed fields are merged into the mirror, removed torrents are dropped
+        self.assertEqual(torrents, {"aaa": {"hash": "AAA", "state": "uploading", "progress": 1, "added_on": 10}})
+        self.assertEqual(client.changed_hashes, {"aaa", "bbb"})
+
+        self.assertEqual(client.sync(), torrents)
+        self.assertEqual(client.changed_hashes, set())
+
+        # A full update rebuilds the mirror
+        self.assertEqual(client.sync(), {"ccc": {"hash": "ccc", "state": "pausedUP"}})
+        self.assertEqual(client.rid, 4)
+        self.assertEqual(client.qbt_client.rids, [0, 1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from src.tools import TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_try_acquire(self):
+        bucket = TokenBucket(rate_per_sec=2, burst=3)
+        now = bucket._updated_at
+        # The burst is available right away
+        for _ in range(3):
+            self.assertEqual(bucket.try_acquire(now=now), 0)
+        self.assertAlmostEqual(bucket.try_acquire(now=now), 0.5)
+        # Refilled at rate_per_sec, up to burst
+        self.assertEqual(bucket.try_acquire(now=now + 0.5), 0)
+        self.assertAlmostEqual(bucket.try_acquire(2, now=now + 1.0), 0.5)
+        self.assertEqual(bucket.try_acquire(3, now=now + 100), 0)
+
+    def test_larger_than_burst(self):
+        bucket = TokenBucket(rate_per_sec=1, burst=2)
+        now = bucket._updated_at
+        # A request larger than burst only needs a full bucket, the next requests pay the debt
+        self.assertEqual(bucket.try_acquire(5, now=now), 0)
+        self.assertAlmostEqual(bucket.try_acquire(now=now), 4)
+        self.assertEqual(bucket.try_acquire(now=now + 4), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from src.tools.release_parser import parse_release, matches_profile, Release
+
+# title: (resolution, source, codec, season, episode_start, episode_end, year, pack)
+RELEASES = {
+    "Breaking.Bad.S01E02.720p.BluRay.x264-DEMAND":
+        Release("720p", "bluray", "h264", 1, 2, 2, None, False),
+    "The.Expanse.S05E01-03.1080p.AMZN.WEB-DL.DDP5.1.H.264-NTb":
+        Release("1080p", "web-dl", "h264", 5, 1, 3, None, False),
+    "The.Expanse.S05E01-E03.1080p.WEBRip.x265-RARBG":
+        Release("1080p", "webrip", "h265", 5, 1, 3, None, False),
+    "Doctor.Who.2005.S13E01E02E03.720p.HDTV.x264-FoV":
+        Release("720p", "hdtv", "h264", 13, 1, 3, 2005, False),
+    "Show.Name.S02.E04-E05.1080p.WEB.h264-GOSSIP":
+        Release("1080p", "web", "h264", 2, 4, 5, None, False),
+    "Friends.1x02.The.One.With.The.Sonogram.At.The.End.DVDRip.XviD":
+        Release(None, "dvdrip", "xvid", 1, 2, 2, None, False),
+    "The.Office.US.S03.1080p.BluRay.x265-RARBG":
+        Release("1080p", "bluray", "h265", 3, None, None, None, True),
+    "Game of Thrones Season 8 Complete 2160p UHD BluRay REMUX HEVC":
+        Release("2160p", "bluray", "h265", 8, None, None, None, True),
+    "Chernobyl (2019) Season 1 Episode 4 1080p HDTV":
+        Release("1080p", "hdtv", None, 1, 4, 4, 2019, False),
+    "Mad.Men.Season 3 Complete 2009 720p BluRay":
+        Release("720p", "bluray", None, 3, None, None, 2009, True),
+    "Sherlock.S04E01.1080p-WEB.h264":
+        Release("1080p", "web", "h264", 4, 1, 1, None, False),
+    "Blade Runner 2049 (2017) 2160p 4K BluRay x265 10bit":
+        Release("2160p", "bluray", "h265", None, None, None, 2017, False),
+    "The Matrix 1999 720p BRRip XviD AC3-ViSiON":
+        Release("720p", "brrip", "xvid", None, None, None, 1999, False),
+}
+
+
+class TestReleaseParser(unittest.TestCase):
+    def test_parse_release(self):
+        for title, release in RELEASES.items():
+            with self.subTest(title=title):
+                self.assertEqual(parse_release(title), release)
+
+    def test_matches_profile(self):
+        release = parse_release("The.Expanse.S05E01-03.1080p.AMZN.WEB-DL.DDP5.1.H.264-NTb")
+        self.assertTrue(matches_profile(release, {"1080p+web-dl"}))
+        self.assertTrue(matches_profile(release, {"720p", "1080p"}))
+        self.assertFalse(matches_profile(release, {"720p", "2160p+web-dl"}))
+        self.assertTrue(matches_profile(release, {"any"}))
+        # The source only narrows the jackett query
+        self.assertTrue(matches_profile(release, {"1080p+webrip"}))
+        # Unknown resolutions and sources are accepted
+        self.assertTrue(matches_profile(parse_release("Show.S01E01"), {"2160p+bluray"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
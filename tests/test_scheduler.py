@@ -0,0 +1,31 @@
+import unittest
+from src.utils.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def test_due_items(self):
+        scheduler = Scheduler()
+        self.assertTrue(scheduler.is_due(('MOVIE', 1), 'SEARCHING'))
+        scheduler.schedule(('MOVIE', 1), 60, 'SEARCHING')
+        scheduler.schedule(('MOVIE', 2), 10, 'DOWNLOADING')
+        self.assertFalse(scheduler.is_due(('MOVIE', 1), 'SEARCHING'))
+        # A state change makes the item due right away
+        self.assertTrue(scheduler.is_due(('MOVIE', 1), 'PAUSED'))
+        self.assertTrue(scheduler.is_due(('MOVIE', 2), 'DOWNLOADING', now=scheduler.next_due()))
+
+    def test_next_due(self):
+        scheduler = Scheduler()
+        self.assertIsNone(scheduler.next_due())
+        scheduler.schedule(('EPISODE', 1), 10)
+        scheduler.schedule(('EPISODE', 2), 60)
+        first_due = scheduler.next_due()
+        # Rescheduling discards the previous heap entry
+        scheduler.schedule(('EPISODE', 1), 120)
+        self.assertGreater(scheduler.next_due(), first_due)
+        scheduler.forget(('EPISODE', 2))
+        scheduler.forget(('EPISODE', 1))
+        self.assertIsNone(scheduler.next_due())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import threading
+import unittest
+from src.tools import SearchCache
+
+
+class TestSearchCache(unittest.TestCase):
+    def setUp(self):
+        self.searches = []
+
+    def search(self, query):
+        self.searches.append(query)
+        return [query]
+
+    def test_normalized_queries(self):
+        cache = SearchCache()
+        self.assertEqual(cache.get("  The  Wire ", self.search, now=0), ["The Wire"])
+        self.assertEqual(cache.get("the wire", self.search, now=1), ["The Wire"])
+        self.assertEqual(cache.get("THE\tWIRE", self.search, now=2), ["The Wire"])
+        self.assertEqual(self.searches, ["The Wire"])
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "coalesced": 0, "evictions": 0, "size": 1})
+
+    def test_lru_and_ttl(self):
+        cache = SearchCache(max_entries=2, ttl_sec=10)
+        cache.get("a", self.search, now=0)
+        cache.get("b", self.search, now=0)
+        cache.get("a", self.search, now=1)
+        # b is the least recently used
+        cache.get("c", self.search, now=1)
+        cache.get("a", self.search, now=2)
+        cache.get("b", self.search, now=2)
+        self.assertEqual(self.searches, ["a", "b", "c", "b"])
+        # a expired
+        cache.get("a", self.search, now=10)
+        self.assertEqual(self.searches[-1], "a")
+        self.assertEqual(cache.stats()["evictions"], 2)
+
+    def test_single_flight(self):
+        cache = SearchCache()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_search(query):
+            started.set()
+            release.wait(5)
+            return self.search(query)
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get("Lost", slow_search)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(cache.get(" lost", slow_search)))
+                     for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while cache.stats()["coalesced"] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+        self.assertEqual(self.searches, ["Lost"])
+        self.assertEqual(results, [["Lost"]] * 4)
+
+    def test_errors_not_cached(self):
+        cache = SearchCache()
+
+        def failing_search(query):
+            raise OSError("offline")
+
+        with self.assertRaises(OSError):
+            cache.get("lost", failing_search)
+        self.assertEqual(cache.get("lost", self.search), ["lost"])
+        self.assertEqual(cache.stats()["misses"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
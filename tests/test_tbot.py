@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+from src.tbot import TorrentBot
+
+
+class FakeVisuals:
+    """Visuals stand-in without a web server"""
+    on_change = None
+
+    def start(self):
+        pass
+
+
+class FakeProbe:
+    """Probe stand-in counting its cycles, which can block until released or fail"""
+
+    def __init__(self, due_in_sec=None, blocked=False, error=None):
+        self.due_in_sec = due_in_sec
+        self.due = time.time() + due_in_sec if due_in_sec is not None else None
+        self.release = threading.Event()
+        if not blocked:
+            self.release.set()
+        self.error = error
+        self.cycles = 0
+
+    def start(self):
+        self.cycles += 1
+        self.release.wait(5)
+        if self.due_in_sec is not None:
+            self.due = time.time() + self.due_in_sec
+        if self.error is not None:
+            raise self.error
+
+    def next_due(self):
+        return self.due
+
+    def shutdown(self):
+        pass
+
+
+class FailingProbe(FakeProbe):
+    pass
+
+
+class TestTorrentBot(unittest.TestCase):
+    def run_bot(self, bot: TorrentBot, until, timeout_sec: float = 5) -> None:
+        thread = threading.Thread(target=bot.start)
+        thread.start()
+        deadline = time.time() + timeout_sec
+        while not until() and time.time() < deadline:
+            time.sleep(0.01)
+        bot.exit_gracefully()
+        for probe in bot.probes:
+            probe.release.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_time_until_next_due(self):
+        busy_probe, idle_probe = FakeProbe(due_in_sec=-60), FakeProbe()
+        bot = TorrentBot(FakeVisuals(), [busy_probe, idle_probe], workers=2, max_sleep_sec=30)
+        self.assertEqual(bot.time_until_next_due(), 1)
+        # The stale due time of a busy probe doesn't wake up the bot every second
+        self.assertEqual(bot.time_until_next_due([busy_probe]), 30)
+        idle_probe.due = time.time() + 10
+        self.assertAlmostEqual(bot.time_until_next_due([busy_probe]), 10, delta=1)
+
+    def test_skip_busy_probes(self):
+        slow_probe = FakeProbe(due_in_sec=0, blocked=True)
+        fast_probe = FakeProbe(due_in_sec=0)
+        bot = TorrentBot(FakeVisuals(), [slow_probe, fast_probe], workers=2, max_sleep_sec=0.05)
+        self.run_bot(bot, lambda: fast_probe.cycles >= 3)
+        self.assertGreaterEqual(fast_probe.cycles, 3)
+        # The slow probe is never run twice at the same time
+        self.assertEqual(slow_probe.cycles, 1)
+
+    def test_probe_failure_logged(self):
+        probe = FailingProbe(due_in_sec=0, error=RuntimeError("jackett exploded"))
+        bot = TorrentBot(FakeVisuals(), [probe], workers=1, max_sleep_sec=0.05)
+        with self.assertLogs(level="ERROR") as logs:
+            self.run_bot(bot, lambda: probe.cycles >= 2)
+        # The bot keeps running the probe after a failure
+        self.assertGreaterEqual(probe.cycles, 2)
+        self.assertIn("FailingProbe failed", logs.output[0])
+        self.assertIn("jackett exploded", logs.output[0])
+
+    def test_frontend_change_wakes_up(self):
+        probe = FakeProbe()
+        bot = TorrentBot(FakeVisuals(), [probe], workers=2, max_sleep_sec=30)
+        thread = threading.Thread(target=bot.start)
+        thread.start()
+        deadline = time.time() + 5
+        while probe.cycles < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        # Nothing is due, the bot sleeps until the frontend changes the database
+        time.sleep(0.1)
+        self.assertEqual(probe.cycles, 1)
+        bot.visuals.on_change()
+        while probe.cycles < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        bot.exit_gracefully()
+        thread.join(5)
+        self.assertEqual(probe.cycles, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()